@@ -1,18 +1,54 @@
 from fastapi import FastAPI, Body, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Literal
+from contextlib import asynccontextmanager
+from starlette.background import BackgroundTask
 
-from api_service_helper_functions import response_formatter
+from api_service_helper_functions import response_formatter, prepare_enrichment, iter_formatted_places, ranking_view, rank_places
 from estimator import cost_time_predict
 from kmz_converter import json_to_kmz
-from excel_converter import json_to_excel
-import httpx
+from excel_converter import json_to_excel_file, iter_file_chunks
+from client_pool import clients
+from places_service import build_payload, fetch_all_places, fetch_places_tiled, iter_place_pages, as_pages, prepend_page, mask_fields, SEARCH_FIELD_MASK, ESTIMATE_FIELD_MASK
+from embedding_service import EMBEDDING_BACKEND, local_backend
+from image_service import start_image_stats, bytes_saved
+from job_service import jobs, job_store
+from result_service import ResultWriter, result_store
+from response_service import FastJSONResponse, FastJSONRoute, CompressionMiddleware, json_dumps, json_loads, parse_fields, project
+from telemetry_service import start_telemetry, save_telemetry, stage_timer
+from profiling_service import PROFILING_ENABLED, PROFILE_ID_PATTERN, RequestProfiler, install_slow_callback_detector, profiling_requested
+from metrics_service import METRICS_ENABLED, CONTENT_TYPE, render_metrics, http_seconds, http_requests, http_in_flight
+import time
+from logging_service import logger, request_id_var
+import asyncio
+import uuid
 
 # ---------------------- FastAPI Setup ----------------------
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep-alive pools for Google/OpenAI live for the whole process
+    await clients.start()
+    app.state.clients = clients
+    if PROFILING_ENABLED:
+        install_slow_callback_detector()
+    if EMBEDDING_BACKEND == "local":
+        # Load the local embedding model once, before the first search needs it
+        await asyncio.to_thread(local_backend.load)
+    # Background search workers; jobs interrupted by a restart are resumed here
+    await jobs.start(run_search_job)
+    yield
+    await jobs.close()
+    await clients.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# Request bodies of every route below are parsed with orjson
+app.router.route_class = FastJSONRoute
+
+# Added first so it sits inside the @app.middleware layers, which re-stream every body
+app.add_middleware(CompressionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,18 +56,49 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Result-ID", "X-Request-ID", "X-Profile-ID"],
 )
 
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    # Log records written while serving this request (and its tasks) carry the ID. A client's
+    # X-Request-ID is only reused when it is safe in logs, headers and profile file names.
+    request_id = request.headers.get("X-Request-ID")
+    if not (request_id and PROFILE_ID_PATTERN.fullmatch(request_id)):
+        request_id = uuid.uuid4().hex
+    request_id_var.set(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        with http_in_flight.track():
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route templates (e.g. /jobs/{job_id}) keep label cardinality bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        http_seconds.observe(time.perf_counter() - start, path=path, method=request.method)
+        http_requests.inc(path=path, method=request.method, status=status)
+
 # ---------------------- Constants ----------------------
 
-TEXT_SEARCH_URL = "https://places.googleapis.com/v1/places:searchText"
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
 
 # ---------------------- Request Models ----------------------
 
 class KMZRequest(BaseModel):
-    data: Any
-    bbox: List[List[float]]
-    search_term: str
+    # Either a stored result ID (bbox and search_term then default to the search's own) or the full data
+    result_id: Optional[str] = None
+    data: Any = None
+    bbox: Optional[List[List[float]]] = None
+    search_term: Optional[str] = None
 
 class EstimatorRequest(BaseModel):
     text_query: str
@@ -41,7 +108,15 @@ class EstimatorRequest(BaseModel):
     lng_ne: float
     google_api_key: str
     pageToken: Optional[str] = None
-    fieldMask: Optional[str] = "places.id,nextPageToken"
+    # Photos and reviews are only counted (not processed); the estimate scales with them.
+    # Defaults to ESTIMATE_FIELD_MASK, or SEARCH_FIELD_MASK with prefetch.
+    fieldMask: Optional[str] = None
+    # Fetch with the search mask so the /search_nearby that follows is served from the cache;
+    # costs a pricier text search when no search follows
+    prefetch: Optional[bool] = False
+    tiling: Optional[bool] = False
+    # Tiers the search will run ("reviews", "photos"); the totals cover only these. None estimates every tier.
+    tiers: Optional[list] = None
 
 class SearchNearbyRequest(BaseModel):
     text_query: str
@@ -54,57 +129,176 @@ class SearchNearbyRequest(BaseModel):
     google_api_key: str
     llm_key: Optional[str] = None
     vlm_key: Optional[str] = None
+    embedding_backend: Optional[Literal["openai", "local"]] = None
+    stream: Optional[Literal["ndjson", "sse"]] = None
+    vlm_batch: Optional[bool] = None
+    tiling: Optional[bool] = False
     pageToken: Optional[str] = None
-    fieldMask: Optional[str] = (
-        "places.displayName,places.types,places.websiteUri,places.nationalPhoneNumber,"
-        "places.formattedAddress,places.location,places.reviews,places.photos,"
-        "places.regularOpeningHours,places.googleMapsUri,nextPageToken"
-    )
+    # Top-level place fields to return (e.g. name, latitude, longitude, recommended); None returns everything.
+    # Only trims the response: stored results and exports keep every field.
+    fields: Optional[List[str]] = None
+    fieldMask: Optional[str] = SEARCH_FIELD_MASK
 
 # ---------------------- Helper Functions ----------------------
 
-def build_payload(text_query, lat_sw, lng_sw, lat_ne, lng_ne, page_token=None):
+def search_headers(req) -> dict:
     return {
-        "textQuery": text_query,
-        "locationRestriction": {
-            "rectangle": {
-                "low": {"latitude": lat_sw, "longitude": lng_sw},
-                "high": {"latitude": lat_ne, "longitude": lng_ne}
-            }
-        },
-        "pageToken": page_token
+        "Content-Type": "application/json",
+        "X-Goog-Api-Key": req.google_api_key,
+        "X-Goog-FieldMask": req.fieldMask
     }
 
-async def fetch_all_places(payload, headers) -> List[dict]:
-    """Fetches all paginated places from Google Places API."""
-    result = []
+async def search_places(req, headers) -> List[dict]:
+    """Runs the text search for a request, as one rectangle or as adaptive tiles."""
+    if req.tiling:
+        return await fetch_places_tiled(req.text_query, req.lat_sw, req.lng_sw, req.lat_ne, req.lng_ne, headers)
+    payload = build_payload(req.text_query, req.lat_sw, req.lng_sw, req.lat_ne, req.lng_ne, req.pageToken)
+    return await fetch_all_places(payload, headers)
 
-    async def fetch_page(p_token=None):
-        if p_token:
-            payload["pageToken"] = p_token
+async def search_place_pages(req, headers):
+    """
+    Text-search results for a request as an async stream of pages, so enrichment
+    can start on page 1 while later pages are fetched. The first page is awaited
+    here so Google errors still surface as HTTP errors.
+    """
+    if req.tiling:
+        with stage_timer("search"):
+            return as_pages(await search_places(req, headers))
+    payload = build_payload(req.text_query, req.lat_sw, req.lng_sw, req.lat_ne, req.lng_ne, req.pageToken)
+    pages = iter_place_pages(payload, headers)
+    with stage_timer("search"):
+        first_page = await anext(pages, [])
+    return prepend_page(first_page, pages)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(TEXT_SEARCH_URL, json=payload, headers=headers)
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.text)
+def result_meta(req) -> dict:
+    """What the exports need besides the places: the search term and the search rectangle as a closed ring."""
+    return {
+        "search_term": req.text_query,
+        "bbox": [
+            [req.lng_sw, req.lat_sw], [req.lng_sw, req.lat_ne], [req.lng_ne, req.lat_ne],
+            [req.lng_ne, req.lat_sw], [req.lng_sw, req.lat_sw],
+        ],
+    }
 
-            data = response.json()
-            result.extend(data.get("places", []))
-            if "nextPageToken" in data:
-                await fetch_page(data["nextPageToken"])
+async def load_result(result_id: str) -> tuple[list, dict]:
+    stored = await asyncio.to_thread(result_store.get, result_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired result '{result_id}'.")
+    return stored
+
+def log_image_stats(stats: dict):
+    if stats["images"]:
+        logger.info(
+            "[Images] %d images: %d bytes downloaded, %d bytes uploaded, %d bytes saved",
+            stats["images"], stats["original_bytes"], stats["uploaded_bytes"], bytes_saved(stats)
+        )
 
-    await fetch_page(payload.get("pageToken"))
+def encode_event(event: dict, stream_format: str) -> str:
+    """Serializes one stream event as an NDJSON line or an SSE message."""
+    data = json_dumps(event)
+    if stream_format == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+async def stream_search_events(req: SearchNearbyRequest, pages, context: dict, telemetry: dict):
+    """
+    Emits a 'start' event, one 'place' event per place as soon as it is enriched,
+    and a final 'recommendations' event from rank_live_results with the place total
+    and the ID of the stored result for the export endpoints.
+
+    Only the fields the recommender needs are kept uncompressed between events.
+    """
+    image_stats = start_image_stats()
+    yield encode_event({"event": "start"}, req.stream)
+
+    fields = parse_fields(req.fields)
+    views = {}
+    # Places arrive out of order; buffered until they can be written in index order
+    pending = {}
+    writer = ResultWriter()
+    try:
+        async for index, record in iter_formatted_places(pages, req.google_api_key, context):
+            views[index] = ranking_view(record)
+            pending[index] = record
+            while writer.count in pending:
+                writer.add(pending.pop(writer.count))
+            yield encode_event({"event": "place", "index": index, "data": project(record, fields)}, req.stream)
+
+        ordered_views = [views[i] for i in range(len(views))]
+        rank_index = await rank_places(ordered_views, req.prompt_info, req.vlm_key, req.embedding_backend)
+        recommendations = [
+            {"index": int(i), "recommended": True, "recommendation_confidance": label}
+            for i, label in (rank_index or [])
+        ]
+        log_image_stats(image_stats)
+        await save_telemetry(telemetry, image_stats)
+        result_id = await asyncio.to_thread(
+            result_store.save, writer.finish(), {**result_meta(req), "recommendations": recommendations}
+        )
+        yield encode_event(
+            {
+                "event": "recommendations", "total": len(views), "data": recommendations,
+                "image_stats": image_stats, "result_id": result_id,
+            },
+            req.stream
+        )
+    except Exception as e:
+        # Headers are already sent, so failures are reported in-band
+        yield encode_event({"event": "error", "detail": str(e)}, req.stream)
+
+async def count_pages(job_id: str, pages):
+    """Passes place pages through, adding each page's size to the job's progress total."""
+    async for page in pages:
+        await asyncio.to_thread(job_store.add_total, job_id, len(page))
+        yield page
+
+async def run_search_job(job_id: str, request: dict) -> list:
+    """Runs a submitted /jobs search, saving each enriched place as a partial result."""
+    req = SearchNearbyRequest(**request)
+    telemetry = start_telemetry(req.tiers)
+    pages = await search_place_pages(req, search_headers(req))
+
+    async def save_place(index, record):
+        await asyncio.to_thread(job_store.add_place, job_id, index, record)
+
+    image_stats = start_image_stats()
+    result = await response_formatter(
+        count_pages(job_id, pages), req.google_api_key, req.prompt_info, req.tiers, req.llm_key, req.vlm_key,
+        req.embedding_backend, req.vlm_batch, on_place=save_place
+    )
+    log_image_stats(image_stats)
+    await save_telemetry(telemetry, image_stats)
     return result
 
+def require_job_store():
+    if not job_store.available:
+        raise HTTPException(status_code=503, detail="Background jobs are unavailable: the job store could not be opened.")
+
+async def get_job_or_404(job_id: str) -> dict:
+    require_job_store()
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'.")
+    return job
+
 # ---------------------- Endpoints ----------------------
 
 @app.post("/get_excel")
 async def get_excel(request: Request):
+    """Excel export of {"result_id": ...} from a search, or of a posted {"places": [...]} result."""
+    try:
+        data = json_loads(await request.body())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON input for Excel conversion.")
+    if isinstance(data, dict) and data.get("result_id"):
+        places, _ = await load_result(data["result_id"])
+        data = {"places": places}
     try:
-        data = await request.json()
-        excel_io = json_to_excel(data)
+        # Built row by row into a spooled temp file on a worker thread, then streamed in chunks
+        with stage_timer("export_excel"):
+            excel_file = await asyncio.to_thread(json_to_excel_file, data)
         return StreamingResponse(
-            excel_io,
+            iter_file_chunks(excel_file),
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={"Content-Disposition": "attachment; filename=locations.xlsx"},
         )
@@ -114,14 +308,23 @@ async def get_excel(request: Request):
 
 @app.post("/get_kmz")
 async def get_kmz(request: KMZRequest):
+    """KMZ export of a stored result (by result_id) or of posted data with its bbox and search term."""
+    places, bbox, search_term = request.data, request.bbox, request.search_term
+    if request.result_id:
+        places, meta = await load_result(request.result_id)
+        bbox = bbox or meta["bbox"]
+        search_term = search_term or meta["search_term"]
+    elif places is None or bbox is None or search_term is None:
+        raise HTTPException(status_code=422, detail="Either result_id or data, bbox and search_term are required.")
     try:
-        wrapped_data = {"places": request.data}
-        kmz_file = json_to_kmz(wrapped_data, request.bbox, request.search_term)
+        wrapped_data = {"places": places}
+        with stage_timer("export_kmz"):
+            kmz_file = await asyncio.to_thread(json_to_kmz, wrapped_data, bbox, search_term)
         return StreamingResponse(
             kmz_file,
             media_type="application/vnd.google-earth.kmz",
             headers={
-                "Content-Disposition": f"attachment; filename={request.search_term.replace(' ', '_')}.kmz"
+                "Content-Disposition": f"attachment; filename={search_term.replace(' ', '_')}.kmz"
             }
         )
     except Exception as e:
@@ -129,30 +332,131 @@ async def get_kmz(request: KMZRequest):
 
 
 @app.post("/search_nearby")
-async def search_nearby_places(req: SearchNearbyRequest):
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": req.google_api_key,
-        "X-Goog-FieldMask": req.fieldMask
-    }
+async def search_nearby_places(req: SearchNearbyRequest, request: Request):
+    """
+    Searches and enriches places. With PROFILING_ENABLED, an X-Profile header or ?profile= flag
+    records a sampling profile and event-loop lag trace of the request (see profiling_service);
+    its ID is returned in X-Profile-ID.
+    """
+    if not profiling_requested(request.headers, request.query_params):
+        return await search_nearby_response(req)
 
-    payload = build_payload(req.text_query, req.lat_sw, req.lng_sw, req.lat_ne, req.lng_ne, req.pageToken)
-    places = await fetch_all_places(payload, headers)
-    formatted_data = await response_formatter(places, req.google_api_key, req.prompt_info, req.tiers, req.llm_key, req.vlm_key)
-    return JSONResponse(content=formatted_data)
+    profiler = RequestProfiler("/search_nearby", request_id_var.get())
+    profiler.start()
+    try:
+        response = await search_nearby_response(req)
+    except BaseException:
+        await profiler.finish()
+        raise
+    response.headers["X-Profile-ID"] = profiler.profile_id
+    if isinstance(response, StreamingResponse):
+        # A stream is profiled until its last event is sent
+        response.background = BackgroundTask(profiler.finish)
+    else:
+        await profiler.finish()
+    return response
+
+
+async def search_nearby_response(req: SearchNearbyRequest):
+    telemetry = start_telemetry(req.tiers)
+    pages = await search_place_pages(req, search_headers(req))
+
+    if req.stream:
+        # Set up before streaming starts so key errors still surface as HTTP errors
+        context = await prepare_enrichment(req.prompt_info, req.tiers, req.llm_key, req.vlm_key, req.vlm_batch)
+        return StreamingResponse(
+            stream_search_events(req, pages, context, telemetry),
+            media_type=STREAM_MEDIA_TYPES[req.stream],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    image_stats = start_image_stats()
+    formatted_data = await response_formatter(pages, req.google_api_key, req.prompt_info, req.tiers, req.llm_key, req.vlm_key, req.embedding_backend, req.vlm_batch)
+    log_image_stats(image_stats)
+    await save_telemetry(telemetry, image_stats)
+    headers = {"X-Image-Bytes-Saved": str(bytes_saved(image_stats)), "X-Images-Processed": str(image_stats["images"])}
+    # The body stays the plain list of places; the ID for the export endpoints travels in a header
+    result_id = await asyncio.to_thread(result_store.put, formatted_data, result_meta(req))
+    if result_id:
+        headers["X-Result-ID"] = result_id
+    fields = parse_fields(req.fields)
+    return FastJSONResponse(content=[project(record, fields) for record in formatted_data], headers=headers)
 
 
 @app.post("/estimator")
 async def estimate_query(req: EstimatorRequest):
     """
-    Estimates the total cost and time for a full query.
+    Estimates the cost and time of a full query for the requested tiers, calibrated on recorded searches.
     """
-    headers = {
-        "Content-Type": "application/json",
-        "X-Goog-Api-Key": req.google_api_key,
-        "X-Goog-FieldMask": req.fieldMask
-    }
+    if req.fieldMask is None:
+        req.fieldMask = SEARCH_FIELD_MASK if req.prefetch else ESTIMATE_FIELD_MASK
+    places = await search_places(req, search_headers(req))
 
-    payload = build_payload(req.text_query, req.lat_sw, req.lng_sw, req.lat_ne, req.lng_ne, req.pageToken)
-    places = await fetch_all_places(payload, headers)
-    return cost_time_predict(len(places))
+    counts = {"places": len(places), "tiers": req.tiers}
+    fields = mask_fields(req.fieldMask)
+    if "photos" in fields:
+        counts["photos"] = sum(len(place.get("photos", [])) for place in places)
+        counts["photo_places"] = sum(1 for place in places if place.get("photos"))
+    if "reviews" in fields:
+        counts["reviews"] = sum(len(place.get("reviews", [])) for place in places)
+        counts["reviewed_places"] = sum(1 for place in places if place.get("reviews"))
+    return await asyncio.to_thread(cost_time_predict, **counts)
+
+
+# ---------------------- Background Jobs ----------------------
+
+@app.post("/jobs", status_code=202)
+async def submit_job(req: SearchNearbyRequest):
+    """
+    Queues a /search_nearby request to run in the background and returns its job ID.
+    Streaming options are ignored; progress and results are polled from /jobs/{job_id}.
+    """
+    require_job_store()
+    job_id = await jobs.submit(req.model_dump(exclude={"stream"}))
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress (places enriched out of places found so far) of a job."""
+    return await get_job_or_404(job_id)
+
+
+@app.get("/jobs/{job_id}/places")
+async def get_job_places(job_id: str, offset: int = 0, fields: Optional[str] = None):
+    """
+    Places enriched so far, in place order from `offset`. Recommendations are only set in the final result.
+    `fields` is a comma-separated projection, as in /search_nearby.
+    """
+    job = await get_job_or_404(job_id)
+    if job["status"] == "completed":
+        result = await asyncio.to_thread(job_store.result, job_id)
+        places = [{"index": i, "data": record} for i, record in enumerate(result or [])][offset:]
+    else:
+        places = await asyncio.to_thread(job_store.places, job_id, offset)
+    projection = parse_fields(fields)
+    places = [{"index": place["index"], "data": project(place["data"], projection)} for place in places]
+    return FastJSONResponse(content={**job, "data": places})
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, fields: Optional[str] = None):
+    """Final result of a completed job, in the same shape as the /search_nearby response."""
+    job = await get_job_or_404(job_id)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; poll /jobs/{job_id} until it completes.")
+    result = await asyncio.to_thread(job_store.result, job_id)
+    projection = parse_fields(fields)
+    return FastJSONResponse(content=[project(record, projection) for record in result or []])
+
+
+# ---------------------- Metrics ----------------------
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of latency histograms, counters, in-flight gauges and cache hit ratios."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
@@ -1,19 +1,29 @@
 from fastapi import HTTPException
 from datetime import datetime
-from deep_translator import GoogleTranslator
-from openai import AsyncOpenAI,OpenAI
-from llm_service import get_review_summary
-from vlm_service import get_safe_prompt, generate_summary, analyze_image
+from openai import AsyncOpenAI
+from client_pool import get_http_client, get_async_openai_client
+from rate_limiter import governed_request, OPENAI_CHAT_CONCURRENCY
+from telemetry_service import record_usage, stage_timer, timed
+from metrics_service import places_in_flight
+from llm_service import get_review_summary_async
+from vlm_service import get_safe_prompt, generate_summary, analyze_image, analyze_images, VLM_BATCH_MODE
 from recommender_service import rank_live_results
+from translation_service import translate_many
+from places_service import as_pages, PLACES_API_URL
+from image_service import prepare_image, IMAGE_MAX_SIDE
+from insight_cache import NearDuplicateIndex, insight_key, content_id, get_insight, store_insight, store_insights
 from logging_service import logger
-import base64
-import aiohttp
-import httpx
+import asyncio
+import os
 
-# -------------------- UTILITIES --------------------
+# Overridable so the service can run against local stand-ins (benchmarks/fake_upstreams.py)
+STREET_VIEW_URL = os.getenv("STREET_VIEW_URL", "https://maps.googleapis.com/maps/api/streetview")
+
+# Places enriched at once per search. Every LLM/VLM call inside them goes through the
+# process-wide openai_chat governor, so the fan-out is sized to its concurrency cap.
+MAX_CONCURRENT_PLACES = OPENAI_CHAT_CONCURRENCY
 
-def translate(text: str) -> str:
-    return GoogleTranslator(source="auto", target="en").translate(text)
+# -------------------- UTILITIES --------------------
 
 def safe_get(obj: dict, keys: list, default="Not provided"):
     """Traverse nested dictionary using list of keys, return default on failure."""
@@ -21,6 +31,16 @@ def safe_get(obj: dict, keys: list, default="Not provided"):
         obj = obj.get(key, {})
     return obj if obj else default
 
+def collect_translatable(places: list, tiers: list) -> list:
+    """Gathers every place name and review author that the formatter will translate."""
+    texts = []
+    for place in places:
+        texts.append(safe_get(place, ["displayName", "text"], ""))
+        if "reviews" in tiers:
+            for r in place.get("reviews") or []:
+                texts.append(r.get("authorAttribution", {}).get("displayName", ""))
+    return texts
+
 # -------------------- IMAGE FUNCTIONS --------------------
 
 async def getting_street_view_image(location: str, key: str):
@@ -32,136 +52,399 @@ async def getting_street_view_image(location: str, key: str):
         "key": key,
         "location": location
     }
-    url = f"https://maps.googleapis.com/maps/api/streetview?" + "&".join(f"{k}={v}" for k, v in params.items())
+    url = f"{STREET_VIEW_URL}?" + "&".join(f"{k}={v}" for k, v in params.items())
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
+    response = await governed_request("street_view", get_http_client(), "GET", url)
 
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=f"Failed to fetch the image: {response.text}")
 
-    encoded = base64.b64encode(response.content).decode("utf-8")
+    encoded, _ = await prepare_image(response.content)
     return str(response.url), encoded
 
-async def get_photo(name: str, api_key: str) -> str | None:
+async def get_photo(name: str, api_key: str) -> tuple[str, int | None] | None:
+    """Downloads a place photo and returns it as a preprocessed data URL for the VLM, with its perceptual hash."""
     if not name:
         raise ValueError("The 'name' parameter cannot be empty.")
 
-    url = f"https://places.googleapis.com/v1/{name}/media?key={api_key}&maxWidthPx=800&maxHeightPx=600"
+    # Ask Google for roughly the size the VLM gets, so less is downloaded and resized
+    url = f"{PLACES_API_URL}/{name}/media?key={api_key}&maxWidthPx={IMAGE_MAX_SIDE}&maxHeightPx={IMAGE_MAX_SIDE}"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status == 200:
-                return base64.b64encode(await response.read()).decode('utf-8')
-            return None
+    response = await governed_request("place_photos", get_http_client(), "GET", url)
+    if response.status_code == 200:
+        return await prepare_image(response.content)
+    return None
 
-# -------------------- MAIN FORMATTER --------------------
+# -------------------- PLACE ENRICHMENT --------------------
 
-async def response_formatter(response: list, api_key: str, prompt_info: str, tiers: list, llm_key: str, vlm_key: str):
-    
-    result = []
+async def load_photo(photo: dict, api_key: str, vlm_prompt: str) -> dict | None:
+    """
+    Resolves a place photo to a cached insight, or downloads and preprocesses it for analysis.
 
-    try:
-        vlm_prompt = await get_safe_prompt(AsyncOpenAI(api_key=vlm_key), prompt_info)
-    except Exception as ex:
-        raise HTTPException(status_code=401, detail=str(ex))
+    Cached insights are looked up by photo name first (skipping the download) and then by
+    content hash. "keys" lists the cache keys the insight still has to be stored under.
+    Returns None if the photo is unavailable.
+    """
+    name_key = insight_key(photo["name"], vlm_prompt)
+    vlm_insight = await get_insight(name_key)
+    if vlm_insight is not None:
+        return {"photo": photo, "insight": vlm_insight, "keys": []}
 
-    # Define llm/vlm clients
-    llm_client = OpenAI(api_key=llm_key)
-    vlm_client=AsyncOpenAI(api_key=vlm_key)
-
-    for place in response:
-        new_data = {
-            "name": {
-                "original_name": safe_get(place, ["displayName", "text"]),
-                "translated_name": translate(safe_get(place, ["displayName", "text"], ""))
-            },
-            "type": place.get("types", ["Type is not provided"])[0],
-            "website": place.get("websiteUri", "Website is not provided"),
-            "google_maps_url": place.get("googleMapsUri", "Google maps url is not provided"),
-            "phone_number": place.get("nationalPhoneNumber", "Phone number is not provided"),
-            "address": place.get("formattedAddress", "Address is not provided"),
-            "latitude": safe_get(place, ["location", "latitude"]),
-            "longitude": safe_get(place, ["location", "longitude"]),
-        }
+    prepared = await get_photo(photo["name"], api_key)
+    if not prepared:
+        return None
+    encoded, phash = prepared
+    hash_key = insight_key(content_id(encoded), vlm_prompt)
+    vlm_insight = await get_insight(hash_key)
+    return {
+        "photo": photo, "insight": vlm_insight, "encoded": encoded, "phash": phash,
+        "keys": [name_key] if vlm_insight is not None else [name_key, hash_key]
+    }
+
+async def describe_photo(photo: dict, api_key: str, vlm_client: AsyncOpenAI, vlm_prompt: str, duplicates: NearDuplicateIndex) -> dict | None:
+    """
+    Downloads a single place photo and runs it through the VLM. Returns None if the photo is unavailable.
+    Near-duplicate shots of the same place share one analysis.
+    """
+    item = await load_photo(photo, api_key, vlm_prompt)
+    if item is None:
+        return None
 
-        if "reviews" in tiers and place.get("reviews"):
+    vlm_insight = item["insight"]
+    if vlm_insight is None:
+        analysis, owner = duplicates.claim(item["phash"])
+        if owner:
             try:
-                reviews = place["reviews"]
-                new_data["reviews_summary"] = get_review_summary(llm_client, reviews)
-                new_data["reviews"] = []
-                ratings, times = [], []
-
-                for r in reviews:
-                    review_data = {
-                        "author_name": {
-                            "original_name": r["authorAttribution"]["displayName"],
-                            "translated_name": translate(r["authorAttribution"]["displayName"])
-                        },
-                        "review_url": r.get("googleMapsUri"),
-                        "text": r["text"]["text"],
-                        "original_text": r["originalText"]["text"],
-                        "original_language": r["originalText"]["languageCode"],
-                        "author_url": r["authorAttribution"]["uri"],
-                        "publish_date": r["relativePublishTimeDescription"],
-                        "rating": r["rating"]
-                    }
-                    ratings.append(r["rating"])
-                    times.append(r["publishTime"])
-                    new_data["reviews"].append(review_data)
-
-                new_data["rating"] = f"average: {sum(ratings)/len(ratings):.1f} out of {len(ratings)} reviews"
-
-                timestamps = [datetime.fromisoformat(t[:26]).date() for t in times]
-                new_data["reviews_span"] = (
-                    f"latest date: {max(timestamps)}, most recent date: {min(timestamps)}, "
-                    f"date difference: {(max(timestamps) - min(timestamps)).days} days"
-                )
-            except Exception as e:
-                new_data["reviews"] = "Error parsing reviews"
+                analysis.set_result(await analyze_image(vlm_client, item["encoded"], vlm_prompt))
+            except BaseException:
+                # Photos waiting on this analysis fail with it rather than hang
+                analysis.cancel()
+                raise
+        vlm_insight = await analysis
+    await store_insight(vlm_insight, *item["keys"])
+
+    return {
+        "vlm_insight": vlm_insight,
+        "url": photo["googleMapsUri"]
+    }
+
+async def describe_photos_batched(photos: list, api_key: str, vlm_client: AsyncOpenAI, vlm_prompt: str) -> tuple[list, str | None]:
+    """
+    Describes all photos of a place with batched vision requests (vlm_service.analyze_images).
+
+    Returns:
+        tuple: Photo records in input order (unavailable photos skipped) and the batch
+        summary, or None when generate_summary still has to run.
+    """
+    loaded = await asyncio.gather(*(load_photo(photo, api_key, vlm_prompt) for photo in photos), return_exceptions=True)
+    items = []
+    for photo, item in zip(photos, loaded):
+        if isinstance(item, BaseException):
+            logger.error("Photo %s failed: %s", photo.get('name'), item)
+        elif item:
+            items.append(item)
+
+    # Only one photo per group of near-duplicates is sent to the VLM
+    duplicates = NearDuplicateIndex()
+    owners = []
+    for item in items:
+        if item["insight"] is None:
+            item["analysis"], owner = duplicates.claim(item["phash"])
+            if owner:
+                owners.append(item)
+
+    summary = None
+    if owners:
+        try:
+            result = await analyze_images(vlm_client, [item["encoded"] for item in owners], vlm_prompt)
+        except BaseException:
+            for item in owners:
+                item["analysis"].cancel()
+            raise
+        for item, insight in zip(owners, result["insights"]):
+            item["analysis"].set_result(insight)
+        # The batch summary only covers every photo when none came from the cache or a duplicate
+        if len(owners) == len(items):
+            summary = result["summary"]
+
+    records, fresh = [], {}
+    for item in items:
+        vlm_insight = item["insight"] if item["insight"] is not None else await item["analysis"]
+        fresh.update((key, vlm_insight) for key in item["keys"])
+        records.append({"vlm_insight": vlm_insight, "url": item["photo"]["googleMapsUri"]})
+    # One cache write for the whole place
+    await store_insights(fresh)
+    return records, summary
+
+async def describe_street_view(place: dict, api_key: str, vlm_client: AsyncOpenAI, vlm_prompt: str):
+    try:
+        loc = f"{place['location']['latitude']},{place['location']['longitude']}"
+        # Street view at fixed coordinates does not change, so the location identifies the image
+        location_key = insight_key(f"streetview:{loc}", vlm_prompt)
+        vlm_insight = await get_insight(location_key)
+        if vlm_insight is None:
+            _, street_image = await getting_street_view_image(loc, api_key)
+            vlm_insight = await analyze_image(vlm_client, street_image, vlm_prompt)
+            await store_insight(vlm_insight, location_key)
+        return {
+            "vlm_insight": vlm_insight,
+            "url": "URL contains API key, not exposed"
+        }
+    except Exception:
+        return "Street view is not available"
+
+async def format_place(place: dict, api_key: str, tiers: list, llm_client: AsyncOpenAI, vlm_client: AsyncOpenAI, vlm_prompt: str, translations: asyncio.Future, vlm_batch: bool = False) -> dict:
+    """
+    Builds the enriched record for a single place. Photos and street view are processed concurrently.
+    `translations` resolves to the page's name translations; it is only awaited once the rest
+    of the record is built, so translating never holds up reviews or photo analysis.
+    """
+    display_name = safe_get(place, ["displayName", "text"], "")
+    new_data = {
+        "name": {
+            "original_name": safe_get(place, ["displayName", "text"]),
+            "translated_name": display_name
+        },
+        "type": place.get("types", ["Type is not provided"])[0],
+        "website": place.get("websiteUri", "Website is not provided"),
+        "google_maps_url": place.get("googleMapsUri", "Google maps url is not provided"),
+        "phone_number": place.get("nationalPhoneNumber", "Phone number is not provided"),
+        "address": place.get("formattedAddress", "Address is not provided"),
+        "latitude": safe_get(place, ["location", "latitude"]),
+        "longitude": safe_get(place, ["location", "longitude"]),
+    }
+
+    record_usage(places=1)
+
+    # The review summary runs in the background while reviews are parsed and photos analyzed
+    summary_task = None
+    if "reviews" in tiers and place.get("reviews"):
+        record_usage(reviewed_places=1, reviews=len(place["reviews"]))
+        summary_task = asyncio.create_task(timed("place_reviews", get_review_summary_async(llm_client, place["reviews"])))
+        try:
+            reviews = place["reviews"]
+            new_data["reviews"] = []
+            ratings, times = [], []
+
+            for r in reviews:
+                author = r["authorAttribution"]["displayName"]
+                review_data = {
+                    "author_name": {
+                        "original_name": author,
+                        "translated_name": author
+                    },
+                    "review_url": r.get("googleMapsUri"),
+                    "text": r["text"]["text"],
+                    "original_text": r["originalText"]["text"],
+                    "original_language": r["originalText"]["languageCode"],
+                    "author_url": r["authorAttribution"]["uri"],
+                    "publish_date": r["relativePublishTimeDescription"],
+                    "rating": r["rating"]
+                }
+                ratings.append(r["rating"])
+                times.append(r["publishTime"])
+                new_data["reviews"].append(review_data)
+
+            new_data["rating"] = f"average: {sum(ratings)/len(ratings):.1f} out of {len(ratings)} reviews"
 
-        if "photos" in tiers and place.get("photos"):
+            timestamps = [datetime.fromisoformat(t[:26]).date() for t in times]
+            new_data["reviews_span"] = (
+                f"latest date: {max(timestamps)}, most recent date: {min(timestamps)}, "
+                f"date difference: {(max(timestamps) - min(timestamps)).days} days"
+            )
+        except Exception as e:
+            new_data["reviews"] = "Error parsing reviews"
+
+    if "photos" in tiers and place.get("photos"):
+        record_usage(photo_places=1, photos=len(place["photos"]))
+        with stage_timer("place_photos"):
             try:
                 new_data["url_to_all_photos"] = place["photos"][0].get("googleMapsUri", "")
-                new_data["photos"] = []
-
-                for photo in place["photos"]:
-                    encoded = await get_photo(photo["name"], api_key)
-                    if not encoded:
-                        continue
-                    vlm_insight = await analyze_image(vlm_client,encoded, vlm_prompt)
-                    new_data["photos"].append({
-                        "vlm_insight": vlm_insight,
-                        "url": photo["googleMapsUri"]
-                    })
+
+                # Street view runs alongside the photos; gather keeps photo order stable
+                street_view_task = asyncio.create_task(describe_street_view(place, api_key, vlm_client, vlm_prompt))
+                batch_summary = None
+                if vlm_batch:
+                    new_data["photos"], batch_summary = await describe_photos_batched(place["photos"], api_key, vlm_client, vlm_prompt)
+                else:
+                    duplicates = NearDuplicateIndex()
+                    described = await asyncio.gather(
+                        *(describe_photo(photo, api_key, vlm_client, vlm_prompt, duplicates) for photo in place["photos"]),
+                        return_exceptions=True
+                    )
+                    new_data["photos"] = []
+                    for photo, outcome in zip(place["photos"], described):
+                        if isinstance(outcome, BaseException):
+                            logger.error("Photo %s failed: %s", photo.get('name'), outcome)
+                            continue
+                        if outcome:
+                            new_data["photos"].append(outcome)
 
                 new_data["prompt_used"] = vlm_prompt
-                new_data["photos_summary"] = await generate_summary(vlm_client,new_data["photos"])
-
-                # Street view image
-                try:
-                    loc = f"{place['location']['latitude']},{place['location']['longitude']}"
-                    _, street_image = await getting_street_view_image(loc, api_key)
-                    new_data["street_view"] = {
-                        "vlm_insight": await analyze_image(vlm_client,street_image, vlm_prompt),
-                        "url": "URL contains API key, not exposed"
-                    }
-                except Exception:
-                    new_data["street_view"] = "Street view is not available"
+                new_data["photos_summary"] = batch_summary or await generate_summary(vlm_client, new_data["photos"])
+                new_data["street_view"] = await street_view_task
 
             except KeyError:
                 new_data["photos"] = "Photos are not available"
 
-        new_data["working_hours"] = place.get("regularOpeningHours", {}).get("weekdayDescriptions", "Not provided")
-        result.append(new_data)
+    if summary_task is not None:
+        # A failed summary must not throw away the reviews and photo analysis gathered above
+        try:
+            new_data["reviews_summary"] = await summary_task
+        except Exception as e:
+            logger.error("Failed to generate review summary: %s", e)
+            new_data["reviews_summary"] = f"Failed to generate review summary: {e}"
+
+    new_data["working_hours"] = place.get("regularOpeningHours", {}).get("weekdayDescriptions", "Not provided")
+
+    # A failed translation pass leaves names untranslated rather than discarding the enrichment
+    try:
+        translated = await translations
+    except Exception as e:
+        logger.error("Failed to translate names: %s", e)
+        translated = {}
+    new_data["name"]["translated_name"] = translated.get(display_name, display_name)
+    if isinstance(new_data.get("reviews"), list):
+        for review in new_data["reviews"]:
+            author = review["author_name"]["original_name"]
+            review["author_name"]["translated_name"] = translated.get(author, author)
+    return new_data
+
+def fallback_place(place: dict) -> dict:
+    """Minimal record used when enrichment of a place fails, so one bad place does not drop the rest."""
+    return {
+        "name": {
+            "original_name": safe_get(place, ["displayName", "text"]),
+            "translated_name": safe_get(place, ["displayName", "text"])
+        },
+        "type": place.get("types", ["Type is not provided"])[0],
+        "website": place.get("websiteUri", "Website is not provided"),
+        "google_maps_url": place.get("googleMapsUri", "Google maps url is not provided"),
+        "phone_number": place.get("nationalPhoneNumber", "Phone number is not provided"),
+        "address": place.get("formattedAddress", "Address is not provided"),
+        "latitude": safe_get(place, ["location", "latitude"]),
+        "longitude": safe_get(place, ["location", "longitude"]),
+        "working_hours": place.get("regularOpeningHours", {}).get("weekdayDescriptions", "Not provided"),
+    }
+
+# -------------------- MAIN FORMATTER --------------------
+
+async def prepare_enrichment(prompt_info: str, tiers: list, llm_key: str, vlm_key: str, vlm_batch: bool | None = None) -> dict:
+    """Resolves the safe VLM prompt, pooled clients and VLM mode shared by every place of a search."""
+    tiers = tiers or []
+
+    try:
+        vlm_prompt = await get_safe_prompt(get_async_openai_client(vlm_key), prompt_info)
+    except Exception as ex:
+        raise HTTPException(status_code=401, detail=str(ex))
+
+    return {
+        "tiers": tiers,
+        "vlm_prompt": vlm_prompt,
+        # Define llm/vlm clients (pooled per API key)
+        "llm_client": get_async_openai_client(llm_key) if "reviews" in tiers else None,
+        "vlm_client": get_async_openai_client(vlm_key),
+        # Several photos per vision request instead of one call per photo
+        "vlm_batch": VLM_BATCH_MODE if vlm_batch is None else vlm_batch,
+    }
+
+async def iter_formatted_places(pages, api_key: str, context: dict):
+    """
+    Enriches places concurrently and yields (index, record) pairs in completion order.
+
+    `pages` is an async iterable of place lists (see places_service.iter_place_pages),
+    so enrichment of the first page starts while later pages are still being fetched.
+    Indexes follow the order places arrive in. A place that fails enrichment is
+    yielded with its basic fields only; a failed page fetch is re-raised. If the
+    consumer stops early (e.g. a streaming client disconnects), the remaining
+    work is cancelled.
+    """
+    # Places are enriched concurrently; the VLM semaphore caps the actual upstream calls
+    place_semaphore = asyncio.Semaphore(MAX_CONCURRENT_PLACES)
+    done = asyncio.Queue()
+    tasks = []
+
+    async def bounded_format(index, place, translations):
+        async with place_semaphore:
+            try:
+                with places_in_flight.track():
+                    record = await format_place(
+                        place, api_key, context["tiers"], context["llm_client"], context["vlm_client"],
+                        context["vlm_prompt"], translations, context["vlm_batch"]
+                    )
+            except Exception as e:
+                logger.error("Failed to enrich place %s: %s", safe_get(place, ['displayName', 'text']), e)
+                record = fallback_place(place)
+        done.put_nowait((index, record))
+
+    async def schedule_pages():
+        # Reports the total number of places, or the page fetch error, once pagination ends
+        total = 0
+        try:
+            async for page in pages:
+                # The page's names are translated in the background while its places are enriched
+                translations = asyncio.create_task(translate_many(collect_translatable(page, context["tiers"])))
+                tasks.append(translations)
+                for place in page:
+                    tasks.append(asyncio.create_task(bounded_format(total, place, translations)))
+                    total += 1
+        except Exception as e:
+            done.put_nowait(e)
+            return
+        done.put_nowait(total)
+
+    producer = asyncio.create_task(schedule_pages())
+    total, yielded = None, 0
+    try:
+        with stage_timer("enrich"):
+            while total is None or yielded < total:
+                item = await done.get()
+                if isinstance(item, Exception):
+                    raise item
+                if isinstance(item, int):
+                    total = item
+                    continue
+                yielded += 1
+                yield item
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+def ranking_view(record: dict) -> dict:
+    """
+    The subset of a formatted place the recommender reads (the name and each photo's
+    insight), so streams can drop the full record once it is sent. Review lists are left
+    out: rank_live_results only takes reviews from a dict, and formatted reviews are a list.
+    """
+    photos = record.get("photos")
+    insights = [{"vlm_insight": photo["vlm_insight"]} for photo in photos if photo.get("vlm_insight")] if isinstance(photos, list) else []
+    return {"name": record.get("name"), "photos": insights}
+
+async def rank_places(records: list, prompt_info: str, vlm_key: str, embedding_backend: str | None = None):
+    # Setting different threshhold for the ranking base of the total number of places.
+    top_n = 1 if len(records) <= 3 else 3
+    with stage_timer("rank"):
+        return await rank_live_results(records, prompt_info, vlm_key, top_n, embedding_backend)
+
+async def response_formatter(response, api_key: str, prompt_info: str, tiers: list, llm_key: str, vlm_key: str, embedding_backend: str | None = None, vlm_batch: bool | None = None, on_place=None):
+    
+    """
+    Enriches a list of places, or an async iterable of place pages, and flags recommendations.
+    `on_place(index, record)`, if given, is awaited as each place finishes (used for job progress).
+    """
+    context = await prepare_enrichment(prompt_info, tiers, llm_key, vlm_key, vlm_batch)
+    pages = as_pages(response) if isinstance(response, list) else response
+
+    # Records are placed by arrival index, so output order stays deterministic
+    records = {}
+    async for index, record in iter_formatted_places(pages, api_key, context):
+        records[index] = record
+        if on_place is not None:
+            await on_place(index, record)
+    result = [records[i] for i in range(len(records))]
 
-        # Setting different threshhold for the ranking base of the total number of places
-    if len(result)<=3:
-        rank_index=rank_live_results(result, prompt_info, vlm_key, top_n=1)
-    elif len(result)>=10:
-        rank_index=rank_live_results(result, prompt_info, vlm_key)
-    else:
-        rank_index=rank_live_results(result, prompt_info, vlm_key)
+    rank_index = await rank_places(result, prompt_info, vlm_key, embedding_backend)
     
     if rank_index:
         for i in rank_index:
@@ -0,0 +1,203 @@
+"""
+End-to-end throughput benchmark against local stand-in upstreams.
+
+Starts benchmarks.fake_upstreams, then for each tier combination a fresh service
+process (uvicorn, own empty cache directory) pointed at it, and drives /estimator,
+/search_nearby, /get_excel and /get_kmz over HTTP. Every search uses a new query so
+caches do not hide upstream work. Reports p50/p99 latency and throughput per
+endpoint, the service's peak RSS and the upstream calls it made.
+
+Run from backend/:
+    python -m benchmarks.bench_e2e [--searches 6] [--concurrency 2] [--tiers none reviews photos reviews+photos]
+        [--latency-scale 0.2] [--error-rate 0.01] [--rate-limit-rate 0.02] [--vlm-batch]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIER_COMBINATIONS = {"none": [], "reviews": ["reviews"], "photos": ["photos"], "reviews+photos": ["reviews", "photos"]}
+SEARCH_AREA = {"lat_sw": 38.88, "lng_sw": -77.05, "lat_ne": 38.92, "lng_ne": -77.00}
+STARTUP_TIMEOUT = 60
+REQUEST_TIMEOUT = 600
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_process(args: list, env: dict | None = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=BACKEND_DIR, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {STARTUP_TIMEOUT}s")
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Peak resident set size of a running process (Linux /proc only)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+async def timed_request(client, method, url, samples: list, errors: list, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        errors.append(str(e).splitlines()[0])
+        return None
+    samples.append(time.perf_counter() - start)
+    return response
+
+
+async def run_phase(name, make_requests, concurrency, results):
+    """Runs the request coroutines `concurrency` at a time and records latencies and wall time under `name`."""
+    samples, errors = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(factory):
+        async with semaphore:
+            return await factory(samples, errors)
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(bounded(factory) for factory in make_requests))
+    results[name] = {"samples": samples, "errors": errors, "wall": time.perf_counter() - start}
+    return responses
+
+
+async def run_scenario(label, tiers, args, upstream_url):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        service = start_process(
+            ["-m", "uvicorn", "api_service:app", "--port", str(port), "--log-level", "warning"],
+            env={
+                "PLAID_CACHE_DIR": cache_dir,
+                "PLACES_API_URL": f"{upstream_url}/v1",
+                "STREET_VIEW_URL": f"{upstream_url}/maps/api/streetview",
+                "OPENAI_BASE_URL": f"{upstream_url}/v1",
+                "EMBEDDING_BACKEND": "openai",
+                "LOG_LEVEL": "WARNING",
+            },
+        )
+        results = {}
+        try:
+            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+                await wait_ready(client, f"{base}/metrics", service)
+                before = (await client.get(f"{upstream_url}/_stats")).json()
+                run_id = f"{label}-{time.time_ns()}"
+                keys = {"google_api_key": "fake", "llm_key": "fake", "vlm_key": "fake"}
+
+                def search_body(i):
+                    return {
+                        **SEARCH_AREA, **keys, "text_query": f"cafe {run_id} {i}", "prompt_info": "outdoor seating",
+                        "tiers": tiers, "vlm_batch": args.vlm_batch,
+                    }
+
+                def request(method, path, **kwargs):
+                    return lambda samples, errors: timed_request(client, method, f"{base}{path}", samples, errors, **kwargs)
+
+                await run_phase(
+                    "/estimator", [request("POST", "/estimator", json=search_body(i)) for i in range(args.searches)],
+                    args.concurrency, results
+                )
+                responses = await run_phase(
+                    "/search_nearby", [request("POST", "/search_nearby", json=search_body(i)) for i in range(args.searches)],
+                    args.concurrency, results
+                )
+                result_ids = [r.headers["X-Result-ID"] for r in responses if r is not None and "X-Result-ID" in r.headers]
+                await run_phase(
+                    "/get_excel", [request("POST", "/get_excel", json={"result_id": rid}) for rid in result_ids],
+                    args.concurrency, results
+                )
+                await run_phase(
+                    "/get_kmz", [request("POST", "/get_kmz", json={"result_id": rid}) for rid in result_ids],
+                    args.concurrency, results
+                )
+                after = (await client.get(f"{upstream_url}/_stats")).json()
+            rss = peak_rss_mb(service.pid)
+        finally:
+            service.terminate()
+            service.wait()
+    upstream_calls = {key: after.get(key, 0) - before.get(key, 0) for key in after if after.get(key, 0) != before.get(key, 0)}
+    return results, rss, upstream_calls
+
+
+def report(label, results, rss, upstream_calls):
+    print(f"\n== tiers: {label}  (service peak RSS: {f'{rss:.0f} MB' if rss is not None else 'n/a'})")
+    print(f"{'endpoint':<16} {'ok':>4} {'err':>4} {'p50 s':>8} {'p99 s':>8} {'req/s':>7}")
+    for name, phase in results.items():
+        samples = phase["samples"]
+        p50, p99 = (np.percentile(samples, [50, 99]) if samples else (float("nan"),) * 2)
+        throughput = len(samples) / phase["wall"] if phase["wall"] else 0.0
+        print(f"{name:<16} {len(samples):>4} {len(phase['errors']):>4} {p50:>8.3f} {p99:>8.3f} {throughput:>7.2f}")
+        for error in phase["errors"][:3]:
+            print(f"    error: {error}")
+    print("upstream calls: " + (", ".join(f"{k}={v}" for k, v in sorted(upstream_calls.items())) or "none"))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--searches", type=int, default=6, help="searches (and estimates, exports) per tier combination")
+    parser.add_argument("--concurrency", type=int, default=2, help="requests in flight per endpoint")
+    parser.add_argument("--tiers", nargs="+", default=list(TIER_COMBINATIONS), choices=list(TIER_COMBINATIONS))
+    parser.add_argument("--vlm-batch", action="store_true", help="use batched vision requests")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="passed to fake_upstreams")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="passed to fake_upstreams")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="passed to fake_upstreams")
+    parser.add_argument("--places-per-query", type=int, default=60, help="passed to fake_upstreams")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    upstream = start_process([
+        "-m", "benchmarks.fake_upstreams", "--port", str(upstream_port),
+        "--latency-scale", str(args.latency_scale), "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate), "--places-per-query", str(args.places_per_query),
+    ])
+    try:
+        async with httpx.AsyncClient() as client:
+            await wait_ready(client, f"{upstream_url}/healthz", upstream)
+        print(
+            f"{args.searches} searches x {args.places_per_query} places per tier combination, concurrency {args.concurrency}, "
+            f"latency x{args.latency_scale}, errors {args.error_rate:.0%}, 429s {args.rate_limit_rate:.0%}"
+        )
+        for label in args.tiers:
+            report(label, *await run_scenario(label, TIER_COMBINATIONS[label], args, upstream_url))
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
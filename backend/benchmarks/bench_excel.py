@@ -0,0 +1,96 @@
+"""
+Memory benchmark for the Excel export.
+
+Builds synthetic enriched results (5 reviews and 10 photos per place) and
+exports them with the in-memory json_to_excel and the streaming
+json_to_excel_file, reporting wall time, peak RSS growth and file size at
+100, 1k and 10k places. Each export runs in a fresh child process, so peaks
+are not hidden by memory freed from an earlier run (Linux /proc only).
+
+Run from backend/:  python -m benchmarks.bench_excel [sizes...]
+"""
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from excel_converter import json_to_excel, json_to_excel_file
+
+DEFAULT_SIZES = [100, 1_000, 10_000]
+
+
+def make_places(count):
+    return {"places": [
+        {
+            "name": {"original_name": f"Place {i}", "translated_name": f"Place {i}"},
+            "address": f"{i} Example Street",
+            "phone_number": "+1 555 0100",
+            "latitude": 38.9 + i * 1e-5,
+            "longitude": -77.0 - i * 1e-5,
+            "working_hours": ["Monday: 9:00 AM - 5:00 PM"] * 7,
+            "website": "https://example.com",
+            "google_maps_url": f"https://maps.google.com/?cid={1000000 + i}",
+            "reviews_summary": "Summary of reviews. " * 10,
+            "rating": "average: 4.2 out of 5 reviews",
+            "reviews_span": "latest date: 2025-01-01, most recent date: 2024-01-01, date difference: 366 days",
+            "photos_summary": "Summary of photos. " * 10,
+            "url_to_all_photos": "https://maps.google.com/photos",
+            "prompt_used": "Describe the storefront.",
+            "street_view": {"vlm_insight": "A street. " * 10, "url": "URL contains API key, not exposed"},
+            # Sheet names come from the first 15 characters of the name, so they must differ there
+            "reviews": [
+                {
+                    "author_name": {"original_name": "Author", "translated_name": "Author"},
+                    "review_url": "https://maps.google.com/review",
+                    "text": "Review text. " * 20, "original_text": "Review text. " * 20,
+                    "original_language": "en", "author_url": "https://maps.google.com/author",
+                    "publish_date": "a month ago", "rating": 4,
+                }
+                for _ in range(5)
+            ],
+            "photos": [{"url": "https://maps.google.com/photo", "vlm_insight": "A photo. " * 15} for _ in range(10)],
+        }
+        for i in range(count)
+    ]}
+
+
+EXPORTS = {"in-memory": json_to_excel, "streaming": json_to_excel_file}
+
+
+def memory_kb(field: str) -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+    raise RuntimeError(f"{field} not found in /proc/self/status")
+
+
+def measure(mode, count):
+    """Runs one export in the current (child) process: seconds, peak RSS growth in bytes, file size."""
+    data = make_places(count)
+    baseline = memory_kb("VmRSS:")
+    # Resets the peak (VmHWM) to the current RSS, so it covers only the export
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+    start = time.perf_counter()
+    output = EXPORTS[mode](data)
+    elapsed = time.perf_counter() - start
+    peak = (memory_kb("VmHWM:") - baseline) * 1024
+    size = output.seek(0, 2)
+    output.close()
+    return elapsed, peak, size
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'places':>8} {'mode':<10} {'seconds':>8} {'peak RSS MB':>12} {'file MB':>8}")
+    context = multiprocessing.get_context("fork")
+    for count in sizes:
+        for mode in EXPORTS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, peak, size = executor.submit(measure, mode, count).result()
+            print(f"{count:>8} {mode:<10} {elapsed:>8.2f} {peak / 2**20:>12.1f} {size / 2**20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark for the KMZ export.
+
+Compares the previous simplekml object-graph export (one inline style per
+point) against kmz_converter.json_to_kmz on synthetic places, checks that
+both produce the same placemarks, and prints time, peak Python heap
+(tracemalloc) and KMZ size.
+
+Run from backend/:  python -m benchmarks.bench_kmz [sizes...]
+"""
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zipfile
+from io import BytesIO
+
+import simplekml
+
+from kmz_converter import (
+    format_hours, generalize, get_icon, get_list, get_string, get_sw_ne_coordinates, json_to_kmz, TYPE_MAPPING,
+)
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+BBOX = [[-77.1, 38.8], [-77.1, 39.0], [-76.9, 39.0], [-76.9, 38.8], [-77.1, 38.8]]
+TYPES = list(TYPE_MAPPING) + ["museum", "bank"]
+KML_NS = "{http://www.opengis.net/kml/2.2}"
+
+
+def legacy_kmz(data, bbox_tuples, search_term):
+    """The KMZ export as it was before the streaming writer."""
+    output = BytesIO()
+    kml = simplekml.Kml()
+    pol = kml.newpolygon(name='Search Area')
+    pol.outerboundaryis = bbox_tuples
+    pol.style.linestyle.color = simplekml.Color.red
+    pol.style.linestyle.width = 2
+    pol.style.polystyle.fill = 0
+    sw, ne = get_sw_ne_coordinates(bbox_tuples)
+    pol.description = f"Search Term: {search_term}\nSW: {sw}\nNE: {ne}"
+    for item in data.get('places', []):
+        name_data = item.get('name', {})
+        name = f"{get_string(name_data, 'original_name')}:{get_string(name_data, 'translated_name')}"
+        desc = f"""
+        Phone: {get_string(item, 'phone_number')}
+        Address: {get_string(item, 'address')}
+        Website: {get_string(item, 'website')}
+        Hours: {format_hours(get_list(item, 'working_hours'))}
+        Google Maps: {get_string(item, 'Maps_url')}
+        """.strip()
+        pnt = kml.newpoint(name=name, coords=[(get_string(item, 'longitude'), get_string(item, 'latitude'))])
+        pnt.description = desc
+        pnt.style.iconstyle.icon.href = get_icon(generalize(get_string(item, 'type')))
+        pnt.style.iconstyle.scale = 1.5
+    kml.savekmz(output)
+    output.seek(0)
+    return output
+
+
+def make_places(count):
+    return {"places": [
+        {
+            "name": {"original_name": f"Café & Bar {i}", "translated_name": f"Cafe <{i}>"},
+            "type": TYPES[i % len(TYPES)],
+            "address": f"{i} Example Street",
+            "phone_number": "+1 555 0100",
+            "website": "https://example.com/?a=1&b=2",
+            "google_maps_url": f"https://maps.google.com/?cid={1000000 + i}",
+            "working_hours": ["Monday: 9:00 AM - 5:00 PM"] * 7,
+            "latitude": 38.8 + (i % 1000) * 2e-4,
+            "longitude": -77.1 + (i // 1000) * 2e-4,
+        }
+        for i in range(count)
+    ]}
+
+
+def placemarks(kmz):
+    """(name, icon href, coordinates) of each point placemark, resolving shared styles."""
+    root = ET.fromstring(zipfile.ZipFile(kmz).read("doc.kml"))
+    icons = {
+        style.get("id"): style.findtext(f"{KML_NS}IconStyle/{KML_NS}Icon/{KML_NS}href")
+        for style in root.iter(f"{KML_NS}Style")
+    }
+    result = []
+    for mark in root.iter(f"{KML_NS}Placemark"):
+        coords = mark.findtext(f"{KML_NS}Point/{KML_NS}coordinates")
+        if coords is None:
+            continue
+        lng, lat = coords.split(",")[:2]
+        icon = icons[mark.findtext(f"{KML_NS}styleUrl").lstrip("#")]
+        result.append((mark.findtext(f"{KML_NS}name"), icon, (float(lng), float(lat))))
+    return result
+
+
+def measure(export, data):
+    tracemalloc.start()
+    start = time.perf_counter()
+    output = export(data, BBOX, "coffee")
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return output, elapsed, peak
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'places':>8} {'mode':<10} {'seconds':>8} {'peak heap MB':>13} {'kmz KB':>8}")
+    for count in sizes:
+        data = make_places(count)
+        outputs = []
+        for mode, export in (("simplekml", legacy_kmz), ("streaming", json_to_kmz)):
+            output, elapsed, peak = measure(export, data)
+            outputs.append(output)
+            print(f"{count:>8} {mode:<10} {elapsed:>8.2f} {peak / 2**20:>13.1f} {len(output.getvalue()) / 1024:>8.0f}")
+        assert placemarks(outputs[0]) == placemarks(outputs[1]), "placemarks differ"
+
+
+if __name__ == "__main__":
+    main()
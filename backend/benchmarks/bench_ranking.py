@@ -0,0 +1,94 @@
+"""
+Micro-benchmark for the recommender ranking core.
+
+Compares the previous per-snippet sklearn loop + pandas groupby/merge against
+recommender_service.rank_embeddings on random embeddings, checks that both
+rank identically, and prints the timings.
+
+Run from backend/:  python -m benchmarks.bench_ranking
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from recommender_service import rank_embeddings, score_to_label
+
+EMBEDDING_DIM = 1536  # text-embedding-3-small
+CASES = [
+    ("60 places x 50 snippets", 60, 50),
+    ("10k snippets", 200, 50),
+]
+
+
+def legacy_rank(api_data, prompt_embedding, snippet_embeddings, snippet_location_map, all_snippets, top_n=3):
+    """The ranking core as it was before vectorization."""
+    similarities = [cosine_similarity([prompt_embedding], [emb])[0][0] for emb in snippet_embeddings]
+    results_df = pd.DataFrame({
+        'location_index': snippet_location_map,
+        'influential_snippet': all_snippets,
+        'similarity_score': similarities
+    })
+    best_match_indices = results_df.groupby('location_index')['similarity_score'].idxmax()
+    best_matches_df = results_df.loc[best_match_indices]
+    locations_df = pd.DataFrame(api_data)
+    final_df = locations_df.merge(best_matches_df, left_index=True, right_on='location_index')
+    final_df = final_df.set_index('location_index')
+    sorted_locations = final_df.sort_values(by='similarity_score', ascending=False)
+    if (sorted_locations["similarity_score"] >= 0.6).any():
+        top_locations = sorted_locations[sorted_locations["similarity_score"] >= 0.6].copy()
+    else:
+        top_locations = sorted_locations.head(top_n).copy()
+    top_locations.loc[:, 'similarity_label'] = top_locations['similarity_score'].apply(score_to_label)
+    return list(zip(top_locations.index, top_locations['similarity_label']))
+
+
+def make_case(places, snippets_per_place, seed=0):
+    rng = np.random.default_rng(seed)
+    # Realistic payload shape: the legacy path turned all of it into a DataFrame
+    api_data = [
+        {
+            "name": {"original_name": f"place {i}", "translated_name": f"place {i}"},
+            "reviews": [{"text": "review text " * 20} for _ in range(5)],
+            "photos": [{"vlm_insight": "insight " * 30, "url": "https://example.com"} for _ in range(10)],
+        }
+        for i in range(places)
+    ]
+    location_map = np.repeat(np.arange(places), snippets_per_place).tolist()
+    snippets = [f"snippet {n}" for n in range(len(location_map))]
+    prompt = rng.normal(size=EMBEDDING_DIM).astype(np.float32)
+    embeddings = rng.normal(size=(len(location_map), EMBEDDING_DIM)).astype(np.float32)
+    # Nudge a few snippets toward the prompt so some locations clear the 0.6 threshold
+    embeddings[::97] += 2 * prompt
+    return api_data, prompt, embeddings, location_map, snippets
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    for label, places, per_place in CASES:
+        api_data, prompt, embeddings, location_map, snippets = make_case(places, per_place)
+        repeat = 3 if len(location_map) > 5000 else 5
+
+        legacy_time, legacy = timed(lambda: legacy_rank(api_data, prompt, embeddings, location_map, snippets), repeat)
+        new_time, ranked = timed(lambda: rank_embeddings(prompt, embeddings, location_map), repeat)
+        vectorized = [(loc, lbl) for loc, _, _, lbl in ranked]
+
+        assert [int(i) for i, _ in legacy] == [i for i, _ in vectorized], "ranking order differs"
+        assert [l for _, l in legacy] == [l for _, l in vectorized], "labels differ"
+        print(
+            f"{label:<26} snippets={len(location_map):>6}  legacy={legacy_time * 1000:9.1f} ms  "
+            f"vectorized={new_time * 1000:7.2f} ms  speedup={legacy_time / new_time:6.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Local stand-ins for every upstream API the service calls, so it can be benchmarked
+(and exercised by hand) without spending Google or OpenAI quota.
+
+Serves Places searchText (paginated, 20 places per page, up to 60 per query), place
+photo media, Street View, OpenAI chat completions (text, vision and the JSON-schema
+batch format of vlm_service.analyze_images_batch) and embeddings. Results are
+deterministic for a given query, photo name or text. Every endpoint family
+(places, photos, street_view, chat, vision, embeddings) has its own latency,
+error rate and 429 rate; 429s carry a Retry-After header like the real APIs.
+
+Run from backend/:
+    python -m benchmarks.fake_upstreams --port 8900 [--latency-scale 1] [--error-rate 0.01]
+        [--rate-limit-rate 0.02] [--set vision.latency=3] [--set places.error_rate=0.1]
+
+and point the service at it:
+    PLACES_API_URL=http://127.0.0.1:8900/v1 STREET_VIEW_URL=http://127.0.0.1:8900/maps/api/streetview
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 uvicorn api_service:app
+
+GET /_stats returns request counts per family and outcome.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import random
+import time
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image
+
+# Seconds per call, before jitter; roughly what the real APIs take
+DEFAULT_LATENCY = {
+    "places": 0.3, "photos": 0.15, "street_view": 0.15, "chat": 0.8, "vision": 1.5, "embeddings": 0.2,
+}
+PAGE_SIZE = 20
+MAX_PLACES_PER_QUERY = 60
+EMBEDDING_DIM = 1536  # text-embedding-3-small
+PLACE_TYPES = ["restaurant", "cafe", "hotel", "store", "bakery", "park", "museum", "bank"]
+
+settings = {
+    family: {"latency": latency, "jitter": 0.25, "error_rate": 0.0, "rate_limit_rate": 0.0, "retry_after": 1}
+    for family, latency in DEFAULT_LATENCY.items()
+}
+options = {"places_per_query": MAX_PLACES_PER_QUERY, "photos_per_place": 10, "reviews_per_place": 5}
+stats = Counter()
+
+app = FastAPI()
+
+
+# --- Behaviour Injection ---
+async def simulate(family: str, openai_style: bool = False) -> Response | None:
+    """Sleeps for the family's latency, then returns an injected 429 / 500 response or None to proceed."""
+    config = settings[family]
+    jitter = config["jitter"]
+    await asyncio.sleep(config["latency"] * random.uniform(1 - jitter, 1 + jitter))
+    roll = random.random()
+    if roll < config["rate_limit_rate"]:
+        stats[(family, "429")] += 1
+        body = {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}}
+        if not openai_style:
+            body = {"error": {"code": 429, "message": "Resource has been exhausted (fake)", "status": "RESOURCE_EXHAUSTED"}}
+        return JSONResponse(body, status_code=429, headers={"Retry-After": str(config["retry_after"])})
+    if roll < config["rate_limit_rate"] + config["error_rate"]:
+        stats[(family, "500")] += 1
+        return JSONResponse({"error": {"code": 500, "message": "Internal error (fake)"}}, status_code=500)
+    stats[(family, "200")] += 1
+    return None
+
+
+# --- Generated Content ---
+def seeded(*parts) -> random.Random:
+    return random.Random(hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest())
+
+
+@lru_cache(maxsize=16)
+def sensor_noise(width: int, height: int) -> np.ndarray:
+    """Noise shared by every image of one size; drawing it per image dominated the fake's CPU time."""
+    return np.random.default_rng(0).normal(0, 10, (height, width, 3)).astype(np.int16)
+
+
+@lru_cache(maxsize=4096)
+def jpeg(seed: str, width: int, height: int) -> bytes:
+    """A photo-like JPEG (smooth colour field plus sensor noise), unique per seed."""
+    rng = np.random.default_rng(int(hashlib.sha256(seed.encode()).hexdigest()[:16], 16))
+    field = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)).resize((width, height), Image.BICUBIC)
+    pixels = np.asarray(field, dtype=np.int16) + sensor_noise(width, height)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def make_place(query: str, index: int, rectangle: dict) -> dict:
+    rng = seeded(query, index)
+    place_id = hashlib.sha1(f"{query}|{index}".encode()).hexdigest()[:27]
+    low, high = rectangle.get("low", {}), rectangle.get("high", {})
+    latitude = rng.uniform(low.get("latitude", 0.0), high.get("latitude", 0.1))
+    longitude = rng.uniform(low.get("longitude", 0.0), high.get("longitude", 0.1))
+    reviews = [
+        {
+            "name": f"places/{place_id}/reviews/{k}",
+            "relativePublishTimeDescription": f"{k + 1} months ago",
+            "rating": rng.randint(1, 5),
+            "text": {"text": f"Review {k} of {query} place {index}. " + "Good service and a friendly staff. " * rng.randint(1, 6), "languageCode": "en"},
+            "originalText": {"text": f"Review {k} of {query} place {index}.", "languageCode": "en"},
+            "authorAttribution": {"displayName": f"Reviewer {rng.randint(1, 10_000)}", "uri": "https://www.google.com/maps/contrib/0"},
+            "publishTime": f"2025-0{k % 9 + 1}-15T12:00:00Z",
+            "googleMapsUri": f"https://www.google.com/maps/reviews/data={place_id}{k}",
+        }
+        for k in range(options["reviews_per_place"])
+    ]
+    photos = [
+        {"name": f"places/{place_id}/photos/{k}", "widthPx": 4032, "heightPx": 3024, "googleMapsUri": "https://www.google.com/maps/photos"}
+        for k in range(options["photos_per_place"])
+    ]
+    return {
+        "id": place_id,
+        "displayName": {"text": f"{query.title()} {index}", "languageCode": "en"},
+        "types": [PLACE_TYPES[index % len(PLACE_TYPES)], "point_of_interest", "establishment"],
+        "websiteUri": f"https://example.com/{place_id}",
+        "nationalPhoneNumber": f"(555) 01{index:02d}",
+        "formattedAddress": f"{index} Example Street",
+        "location": {"latitude": latitude, "longitude": longitude},
+        "reviews": reviews,
+        "photos": photos,
+        "regularOpeningHours": {"weekdayDescriptions": [f"{day}: 9:00 AM - 5:00 PM" for day in ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")]},
+        "googleMapsUri": f"https://maps.google.com/?cid={int(place_id[:12], 16)}",
+    }
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def embedding(text: str) -> np.ndarray:
+    rng = np.random.default_rng(int(hashlib.sha256(text.encode()).hexdigest()[:16], 16))
+    vector = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+# --- Google ---
+@app.post("/v1/places:searchText")
+async def search_text(request: Request):
+    body = await request.json()
+    if (injected := await simulate("places")) is not None:
+        return injected
+    query = body.get("textQuery", "")
+    rectangle = body.get("locationRestriction", {}).get("rectangle", {})
+    start = int(body.get("pageToken") or 0)
+    total = min(options["places_per_query"], MAX_PLACES_PER_QUERY)
+    end = min(start + PAGE_SIZE, total)
+    response = {"places": [make_place(query, i, rectangle) for i in range(start, end)]}
+    if end < total:
+        response["nextPageToken"] = str(end)
+    return response
+
+
+@app.get("/v1/places/{place_id}/photos/{photo}/media")
+async def photo_media(place_id: str, photo: str, maxWidthPx: int = 4800, maxHeightPx: int = 4800):
+    if (injected := await simulate("photos")) is not None:
+        return injected
+    # Real photos are 4:3; served no larger than requested
+    width = min(maxWidthPx, 1600)
+    height = min(maxHeightPx, width * 3 // 4)
+    return Response(await asyncio.to_thread(jpeg, f"{place_id}/{photo}", width, height), media_type="image/jpeg")
+
+
+@app.get("/maps/api/streetview")
+async def street_view(location: str = "", size: str = "600x400"):
+    if (injected := await simulate("street_view")) is not None:
+        return injected
+    width, height = (int(v) for v in size.split("x"))
+    return Response(await asyncio.to_thread(jpeg, f"streetview/{location}", width, height), media_type="image/jpeg")
+
+
+# --- OpenAI ---
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt_text, images, image_digest = "", 0, hashlib.sha256()
+    for message in body.get("messages", []):
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                images += 1
+                image_digest.update(part["image_url"]["url"].encode())
+            else:
+                prompt_text += part.get("text", "")
+    if (injected := await simulate("vision" if images else "chat", openai_style=True)) is not None:
+        return injected
+
+    # Different images (or prompts) get different, but repeatable, answers
+    rng = seeded(prompt_text, image_digest.hexdigest())
+    sentence = lambda: f"A {rng.choice(['bright', 'busy', 'quiet', 'narrow', 'modern'])} {rng.choice(['storefront', 'street', 'dining room', 'counter', 'entrance'])} with {rng.choice(['tables', 'signage', 'people', 'plants', 'shelves'])}."
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        content = json.dumps({"insights": [" ".join(sentence() for _ in range(3)) for _ in range(images)], "summary": " ".join(sentence() for _ in range(4))})
+    else:
+        content = " ".join(sentence() for _ in range(4 if images else 5))
+
+    # Low-detail images cost 85 tokens each
+    prompt_tokens = count_tokens(prompt_text) + 85 * images
+    completion_tokens = count_tokens(content)
+    return JSONResponse(
+        {
+            "id": f"chatcmpl-fake{rng.randint(0, 10**9)}", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        },
+        headers={"x-ratelimit-remaining-requests": "9999", "x-ratelimit-remaining-tokens": "9999999"},
+    )
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    if (injected := await simulate("embeddings", openai_style=True)) is not None:
+        return injected
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    vectors = [embedding(str(text)) for text in texts]
+    # The SDK asks for base64 unless the caller picked a format
+    if body.get("encoding_format") == "base64":
+        encoded = [base64.b64encode(vector.tobytes()).decode() for vector in vectors]
+    else:
+        encoded = [vector.tolist() for vector in vectors]
+    tokens = sum(count_tokens(str(text)) for text in texts)
+    return {
+        "object": "list", "model": body.get("model", "fake"),
+        "data": [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(encoded)],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+# --- Control ---
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {f"{family}.{outcome}": count for (family, outcome), count in sorted(stats.items())}
+
+
+def apply_override(assignment: str):
+    """Applies one --set family.key=value override."""
+    target, _, value = assignment.partition("=")
+    family, _, key = target.partition(".")
+    if family not in settings or key not in settings[family]:
+        raise ValueError(f"Unknown setting '{target}'. Families: {sorted(settings)}; keys: {sorted(settings['places'])}")
+    settings[family][key] = float(value)
+
+
+def configure(latency_scale=1.0, error_rate=0.0, rate_limit_rate=0.0, overrides=(), **counts):
+    for config in settings.values():
+        config["latency"] *= latency_scale
+        config["error_rate"] = error_rate
+        config["rate_limit_rate"] = rate_limit_rate
+    for assignment in overrides:
+        apply_override(assignment)
+    options.update({key: value for key, value in counts.items() if value is not None})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplies every default latency (0 for none)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered with a 429")
+    parser.add_argument("--places-per-query", type=int, default=None)
+    parser.add_argument("--photos-per-place", type=int, default=None)
+    parser.add_argument("--reviews-per-place", type=int, default=None)
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="FAMILY.KEY=VALUE",
+                        help="per-family override of latency, jitter, error_rate, rate_limit_rate or retry_after")
+    args = parser.parse_args()
+    configure(
+        args.latency_scale, args.error_rate, args.rate_limit_rate, args.overrides,
+        places_per_query=args.places_per_query, photos_per_place=args.photos_per_place,
+        reviews_per_place=args.reviews_per_place,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from logging_service import logger
+
+# Constants
+# Local state: caches, telemetry, stored results, profiles and background jobs (without
+# their API keys). It holds search results and insights; keep this directory private.
+CACHE_DIR = os.getenv("PLAID_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+def cache_path(filename: str) -> str:
+    """Returns the path of a local cache file, creating the cache directory if needed."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, filename)
+
+
+class PersistentLRUCache:
+    """
+    Two-tier key/value cache: a bounded in-memory LRU in front of a SQLite table.
+
+    Values are stored as-is (str or bytes). The disk tier is trimmed to
+    `max_disk_items` by last access time. All methods are thread-safe so the
+    cache can be used from worker threads as well as the event loop.
+    """
+
+    def __init__(self, name: str, max_memory_items: int = 10_000, max_disk_items: int = 1_000_000, path: str | None = None):
+        self.name = name
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self._db = None
+        try:
+            self._db = sqlite3.connect(path or cache_path(f"{name}.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL only syncs at checkpoints; a crash can lose recent entries, never corrupt the file
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, accessed REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self._db.commit()
+        except (sqlite3.Error, OSError) as e:
+            # Cache still works in memory if the disk tier is unavailable
+            logger.error("[Cache:%s] Persistent tier disabled: %s", name, e)
+            self._db = None
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: list) -> dict:
+        """Looks up several keys at once, promoting disk hits into memory."""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+
+            if missing and self._db is not None:
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i:i + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, value FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for key, value in rows:
+                        found[key] = value
+                        self._remember(key, value)
+                disk_hits = [k for k in missing if k in found]
+                if disk_hits:
+                    now = time.time()
+                    self._db.executemany("UPDATE cache SET accessed = ? WHERE key = ?", [(now, k) for k in disk_hits])
+                    self._db.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value):
+        self.set_many({key: value})
+
+    def set_many(self, items: dict):
+        if not items:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._remember(key, value)
+            if self._db is not None:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO cache (key, value, accessed) VALUES (?, ?, ?)",
+                    [(k, v, now) for k, v in items.items()]
+                )
+                self._db.commit()
+                self._writes_since_trim += len(items)
+                if self._writes_since_trim >= 1000:
+                    self._trim_disk()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self):
+        self._writes_since_trim = 0
+        (count,) = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_disk_items:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_disk_items,)
+            )
+            self._db.commit()
+
+
+class TTLCache:
+    """In-memory cache whose entries expire after `ttl` seconds, evicting least recently used beyond `max_items`."""
+
+    def __init__(self, ttl: float, max_items: int):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._items.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._items[key]
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def items(self):
+        """Live (key, value) pairs, oldest first."""
+        now = time.monotonic()
+        return [(k, v) for k, (expires, v) in list(self._items.items()) if expires >= now]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "items": len(self._items),
+        }
@@ -0,0 +1,93 @@
+import os
+from collections import OrderedDict
+
+import httpx
+from openai import AsyncOpenAI
+from logging_service import logger
+
+# Constants (tunable through the environment)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+MAX_CACHED_API_KEYS = int(os.getenv("MAX_CACHED_API_KEYS", "64"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class ClientPool:
+    """
+    Keep-alive connection pools shared by every request in the process.
+
+    One async httpx client carries all Google and OpenAI traffic. OpenAI SDK
+    clients are cached per API key (LRU bounded) and reuse that httpx pool,
+    so a new key never opens a fresh set of connections.
+    """
+
+    def __init__(self):
+        self._http: httpx.AsyncClient | None = None
+        self._async_openai: OrderedDict[str, AsyncOpenAI] = OrderedDict()
+
+    async def start(self):
+        self.http
+        logger.debug("Client pool started (http2=%s, max_connections=%s)", HTTP2_AVAILABLE, HTTP_MAX_CONNECTIONS)
+
+    async def close(self):
+        self._async_openai.clear()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Created lazily so helpers also work outside the FastAPI lifespan (scripts, benchmarks)
+        if self._http is None or self._http.is_closed:
+            self._async_openai.clear()
+            self._http = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=build_limits(),
+                timeout=HTTP_TIMEOUT,
+                follow_redirects=True,
+            )
+        return self._http
+
+    def async_openai(self, api_key: str) -> AsyncOpenAI:
+        # Retries are owned by rate_limiter, so the SDK's own retry loop is disabled
+        return self._get_or_create(self._async_openai, api_key, lambda: AsyncOpenAI(api_key=api_key, http_client=self.http, max_retries=0))
+
+    @staticmethod
+    def _get_or_create(cache: OrderedDict, api_key: str, factory):
+        client = cache.get(api_key)
+        if client is None:
+            client = factory()
+            cache[api_key] = client
+            if len(cache) > MAX_CACHED_API_KEYS:
+                # SDK clients share the pooled transport, so dropping one closes no connections
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(api_key)
+        return client
+
+
+clients = ClientPool()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    return clients.http
+
+
+def get_async_openai_client(api_key: str) -> AsyncOpenAI:
+    return clients.async_openai(api_key)
+
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from openai import AsyncOpenAI
+from cache_store import PersistentLRUCache
+from client_pool import get_async_openai_client
+from logging_service import logger
+from metrics_service import register_cache
+from rate_limiter import call_openai
+
+# Constants
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_BATCH_SIZE = 2048  # OpenAI limit on inputs per embeddings request
+
+# Backend selection: "openai" (remote) or "local" (sentence-transformers on CPU)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "1"))
+EMBEDDING_BACKENDS = ("openai", "local")
+
+# Cache sizes. A text-embedding-3-small vector is 1536 float32 values, about 6 KB
+# (local MiniLM vectors are 1.5 KB). The defaults hold about 25 MB per worker in
+# memory, the snippets of a few recent searches, and about 600 MB on disk.
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "4000"))
+EMBEDDING_CACHE_DISK_ITEMS = int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "100000"))
+
+embedding_cache = PersistentLRUCache(
+    "embeddings",
+    max_memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+    max_disk_items=EMBEDDING_CACHE_DISK_ITEMS,
+)
+register_cache("embeddings", embedding_cache)
+
+
+# --- Backends ---
+class OpenAIEmbeddingBackend:
+    """Remote embeddings through the OpenAI API, paced by the openai_embeddings governor."""
+
+    def __init__(self, client: AsyncOpenAI, model: str = EMBEDDING_MODEL):
+        self.client = client
+        self.model = model
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        batches = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+        responses = await asyncio.gather(*(
+            call_openai("openai_embeddings", lambda batch=batch: self.client.embeddings.with_raw_response.create(input=batch, model=self.model))
+            for batch in batches
+        ))
+        return np.asarray([item.embedding for response in responses for item in response.data], dtype=np.float32)
+
+
+class LocalEmbeddingBackend:
+    """
+    CPU-only sentence-transformers model, loaded once per process.
+
+    Inference runs on a dedicated thread pool so concurrent searches share
+    a bounded number of torch workers and never run on the event loop.
+    """
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL):
+        self.model = model
+        self._encoder = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=LOCAL_EMBEDDING_WORKERS, thread_name_prefix="embeddings")
+
+    def load(self):
+        with self._lock:
+            if self._encoder is None:
+                # Imported lazily: torch is only needed when the local backend is used
+                from sentence_transformers import SentenceTransformer
+                logger.debug("Loading local embedding model %s...", self.model)
+                self._encoder = SentenceTransformer(self.model, device="cpu")
+        return self._encoder
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.load().encode(texts, batch_size=LOCAL_EMBEDDING_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.encode, texts)
+
+
+local_backend = LocalEmbeddingBackend()
+
+
+def get_embedding_backend(name: str | None, api_key: str | None):
+    """Resolves a backend by name, falling back to the EMBEDDING_BACKEND setting."""
+    name = (name or EMBEDDING_BACKEND).lower()
+    if name == "local":
+        return local_backend
+    if name == "openai":
+        return OpenAIEmbeddingBackend(get_async_openai_client(api_key))
+    raise ValueError(f"Unknown embedding backend '{name}'. Expected one of {EMBEDDING_BACKENDS}.")
+
+
+# --- Cached Embedding ---
+def embedding_key(text: str, model: str) -> str:
+    """Content hash of the text, namespaced by model so vectors never mix."""
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+async def embed_texts(backend, texts: List[str]) -> np.ndarray:
+    """
+    Returns a float32 matrix with one embedding row per input text.
+
+    Vectors are looked up in the embedding cache first; only the misses are
+    sent to the backend and the results are written back to the cache.
+    """
+    model = backend.model
+    keys = [embedding_key(t, model) for t in texts]
+    cached = await asyncio.to_thread(embedding_cache.get_many, list(dict.fromkeys(keys)))
+
+    missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in cached))
+    if missing:
+        logger.debug("Embedding cache: %d hits, %d misses", len(texts) - len(missing), len(missing))
+        vectors = await backend.embed(missing)
+        fresh = {embedding_key(text, model): vector.tobytes() for text, vector in zip(missing, vectors)}
+        await asyncio.to_thread(embedding_cache.set_many, fresh)
+        cached.update(fresh)
+
+    return np.vstack([np.frombuffer(cached[k], dtype=np.float32) for k in keys])
@@ -1,21 +1,164 @@
-def cost_time_predict(places:int):
+import math
+import os
+
+import numpy as np
+from telemetry_service import telemetry_store
+
+# Constants
+# Measured searches needed before they replace the default figures below
+ESTIMATOR_MIN_RUNS = int(os.getenv("ESTIMATOR_MIN_RUNS", "5"))
+PLACES_PAGE_SIZE = 20
+# Google returns at most this many photos / reviews per place
+MAX_PHOTOS_PER_PLACE = 10
+MAX_REVIEWS_PER_PLACE = 5
+# Optional enrichment tiers a search can request
+TIERS = ("reviews", "photos")
+
+# List prices in USD, per call or per 1M tokens (override when pricing changes)
+PRICE_TEXT_SEARCH = float(os.getenv("PRICE_TEXT_SEARCH", "0.040"))
+PRICE_PLACE_PHOTO = float(os.getenv("PRICE_PLACE_PHOTO", "0.007"))
+PRICE_STREET_VIEW = float(os.getenv("PRICE_STREET_VIEW", "0.007"))
+PRICE_CHAT_INPUT_PER_M = float(os.getenv("PRICE_CHAT_INPUT_PER_M", "0.40"))
+PRICE_CHAT_OUTPUT_PER_M = float(os.getenv("PRICE_CHAT_OUTPUT_PER_M", "1.60"))
+PRICE_EMBEDDING_PER_M = float(os.getenv("PRICE_EMBEDDING_PER_M", "0.02"))
+
+# Seconds per unit until enough searches are measured (the original hand-tuned figures)
+DEFAULT_SECONDS = {"base": 5.0, "place": 0.0, "reviewed_place": 2.0, "photo": 34.0 / MAX_PHOTOS_PER_PLACE}
+# Run count each seconds coefficient multiplies
+SECONDS_UNITS = {"place": "places", "reviewed_place": "reviewed_places", "photo": "photos"}
+
+# Usage per unit until enough searches are measured
+DEFAULT_USAGE = {
+    "vlm_input_tokens": 1100.0,     # per photo
+    "vlm_output_tokens": 130.0,     # per photo
+    "llm_input_tokens": 1500.0,     # per reviewed place
+    "llm_output_tokens": 150.0,     # per reviewed place
+    "openai_embeddings_input_tokens": 60.0,  # per snippet (photo insight or review)
+    "place_photos_calls": 1.0,      # per photo; lower when insights are cached
+    "street_view_calls": 1.0,       # per place with photos
+}
+USAGE_UNITS = {
+    "vlm_input_tokens": ("photos",),
+    "vlm_output_tokens": ("photos",),
+    "llm_input_tokens": ("reviewed_places",),
+    "llm_output_tokens": ("reviewed_places",),
+    "openai_embeddings_input_tokens": ("photos", "reviews"),
+    "place_photos_calls": ("photos",),
+    "street_view_calls": ("photo_places",),
+}
+
+
+# --- Calibration ---
+def fitted_features(runs: list) -> list:
+    """Seconds coefficients with enough measured runs to fit; the others keep DEFAULT_SECONDS."""
+    if len(runs) < ESTIMATOR_MIN_RUNS:
+        return []
+    return [
+        name for name, unit in SECONDS_UNITS.items()
+        if sum(1 for run in runs if run["counts"].get(unit)) >= ESTIMATOR_MIN_RUNS
+    ]
+
+
+def fit_seconds(runs: list) -> dict:
+    """
+    Least-squares fit of search wall time against place, reviewed-place and photo counts.
+    Coefficients are clipped at zero. A coefficient whose unit appears in too few runs keeps
+    its DEFAULT_SECONDS figure (its default share is taken off the measured times first).
+    """
+    seconds = dict(DEFAULT_SECONDS)
+    fitted = fitted_features(runs)
+    if not fitted:
+        return seconds
+    counts = [run["counts"] for run in runs]
+    features = np.array([[1.0] + [c.get(SECONDS_UNITS[name], 0) for name in fitted] for c in counts], dtype=np.float64)
+    measured = np.array([
+        run["total_seconds"] - sum(
+            DEFAULT_SECONDS[name] * run["counts"].get(unit, 0) for name, unit in SECONDS_UNITS.items() if name not in fitted
+        )
+        for run in runs
+    ], dtype=np.float64)
+    coefficients, *_ = np.linalg.lstsq(features, measured, rcond=None)
+    coefficients = np.clip(coefficients, 0.0, None)
+    seconds["base"] = float(coefficients[0])
+    seconds.update({name: float(value) for name, value in zip(fitted, coefficients[1:])})
+    return seconds
+
+
+def usage_rates(runs: list) -> dict:
+    """Measured usage per unit (ratio of totals over runs that had that unit), else DEFAULT_USAGE."""
+    rates = {}
+    for name, units in USAGE_UNITS.items():
+        relevant = [run["counts"] for run in runs if any(run["counts"].get(unit) for unit in units)]
+        denominator = sum(c.get(unit, 0) for c in relevant for unit in units)
+        if len(relevant) >= ESTIMATOR_MIN_RUNS and denominator:
+            rates[name] = sum(c.get(name, 0) for c in relevant) / denominator
+        else:
+            rates[name] = DEFAULT_USAGE[name]
+    return rates
+
+
+def chat_cost(input_tokens: float, output_tokens: float) -> float:
+    return (input_tokens * PRICE_CHAT_INPUT_PER_M + output_tokens * PRICE_CHAT_OUTPUT_PER_M) / 1_000_000
+
+
+# --- Estimator ---
+def cost_time_predict(places: int, photos: int | None = None, photo_places: int | None = None,
+                      reviews: int | None = None, reviewed_places: int | None = None, tiers: list | None = None,
+                      runs: list | None = None):
     """
     Predicts estimated time and cost based on the number of places.
 
-    Calculates the estimated time (in seconds) and cost (in dollars)
-    for performing operations related to a given number of places,
-    breaking down the estimates by operation type (basic, reviews, photos)
-    and providing a total."""
+    Times (minutes) and costs (dollars) are broken down by operation type
+    (basic, reviews, photos) plus a total over the requested `tiers` (every
+    tier when None). Photo and review counts come from the estimator's text
+    search; when unknown, every place is assumed to have the maximum Google
+    returns. Seconds and usage per unit are calibrated from the searches
+    recorded by telemetry_service once enough have run."""
+    if photos is None:
+        photos, photo_places = places * MAX_PHOTOS_PER_PLACE, places
+    if reviews is None:
+        reviews, reviewed_places = places * MAX_REVIEWS_PER_PLACE, places
+    tiers = list(TIERS) if tiers is None else [tier for tier in TIERS if tier in tiers]
+
+    runs = telemetry_store.runs() if runs is None else runs
+    seconds = fit_seconds(runs)
+    usage = usage_rates(runs)
+    # Calibrated only when every time coefficient the requested tiers use was measured
+    used = ["place"] + [name for tier, name in (("reviews", "reviewed_place"), ("photos", "photo")) if tier in tiers]
+    fitted = fitted_features(runs)
+
+    basic_time = seconds["base"] + seconds["place"] * places
+    reviews_time = seconds["reviewed_place"] * reviewed_places
+    photos_time = seconds["photo"] * photos
+
+    basic_cost = math.ceil(places / PLACES_PAGE_SIZE) * PRICE_TEXT_SEARCH
+    reviews_cost = chat_cost(usage["llm_input_tokens"] * reviewed_places, usage["llm_output_tokens"] * reviewed_places)
+    photos_cost = (
+        chat_cost(usage["vlm_input_tokens"] * photos, usage["vlm_output_tokens"] * photos)
+        + usage["place_photos_calls"] * photos * PRICE_PLACE_PHOTO
+        + usage["street_view_calls"] * photo_places * PRICE_STREET_VIEW
+    )
+    # Ranking embeds the photo insights and reviews of the tiers that run
+    snippets = (photos if "photos" in tiers else 0) + (reviews if "reviews" in tiers else 0)
+    ranking_cost = usage["openai_embeddings_input_tokens"] * snippets * PRICE_EMBEDDING_PER_M / 1_000_000
+
+    total_time = basic_time + (reviews_time if "reviews" in tiers else 0) + (photos_time if "photos" in tiers else 0)
+    total_cost = basic_cost + (reviews_cost if "reviews" in tiers else 0) + (photos_cost if "photos" in tiers else 0) + ranking_cost
 
     results={
     "places": places,
-    "basic_time":round(5/60),
-    # "basic_cost":0,
-    "reviews_time":round((2*places)/60),
-    # "reviews_cost":round(0.02*places,2),
-    "photos_time": round((34*places)/60),
-    # "photos_cost":round(0.2*places,2),
-    "time_everything":round((5+38*places)/60),
-    # "cost_everything":round(0.22*places,2)
+    "photos": photos,
+    "reviews": reviews,
+    "basic_time":round(basic_time/60),
+    "basic_cost":round(basic_cost,2),
+    "reviews_time":round(reviews_time/60),
+    "reviews_cost":round(reviews_cost,2),
+    "photos_time": round(photos_time/60),
+    "photos_cost":round(photos_cost,2),
+    "tiers": tiers,
+    "time_everything":round(total_time/60),
+    "cost_everything":round(total_cost,2),
+    "calibration_runs": len(runs),
+    "calibrated": all(name in fitted for name in used),
     }
     return results
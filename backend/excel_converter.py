@@ -1,8 +1,29 @@
 import xlsxwriter
+from xlsxwriter.exceptions import DuplicateWorksheetName, InvalidWorksheetName
+from xlsxwriter.worksheet import Worksheet
 import json
+import os
 import re
+import tempfile
 from io import BytesIO
 
+# Constants
+# Streaming exports stay in memory up to this size, then spill to a temp file
+EXCEL_SPOOL_MAX_BYTES = int(os.getenv("EXCEL_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+EXCEL_CHUNK_SIZE = 64 * 1024
+INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+MAX_SHEET_NAME = 31
+
+XLSXWRITER_VERSION = tuple(int(part) for part in re.findall(r"\d+", xlsxwriter.__version__)[:2])
+# The fast sheet-name check and the early sheet close below rely on private xlsxwriter
+# hooks checked against 3.x; other versions take the public-API path (no constant_memory,
+# quadratic sheet-name checks), which is slower but still correct
+XLSXWRITER_INTERNALS = (
+    (3, 0) <= XLSXWRITER_VERSION < (4, 0)
+    and hasattr(xlsxwriter.Workbook, "_check_sheetname")
+    and hasattr(Worksheet, "_opt_close")
+)
+
 # --- Helper Functions ---
 def json_to_dict(j_file):
     """Converts a JSON file path or dictionary object into a dictionary."""
@@ -30,8 +51,58 @@ def get_cid(uri):
     match = re.search(r'cid=(\d+)', uri)
     return match.group(1) if match else 'No cid number'
 
+def sheet_link(sheet_name):
+    """Internal hyperlink to a sheet's first cell; apostrophes in the name are doubled as Excel requires."""
+    if not sheet_name:
+        return 'N/A'
+    return "internal:'{}'!A1".format(sheet_name.replace("'", "''"))
+
 # --- Excel Sheet Creation and Formatting ---
 
+class ExportWorkbook(xlsxwriter.Workbook):
+    """
+    Workbook for exports, which add two sheets per place. Hands out valid, unique
+    sheet names built from place names. xlsxwriter checks each new sheet name
+    against every existing sheet, which is quadratic and takes minutes at 10k
+    places; with XLSXWRITER_INTERNALS the same rules are checked against a set.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.used_sheet_names = set()
+
+    def add_worksheet(self, name=None, worksheet_class=None):
+        sheet = super().add_worksheet(name, worksheet_class)
+        self.used_sheet_names.add(sheet.name.lower())
+        return sheet
+
+    def unique_sheet_name(self, name):
+        """`name` with the characters Excel rejects replaced, cut to 31 characters, and a numeric suffix if taken."""
+        name = INVALID_SHEET_CHARS.sub("_", str(name))[:MAX_SHEET_NAME].strip("'") or "Sheet"
+        candidate, number = name, 1
+        # Excel compares sheet names case-insensitively
+        while candidate.lower() in self.used_sheet_names:
+            number += 1
+            suffix = f"_{number}"
+            candidate = name[:MAX_SHEET_NAME - len(suffix)].rstrip("'") + suffix
+        return candidate
+
+    def _check_sheetname(self, sheetname, is_chartsheet=False):
+        if is_chartsheet or not XLSXWRITER_INTERNALS:
+            return super()._check_sheetname(sheetname, is_chartsheet)
+        self.sheetname_count += 1
+        if not sheetname:
+            sheetname = f"{self.sheet_name}{self.sheetname_count}"
+        if len(sheetname) > MAX_SHEET_NAME:
+            raise InvalidWorksheetName(f"Excel worksheet name '{sheetname}' must be <= 31 chars.")
+        if INVALID_SHEET_CHARS.search(sheetname):
+            raise InvalidWorksheetName(f"Invalid Excel character '[]:*?/\\' in sheetname '{sheetname}'.")
+        if sheetname.startswith("'") or sheetname.endswith("'"):
+            raise InvalidWorksheetName(f'Sheet name cannot start or end with an apostrophe "{sheetname}".')
+        if sheetname.lower() in self.used_sheet_names:
+            raise DuplicateWorksheetName(f"Sheetname '{sheetname}', with case ignored, is already in use.")
+        return sheetname
+
 def create_formats(workbook):
     """Creates and returns a dictionary of named cell formats for the workbook."""
     return {
@@ -61,9 +132,21 @@ def setup_sheet(workbook, name, headers, widths, formats, default_row_height=100
         sheet.set_default_row(default_row_height)
     return sheet
 
+def release_sheet(sheet):
+    """
+    In constant_memory mode every worksheet keeps its row temp file open until the
+    workbook closes; with two sheets per place that exhausts file descriptors. A
+    finished sheet's file is closed here early. This is what Workbook.close() does
+    to every sheet anyway (_opt_close); the packager then reopens the file and
+    flushes the buffered last row, so nothing written is lost. constant_memory is
+    only used with XLSXWRITER_INTERNALS, so this is a no-op otherwise.
+    """
+    if XLSXWRITER_INTERNALS and sheet.constant_memory:
+        sheet._opt_close()
+
 def create_detail_sheet(workbook, name, cid, addr, reviews, formats):
     """Creates a worksheet for individual location reviews."""
-    sheet_name = f"{name[:15]}_{cid[:10]}"
+    sheet_name = workbook.unique_sheet_name(f"{str(name)[:15]}_{cid[:10]}")
     headers = ('CID', 'Name', 'Address', 'Orig. Author', 'Tran. Author', 'Orig. Text', 
                'Orig. Lang', 'Translated', 'Rating', 'Date', 'URL')
     widths = [20, 20, 30, 15, 15, 25, 10, 20, 10, 10, 40]
@@ -71,6 +154,7 @@ def create_detail_sheet(workbook, name, cid, addr, reviews, formats):
     
     if not isinstance(reviews, list):
         sheet.write(1, 0, "reviews unavailable", formats['body'])
+        release_sheet(sheet)
         return sheet_name
 
     for row_num, review in enumerate(reviews, start=1):
@@ -83,12 +167,18 @@ def create_detail_sheet(workbook, name, cid, addr, reviews, formats):
             get_value(review, 'publish_date')
         ]
         sheet.write_row(row_num, 0, review_data, formats['body'])
-        sheet.write_url(row_num, 10, get_value(review, 'review_url', '#'), formats['link'])
+        # Reviews without a Maps link come back with review_url set to None; write_url rejects '#'
+        url = get_value(review, 'review_url') or 'unavailable'
+        if url.startswith('http'):
+            sheet.write_url(row_num, 10, url, formats['link'])
+        else:
+            sheet.write(row_num, 10, url, formats['body'])
+    release_sheet(sheet)
     return sheet_name
 
 def create_images_sheet(workbook, name, cid, addr, prompt, street, photos, formats):
     """Creates a worksheet for image information and insights."""
-    sheet_name = f"{name[:13]}_images_{cid[:10]}"
+    sheet_name = workbook.unique_sheet_name(f"{str(name)[:13]}_images_{cid[:10]}")
     headers = ('CID', 'Name', 'Address', 'Tags', 'Summary', 'Link')
     widths = [20, 20, 30, 25, 40, 40]
     sheet = setup_sheet(workbook, sheet_name, headers, widths, formats)
@@ -126,16 +216,14 @@ def create_images_sheet(workbook, name, cid, addr, prompt, street, photos, forma
                 sheet.write(row_num, 5, url, formats['body']) 
     else:
          sheet.write(2, 0, "photos unavailable", formats['body'])
-         
+
+    release_sheet(sheet)
     return sheet_name
 
-# --- Main Function ---
-def json_to_excel(j_file):
-    """Converts a JSON object to a robust, multi-sheet Excel file in memory."""
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output, {'in_memory': True, 'strings_to_urls': False})
+# --- Main Functions ---
+def write_locations(workbook, data):
+    """Writes the locations sheet and per-location review/image sheets, strictly row by row."""
     formats = create_formats(workbook)
-    data = json_to_dict(j_file)
 
     # Declarative mapping of headers to data extraction logic
     HEADER_CONFIG = {
@@ -154,8 +242,8 @@ def json_to_excel(j_file):
         'Review Range':        (15, lambda loc: get_value(loc, 'reviews_span')),
         'Summary of Images':   (40, lambda loc: get_value(loc, 'photos_summary')),
         'Photos URL':          (40, lambda loc: get_value(loc, 'url_to_all_photos')),
-        'Review Link':         (15, lambda loc: f"internal:'{loc.get('_review_sheet_name', '')}'!A1" if loc.get('_review_sheet_name') else 'N/A'),
-        'Images Link':         (15, lambda loc: f"internal:'{loc.get('_image_sheet_name', '')}'!A1" if loc.get('_image_sheet_name') else 'N/A'),
+        'Review Link':         (15, lambda loc: sheet_link(loc.get('_review_sheet_name'))),
+        'Images Link':         (15, lambda loc: sheet_link(loc.get('_image_sheet_name'))),
     }
 
     main_headers = list(HEADER_CONFIG.keys())
@@ -163,11 +251,11 @@ def json_to_excel(j_file):
     main_sheet = setup_sheet(workbook, "Locations", main_headers, main_widths, formats)
 
     for row_num, location in enumerate(data.get('places', []), start=1):
+        name = get_value(location.get('name', {}), 'translated_name')
+        cid = get_cid(get_value(location, 'google_maps_url'))
+        addr = get_value(location, 'address')
 
         if 'reviews' in location:
-            name = get_value(location.get('name', {}), 'translated_name')
-            cid = get_cid(get_value(location, 'Maps_url'))
-            addr = get_value(location, 'address')
             location['_review_sheet_name'] = create_detail_sheet(
                 workbook, name, cid, addr, location['reviews'], formats
             )
@@ -193,7 +281,40 @@ def json_to_excel(j_file):
                 main_sheet.write(row_num, col_num, value, formats['hours'])
             else:
                 main_sheet.write(row_num, col_num, value, formats['body'])
-                
+
+def json_to_excel(j_file):
+    """Converts a JSON object to a robust, multi-sheet Excel file in memory."""
+    output = BytesIO()
+    workbook = ExportWorkbook(output, {'in_memory': True, 'strings_to_urls': False})
+    write_locations(workbook, json_to_dict(j_file))
     workbook.close()
     output.seek(0)
-    return output
\ No newline at end of file
+    return output
+
+def json_to_excel_file(j_file):
+    """
+    Streaming variant of json_to_excel: rows are flushed to disk as they are
+    written (xlsxwriter constant_memory, with XLSXWRITER_INTERNALS) and the workbook goes to a spooled temp
+    file, so memory no longer grows with the rows. It still grows with the
+    number of places, by about 40 KB each: xlsxwriter keeps the state of every
+    worksheet (two per place) and every hyperlink until the workbook closes.
+    Blocking; run it off the event loop.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_MAX_BYTES)
+    try:
+        workbook = ExportWorkbook(output, {'constant_memory': XLSXWRITER_INTERNALS, 'strings_to_urls': False})
+        write_locations(workbook, json_to_dict(j_file))
+        workbook.close()
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+def iter_file_chunks(fileobj, chunk_size=EXCEL_CHUNK_SIZE):
+    """Yields a file in chunks and closes (deletes) it when done or abandoned."""
+    try:
+        while chunk := fileobj.read(chunk_size):
+            yield chunk
+    finally:
+        fileobj.close()
\ No newline at end of file
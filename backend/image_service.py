@@ -0,0 +1,100 @@
+import asyncio
+import base64
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+from logging_service import logger
+
+# Constants (tunable through the environment)
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "768"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "75"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Formats the VLM accepts as-is when the original is smaller than the re-encoded JPEG
+PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="images")
+
+# Byte counters for the search currently being served (see start_image_stats)
+image_stats_var: contextvars.ContextVar[dict | None] = contextvars.ContextVar("image_stats", default=None)
+
+
+# --- Utility Functions ---
+def start_image_stats() -> dict:
+    """Starts per-request image accounting; tasks spawned afterwards report into the returned dict."""
+    stats = {"images": 0, "original_bytes": 0, "uploaded_bytes": 0}
+    image_stats_var.set(stats)
+    return stats
+
+
+def bytes_saved(stats: dict) -> int:
+    return stats["original_bytes"] - stats["uploaded_bytes"]
+
+
+def difference_hash(img: Image.Image) -> int:
+    """64-bit dHash: compares neighbouring pixels of a 9x8 grayscale thumbnail. Near-identical shots differ in few bits."""
+    pixels = list(img.convert("L").resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def shrink_image(raw: bytes) -> tuple[bytes, str, int | None]:
+    """
+    Downscales an image to IMAGE_MAX_SIDE and re-encodes it as JPEG.
+    Returns the JPEG (or the original bytes if they are already smaller, in a format
+    the VLM accepts, or cannot be decoded), their MIME type and the perceptual hash
+    of the image, if it could be computed.
+    """
+    try:
+        with Image.open(BytesIO(raw)) as img:
+            original_format = img.format
+            # JPEG draft mode decodes at a reduced scale, skipping most of the work
+            img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+            img = img.convert("RGB")
+            img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+            phash = difference_hash(img)
+            out = BytesIO()
+            img.save(out, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        logger.error("[Image] Could not preprocess image, uploading as is: %s", e)
+        return raw, "image/jpeg", None
+    if len(raw) <= out.tell() and original_format in PASSTHROUGH_FORMATS:
+        return raw, PASSTHROUGH_FORMATS[original_format], phash
+    return out.getvalue(), "image/jpeg", phash
+
+
+def to_data_url(raw: bytes) -> tuple[str, int, int | None]:
+    """
+    Shrinks an image and base64-encodes it straight into a data URL (one encode, no
+    intermediate str). Returns the URL, the size of the image it carries and its hash.
+    """
+    image, mime_type, phash = shrink_image(raw)
+    data_url = b"data:" + mime_type.encode("ascii") + b";base64," + base64.b64encode(image)
+    return data_url.decode("ascii"), len(image), phash
+
+
+# --- Core Async Functions ---
+async def prepare_image(raw: bytes) -> tuple[str, int | None]:
+    """
+    Preprocesses an image on the worker pool.
+
+    Returns:
+        tuple: Data URL ready for the VLM and the image's perceptual hash (None if undecodable).
+    """
+    data_url, uploaded_bytes, phash = await asyncio.get_running_loop().run_in_executor(image_executor, to_data_url, raw)
+
+    stats = image_stats_var.get()
+    if stats is not None:
+        stats["images"] += 1
+        stats["original_bytes"] += len(raw)
+        stats["uploaded_bytes"] += uploaded_bytes
+    return data_url, phash
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import os
+
+from cache_store import PersistentLRUCache
+from image_service import hamming_distance
+from metrics_service import CallbackMetric, register_cache
+from vlm_service import VLM_MODEL, is_failed_insight
+
+# Constants
+# dHash bit distance at or below which two photos of a place count as the same shot
+DUPLICATE_MAX_DISTANCE = int(os.getenv("VLM_DUPLICATE_MAX_DISTANCE", "6"))
+
+insight_cache = PersistentLRUCache(
+    "vlm_insights",
+    max_memory_items=int(os.getenv("VLM_CACHE_MEMORY_ITEMS", "20000")),
+    max_disk_items=int(os.getenv("VLM_CACHE_DISK_ITEMS", "500000")),
+)
+duplicate_counter = {"reused": 0}
+register_cache("vlm_insights", insight_cache)
+CallbackMetric(
+    "plaid_vlm_near_duplicates_reused_total", "Photos that reused the analysis of a near-identical photo.", (),
+    lambda: [((), duplicate_counter["reused"])], kind="counter"
+)
+
+
+# --- Utility Functions ---
+def insight_key(image_id: str, prompt: str, model: str = VLM_MODEL) -> str:
+    """Key for one image analyzed with one prompt by one model. `image_id` is a photo name or content hash."""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    return f"{model}:{prompt_hash}:{image_id}"
+
+
+def content_id(data_url: str) -> str:
+    return "sha256:" + hashlib.sha256(data_url.encode("ascii")).hexdigest()
+
+
+async def get_insight(key: str) -> str | None:
+    """Cached analysis for a key. A miss in memory reads SQLite, so the lookup runs off the event loop."""
+    return await asyncio.to_thread(insight_cache.get, key)
+
+
+async def store_insights(items: dict):
+    """
+    Caches {key: insight} in one SQLite transaction, off the event loop.
+    Failure messages are never cached.
+    """
+    items = {key: insight for key, insight in items.items() if insight and not is_failed_insight(insight)}
+    if items:
+        await asyncio.to_thread(insight_cache.set_many, items)
+
+
+async def store_insight(insight: str, *keys: str):
+    """Caches a successful analysis under every given key."""
+    await store_insights({key: insight for key in keys})
+
+
+def insight_cache_stats() -> dict:
+    return {**insight_cache.stats(), "near_duplicates_reused": duplicate_counter["reused"]}
+
+
+class NearDuplicateIndex:
+    """
+    Perceptual hashes of the photos of one place, each mapped to the future of its analysis.
+
+    A photo whose hash is within DUPLICATE_MAX_DISTANCE of one already seen
+    waits for that analysis instead of sending its own VLM request.
+    """
+
+    def __init__(self):
+        self._entries: list[tuple[int, asyncio.Future]] = []
+
+    def claim(self, phash: int | None) -> tuple[asyncio.Future, bool]:
+        """
+        Returns (future, owner). The owner must resolve the future with the insight;
+        everyone else awaits it. No await happens in here, so claims are atomic on the loop.
+        """
+        if phash is not None:
+            for seen_hash, future in self._entries:
+                if hamming_distance(seen_hash, phash) <= DUPLICATE_MAX_DISTANCE:
+                    duplicate_counter["reused"] += 1
+                    return future, False
+        future = asyncio.get_running_loop().create_future()
+        if phash is not None:
+            self._entries.append((phash, future))
+        return future, True
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from cache_store import cache_path
+from logging_service import logger, job_id_var
+from metrics_service import CallbackMetric
+
+# Constants
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Finished jobs (and their results) are deleted this long after they complete
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_STATUSES = ("queued", "running", "completed", "failed")
+# A process owns its unfinished jobs for this long and renews the lease while it runs;
+# jobs whose owner stopped renewing are taken over by another process
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+# Request fields kept only in the memory of the process that accepted the job, never in the store
+SECRET_FIELDS = ("google_api_key", "llm_key", "vlm_key")
+RESUBMIT_ERROR = "The service restarted before this job finished. API keys are not stored, so resubmit the job."
+
+
+class JobStore:
+    """
+    SQLite store for background search jobs and their per-place partial results.
+
+    The submitted request is kept until the job finishes, without its API keys
+    (SECRET_FIELDS), which JobManager holds in memory only. The database files
+    are readable by the service user only, as they hold search results.
+
+    Unfinished jobs carry an owner (one per process) and a lease. Jobs change
+    owner only through an atomic claim once their lease has lapsed, so with
+    several workers, or during a rolling restart, each job runs in one process.
+    Methods are thread-safe and meant to be called through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str | None = None):
+        self._lock = threading.Lock()
+        self._db = None
+        try:
+            path = path or cache_path("jobs.sqlite3")
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT, request TEXT, total INTEGER, done INTEGER, "
+                "error TEXT, result TEXT, created REAL, updated REAL, owner TEXT, lease_until REAL)"
+            )
+            # Stores created before leases existed
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS job_places (job_id TEXT, idx INTEGER, data TEXT, PRIMARY KEY (job_id, idx))"
+            )
+            self._db.commit()
+            # SQLite gives the -wal and -shm files the permissions of the database file
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.chmod(path + suffix, 0o600)
+        except (sqlite3.Error, OSError) as e:
+            # The rest of the service still works; /jobs answers 503
+            logger.error("[Jobs] Store disabled: %s", e)
+            self._db = None
+
+    @property
+    def available(self) -> bool:
+        return self._db is not None
+
+    def create(self, request: dict, owner: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, request, total, done, created, updated, owner, lease_until) "
+                "VALUES (?, 'queued', ?, 0, 0, ?, ?, ?, ?)",
+                (job_id, json.dumps(request), now, now, owner, now + JOB_LEASE_SECONDS)
+            )
+            self._db.commit()
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, total, done, error, created, updated FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, total, done, error, created, updated = row
+        return {
+            "job_id": job_id, "status": status, "progress": {"done": done, "total": total},
+            "error": error, "created": created, "updated": updated,
+        }
+
+    def request(self, job_id: str) -> dict | None:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT request FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def start(self, job_id: str, owner: str) -> bool:
+        """
+        Marks a job running and drops partial results of any earlier, interrupted run.
+        False (and nothing changed) if `owner` no longer holds the job.
+        """
+        with self._lock:
+            started = self._db.execute(
+                "UPDATE jobs SET status = 'running', total = 0, done = 0, updated = ? "
+                "WHERE id = ? AND owner = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id, owner)
+            ).rowcount == 1
+            if started:
+                self._db.execute("DELETE FROM job_places WHERE job_id = ?", (job_id,))
+            self._db.commit()
+        return started
+
+    def add_total(self, job_id: str, count: int):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET total = total + ?, updated = ? WHERE id = ?", (count, time.time(), job_id))
+            self._db.commit()
+
+    def add_place(self, job_id: str, index: int, record: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO job_places (job_id, idx, data) VALUES (?, ?, ?)",
+                (job_id, index, json.dumps(record, ensure_ascii=False))
+            )
+            self._db.execute("UPDATE jobs SET done = done + 1, updated = ? WHERE id = ?", (time.time(), job_id))
+            self._db.commit()
+
+    def places(self, job_id: str, offset: int = 0) -> list:
+        """Partial results finished so far, in place order, starting at `offset`."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idx, data FROM job_places WHERE job_id = ? AND idx >= ? ORDER BY idx", (job_id, offset)
+            ).fetchall()
+        return [{"index": idx, "data": json.loads(data)} for idx, data in rows]
+
+    def finish(self, job_id: str, result: list):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'completed', result = ?, request = NULL, updated = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+            # The final result supersedes the partial records
+            self._db.execute("DELETE FROM job_places WHERE job_id = ?", (job_id,))
+            self._db.commit()
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, request = NULL, updated = ? WHERE id = ?",
+                (error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    def result(self, job_id: str) -> list | None:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def claim_abandoned(self, owner: str) -> list:
+        """
+        Takes over unfinished jobs whose lease lapsed (their process stopped), oldest first.
+        Each job is claimed with one conditional UPDATE, so only one process gets it.
+        """
+        if self._db is None:
+            return []
+        now = time.time()
+        claimed = []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') AND request IS NOT NULL "
+                "AND (owner IS NULL OR lease_until < ?) ORDER BY created", (now,)
+            ).fetchall()
+            for (job_id,) in rows:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET owner = ?, lease_until = ? "
+                    "WHERE id = ? AND status IN ('queued', 'running') AND (owner IS NULL OR lease_until < ?)",
+                    (owner, now + JOB_LEASE_SECONDS, job_id, now)
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(job_id)
+            self._db.commit()
+        return claimed
+
+    def renew_leases(self, owner: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time() + JOB_LEASE_SECONDS, owner)
+            )
+            self._db.commit()
+
+    def release(self, owner: str):
+        """Ends the leases of `owner`'s unfinished jobs, so another process can take them over right away."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = 0 WHERE owner = ? AND status IN ('queued', 'running')", (owner,)
+            )
+            self._db.commit()
+
+    def purge_expired(self, max_age: float = JOB_RETENTION_SECONDS) -> int:
+        if self._db is None:
+            return 0
+        cutoff = time.time() - max_age
+        with self._lock:
+            expired = "SELECT id FROM jobs WHERE status IN ('completed', 'failed') AND updated < ?"
+            self._db.execute(f"DELETE FROM job_places WHERE job_id IN ({expired})", (cutoff,))
+            deleted = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND updated < ?", (cutoff,)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+
+class JobManager:
+    """
+    Bounded pool of asyncio workers running queued jobs.
+
+    `runner(job_id, request)` does the actual work and returns the final result;
+    it reports progress to the store itself. The manager holds leases on its
+    jobs and renews them while running. Jobs whose owner stopped renewing (a
+    previous or crashed process) are claimed on start and then every third of a
+    lease; their API keys went with that process, so they fail with
+    RESUBMIT_ERROR.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self.owner = uuid.uuid4().hex
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list = []
+        self._runner = None
+        # API keys of this process's unfinished jobs, by job ID
+        self._secrets: dict = {}
+
+    async def start(self, runner):
+        self._runner = runner
+        self._queue = asyncio.Queue()
+        if not self.store.available:
+            return
+        purged = await asyncio.to_thread(self.store.purge_expired)
+        if purged:
+            logger.info("[Jobs] Purged %d expired jobs", purged)
+        await self._resume_abandoned()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._keep_leases()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store.available:
+            await asyncio.to_thread(self.store.release, self.owner)
+
+    async def submit(self, request: dict) -> str:
+        stored = {key: value for key, value in request.items() if key not in SECRET_FIELDS}
+        job_id = await asyncio.to_thread(self.store.create, stored, self.owner)
+        self._secrets[job_id] = {key: request[key] for key in SECRET_FIELDS if key in request}
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def _resume_abandoned(self):
+        claimed = await asyncio.to_thread(self.store.claim_abandoned, self.owner)
+        for job_id in claimed:
+            self._queue.put_nowait(job_id)
+        if claimed:
+            logger.info("[Jobs] Took over %d unfinished jobs of a stopped process", len(claimed))
+
+    async def _keep_leases(self):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self.store.renew_leases, self.owner)
+                await self._resume_abandoned()
+            except sqlite3.Error as e:
+                logger.error("[Jobs] Could not renew job leases: %s", e)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        request = await asyncio.to_thread(self.store.request, job_id)
+        secrets = self._secrets.pop(job_id, None)
+        if request is None or not await asyncio.to_thread(self.store.start, job_id, self.owner):
+            return
+        if secrets is None:
+            logger.info("[Jobs] Job %s was interrupted by a restart and cannot resume", job_id)
+            await asyncio.to_thread(self.store.fail, job_id, RESUBMIT_ERROR)
+            return
+        # Every log line of this job (including its spawned tasks) carries the job ID
+        job_id_var.set(job_id)
+        logger.info("[Jobs] Job %s started", job_id)
+        try:
+            result = await self._runner(job_id, {**request, **secrets})
+        except asyncio.CancelledError:
+            # Shutdown: the job stays 'running'; close() releases its lease and the next process fails it
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error("[Jobs] Job %s failed: %s", job_id, detail)
+            await asyncio.to_thread(self.store.fail, job_id, str(detail))
+            return
+        await asyncio.to_thread(self.store.finish, job_id, result)
+        logger.info("[Jobs] Job %s completed with %d places", job_id, len(result))
+
+
+job_store = JobStore()
+jobs = JobManager(job_store)
+CallbackMetric(
+    "plaid_jobs_queued", "Background jobs waiting for a worker.", (),
+    lambda: [((), jobs._queue.qsize() if jobs._queue is not None else 0)]
+)
@@ -1,8 +1,12 @@
-import simplekml
 import json
-from io import BytesIO
+import math
+import os
+import zipfile
+from io import BytesIO, TextIOWrapper
+from xml.sax.saxutils import escape
 
 # --- Constants ---
+KMZ_COMPRESSION_LEVEL = int(os.getenv("KMZ_COMPRESSION_LEVEL", "6"))
 ICON_URLS = {
     "restaurant": "http://maps.google.com/mapfiles/kml/shapes/dining.png",
     "hotel": "http://maps.google.com/mapfiles/kml/shapes/lodging.png",
@@ -56,10 +60,66 @@ def get_sw_ne_coordinates(bbox_tuples):
     ne_lng, ne_lat = bbox_tuples[2]
     return (sw_lat, sw_lng), (ne_lat, ne_lng)
 
+def style_id(loc_type):
+    """Id of the shared icon style for a generalized location type."""
+    return f"icon-{loc_type}"
+
+def write_styles(out):
+    """Writes the search-area style and one shared icon style per location type."""
+    out.write(
+        '<Style id="search-area"><LineStyle><color>ff0000ff</color><width>2</width></LineStyle>'
+        '<PolyStyle><fill>0</fill></PolyStyle></Style>\n'
+    )
+    for loc_type, href in ICON_URLS.items():
+        out.write(
+            f'<Style id="{style_id(loc_type)}"><IconStyle><scale>1.5</scale>'
+            f'<Icon><href>{escape(href)}</href></Icon></IconStyle></Style>\n'
+        )
+
+def write_search_area(out, bbox_tuples, search_term):
+    """Writes the bounding box polygon placemark."""
+    sw, ne = get_sw_ne_coordinates(bbox_tuples)
+    desc = f"Search Term: {search_term}\nSW: {sw}\nNE: {ne}"
+    coords = " ".join(f"{lng},{lat},0" for lng, lat in bbox_tuples)
+    out.write(
+        f"<Placemark><name>Search Area</name><description>{escape(desc)}</description>"
+        f"<styleUrl>#search-area</styleUrl>"
+        f"<Polygon><outerBoundaryIs><LinearRing><coordinates>{coords}</coordinates></LinearRing></outerBoundaryIs></Polygon>"
+        f"</Placemark>\n"
+    )
+
+def is_coordinate(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def write_place(out, item):
+    """Writes one place as a point placemark referencing its type's shared style."""
+    latitude, longitude = item.get('latitude'), item.get('longitude')
+    if not (is_coordinate(latitude) and is_coordinate(longitude)):
+        # A point without coordinates is invalid KML; missing ones come through as "Not provided"
+        return
+    name_data = item.get('name', {})
+    name = f"{get_string(name_data, 'original_name')}:{get_string(name_data, 'translated_name')}"
+    desc = "\n".join([
+        f"Phone: {get_string(item, 'phone_number')}",
+        f"Address: {get_string(item, 'address')}",
+        f"Website: {get_string(item, 'website')}",
+        f"Hours: {format_hours(get_list(item, 'working_hours'))}",
+        f"Google Maps: {get_string(item, 'google_maps_url')}",
+    ])
+    loc_type = generalize(get_string(item, 'type'))
+    out.write(
+        f"<Placemark><name>{escape(name)}</name><description>{escape(desc)}</description>"
+        f"<styleUrl>#{style_id(loc_type)}</styleUrl>"
+        f"<Point><coordinates>{longitude},{latitude},0</coordinates></Point></Placemark>\n"
+    )
+
 def json_to_kmz(j_file, bbox_tuples, search_term):
     """
     Creates a KMZ file in memory from JSON data of places.
 
+    The KML is written straight into the zip entry, one placemark at a time,
+    with a single icon style per location type. Blocking: run it in a thread.
+
     Args:
         j_file (str or dict): JSON file path or data dictionary.
         bbox_tuples (list): List of coordinate tuples for the bounding box.
@@ -69,39 +129,20 @@ def json_to_kmz(j_file, bbox_tuples, search_term):
         BytesIO: A KMZ file object as a binary stream.
     """
     output = BytesIO()
-    kml = simplekml.Kml()
     data = json_to_dict(j_file)
 
-    # Add bounding box polygon
-    pol = kml.newpolygon(name='Search Area')
-    pol.outerboundaryis = bbox_tuples
-    pol.style.linestyle.color = simplekml.Color.red
-    pol.style.linestyle.width = 2
-    pol.style.polystyle.fill = 0
-    sw, ne = get_sw_ne_coordinates(bbox_tuples)
-    pol.description = f"Search Term: {search_term}\nSW: {sw}\nNE: {ne}"
-
-    # Process each place and add it directly to the KML object
-    for item in data.get('places', []):
-        name_data = item.get('name', {})
-        name = f"{get_string(name_data, 'original_name')}:{get_string(name_data, 'translated_name')}"
-        
-        desc = f"""
-        Phone: {get_string(item, 'phone_number')}
-        Address: {get_string(item, 'address')}
-        Website: {get_string(item, 'website')}
-        Hours: {format_hours(get_list(item, 'working_hours'))}
-        Google Maps: {get_string(item, 'Maps_url')}
-        """.strip()
-
-        coords = (get_string(item, 'longitude'), get_string(item, 'latitude'))
-        loc_type = generalize(get_string(item, 'type'))
-        
-        pnt = kml.newpoint(name=name, coords=[coords])
-        pnt.description = desc
-        pnt.style.iconstyle.icon.href = get_icon(loc_type)
-        pnt.style.iconstyle.scale = 1.5
-
-    kml.savekmz(output)
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED, compresslevel=KMZ_COMPRESSION_LEVEL) as kmz:
+        # Google Earth opens the first .kml entry of a KMZ, conventionally doc.kml
+        with kmz.open("doc.kml", "w") as entry, TextIOWrapper(entry, encoding="utf-8") as out:
+            out.write(
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+            )
+            write_styles(out)
+            write_search_area(out, bbox_tuples, search_term)
+            for item in data.get('places', []):
+                write_place(out, item)
+            out.write("</Document></kml>\n")
+
     output.seek(0)
-    return output
\ No newline at end of file
+    return output
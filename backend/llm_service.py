@@ -1,27 +1,17 @@
 import json
-from openai import OpenAI
+from openai import AsyncOpenAI, RateLimitError, AuthenticationError
+from httpx import HTTPStatusError
 from typing import List, Dict
 from logging_service import logger
+from rate_limiter import call_openai
 
 LLM_DEPLOYMENT = "gpt-4.1-mini-2025-04-14"
 
-def get_review_summary(client: OpenAI, reviews: List[Dict]) -> str:
-    """
-    Summarizes customer reviews using an OpenAI LLM.
-    
-    Args:
-        llm_key (str): API key for OpenAI.
-        reviews (List[Dict]): List of review dictionaries.
-
-    Returns:
-        str: A summary paragraph of all reviews.
-    """
-    if not reviews:
-        return "No reviews available for summarization."
-
+def build_review_messages(reviews: List[Dict]) -> List[Dict]:
+    """Builds the chat messages used to summarize a list of reviews."""
     review_texts = [{"review_text": r.get("text", {}).get("text", "")} for r in reviews if r.get("text")]
 
-    messages = [
+    return [
         {
             "role": "system",
             "content": (
@@ -36,15 +26,38 @@ def get_review_summary(client: OpenAI, reviews: List[Dict]) -> str:
         }
     ]
 
+async def get_review_summary_async(client: AsyncOpenAI, reviews: List[Dict]) -> str:
+    """
+    Summarizes customer reviews using an OpenAI LLM.
+
+    Runs under the shared openai_chat governor, which retries rate-limit and
+    transient errors.
+    """
+    if not reviews:
+        return "No reviews available for summarization."
+
     try:
-        response = client.chat.completions.create(
+        response = await call_openai("openai_chat", lambda: client.chat.completions.with_raw_response.create(
             model=LLM_DEPLOYMENT,
             temperature=0.0,
             max_tokens=400,
-            messages=messages
-        )
+            messages=build_review_messages(reviews)
+        ), usage="llm")
         return response.choices[0].message.content.strip() if response.choices else "No summary generated."
-    
+
+    except RateLimitError:
+        logger.error("[LLM] Rate limit exceeded after multiple retries.")
+        return "Rate limit exceeded after multiple retries."
+
+    except AuthenticationError:
+        # Returned rather than raised, so a bad LLM key costs only the summary and not the rest of the place
+        logger.error("[LLM] Invalid API key.")
+        return "Failed to generate review summary: authentication failed, check your API key."
+
+    except HTTPStatusError as e:
+        logger.error("[LLM] HTTP error: %d", e.response.status_code)
+        return f"Failed to generate review summary: HTTP error {e.response.status_code}"
+
     except Exception as e:
-        logger.error(f"Failed to generate review summary: {str(e)}")
+        logger.error("Failed to generate review summary: %s", e)
         return f"Failed to generate review summary: {str(e)}"
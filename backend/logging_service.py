@@ -1,10 +1,101 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
+from datetime import datetime, timezone
+
+# Constants (tunable through the environment)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for one structured record per line, "text" for the classic human-readable format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of DEBUG/INFO records kept; warnings and errors are never sampled out
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Log arguments safe to format later on the listener thread
+IMMUTABLE_LOG_ARGS = (str, int, float, bool, bytes, type(None))
+
+# Correlation IDs of the request / background job being served (set by api_service and job_service)
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+job_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("job_id", default=None)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Attaches request and job IDs to each record and samples low-severity records.
+    Runs on the calling task, so the IDs come from the right context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and LOG_SAMPLE_RATE < 1.0 and random.random() >= LOG_SAMPLE_RATE:
+            return False
+        record.request_id = request_id_var.get()
+        record.job_id = job_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "job_id"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stdlib version formats the record here, on the caller's thread, and clears exc_info.
+        # Records only cross threads in this process, so they are queued as-is and message
+        # interpolation and traceback rendering happen on the listener thread. Arguments
+        # the caller may still mutate (dicts, lists, objects) are rendered now instead.
+        if record.args and not (
+            isinstance(record.args, tuple) and all(isinstance(arg, IMMUTABLE_LOG_ARGS) for arg in record.args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
 
 logger = logging.getLogger('PLAID_logs')
-logger.setLevel(logging.DEBUG)
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+# Records are formatted and written to stdout by a background thread; the caller only enqueues
+stream_handler = logging.StreamHandler(sys.stdout)
+if LOG_FORMAT == "json":
+    stream_handler.setFormatter(JsonFormatter())
+else:
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+handler = DroppingQueueHandler(log_queue)
+handler.addFilter(ContextFilter())
+logger.addHandler(handler)
 
-handler = logging.StreamHandler(sys.stdout)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
\ No newline at end of file
+listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+listener.start()
+# Flush what is still queued on interpreter exit
+atexit.register(listener.stop)
@@ -0,0 +1,174 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Constants
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Upstream calls take milliseconds; whole searches take minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Utility Functions ---
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# --- Metric Types ---
+class Metric:
+    """Base for labelled metrics in the Prometheus text format. Thread-safe."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{format_labels(self.labelnames, k)} {format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Counts the block as in flight while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    Values read from live state at scrape time (e.g. cache stats, governor state).
+    `collect()` returns (label values tuple, value) pairs.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple, collect, kind: str = "gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> list:
+        return self.header() + [
+            f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in self.collect()
+        ]
+
+
+registry: list = []
+caches: dict = {}
+
+
+def register_cache(name: str, cache):
+    """Exposes a cache's stats() (hits, misses, hit_ratio) as metrics."""
+    caches[name] = cache
+
+
+def cache_samples(field: str):
+    return [((name,), cache.stats()[field]) for name, cache in list(caches.items())]
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+# --- Pipeline Metrics ---
+upstream_seconds = Histogram(
+    "plaid_upstream_request_seconds", "Latency of upstream API calls including retries.", ("operation",)
+)
+upstream_requests = Counter(
+    "plaid_upstream_requests_total", "Upstream API calls by final outcome.", ("operation", "outcome")
+)
+stage_seconds = Histogram(
+    "plaid_stage_seconds", "Duration of pipeline stages (search, enrich, rank, translation, exports, per-place work).", ("stage",)
+)
+places_in_flight = Gauge("plaid_places_in_flight", "Places currently being enriched.")
+http_seconds = Histogram("plaid_http_request_seconds", "Time to response start per endpoint.", ("path", "method"))
+http_requests = Counter("plaid_http_requests_total", "HTTP requests per endpoint and status.", ("path", "method", "status"))
+http_in_flight = Gauge("plaid_http_requests_in_flight", "HTTP requests currently being handled.")
+CallbackMetric("plaid_cache_hits_total", "Cache hits.", ("cache",), lambda: cache_samples("hits"), kind="counter")
+CallbackMetric("plaid_cache_misses_total", "Cache misses.", ("cache",), lambda: cache_samples("misses"), kind="counter")
+CallbackMetric("plaid_cache_hit_ratio", "Cache hit ratio since start.", ("cache",), lambda: cache_samples("hit_ratio"))
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import List
+
+from fastapi import HTTPException
+from cache_store import TTLCache
+from client_pool import get_http_client
+from logging_service import logger
+from metrics_service import register_cache
+from rate_limiter import governed_request
+
+# Constants
+# Overridable so the service can run against local stand-ins (benchmarks/fake_upstreams.py)
+PLACES_API_URL = os.getenv("PLACES_API_URL", "https://places.googleapis.com/v1").rstrip("/")
+TEXT_SEARCH_URL = f"{PLACES_API_URL}/places:searchText"
+PLACES_CACHE_TTL = float(os.getenv("PLACES_CACHE_TTL", "900"))
+PLACES_CACHE_MAX_ENTRIES = int(os.getenv("PLACES_CACHE_MAX_ENTRIES", "256"))
+
+# Field mask of /search_nearby. An /estimator call with prefetch=true fetches the same
+# pages, so the search that follows is served from the cache
+SEARCH_FIELD_MASK = (
+    "places.id,places.displayName,places.types,places.websiteUri,places.nationalPhoneNumber,"
+    "places.formattedAddress,places.location,places.reviews,places.photos,"
+    "places.regularOpeningHours,places.googleMapsUri,nextPageToken"
+)
+# Default /estimator mask: only what it counts, without the contact, hours and location fields
+ESTIMATE_FIELD_MASK = "places.id,places.photos,places.reviews,nextPageToken"
+
+# Text search never returns more than 3 pages of 20; a tile at this count is saturated
+MAX_RESULTS_PER_QUERY = 60
+TILE_MAX_DEPTH = int(os.getenv("TILE_MAX_DEPTH", "4"))
+MAX_CONCURRENT_TILES = int(os.getenv("MAX_CONCURRENT_TILES", "8"))
+
+# Text-search results shared by /estimator and /search_nearby
+places_cache = TTLCache(ttl=PLACES_CACHE_TTL, max_items=PLACES_CACHE_MAX_ENTRIES)
+register_cache("places", places_cache)
+
+tile_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TILES)
+
+
+# --- Helper Functions ---
+def build_payload(text_query, lat_sw, lng_sw, lat_ne, lng_ne, page_token=None):
+    return {
+        "textQuery": text_query,
+        "locationRestriction": {
+            "rectangle": {
+                "low": {"latitude": lat_sw, "longitude": lng_sw},
+                "high": {"latitude": lat_ne, "longitude": lng_ne}
+            }
+        },
+        "pageToken": page_token
+    }
+
+
+def normalize_payload(payload: dict) -> dict:
+    """Canonical form of a text-search payload: collapsed/casefolded query, coordinates rounded to ~1 cm."""
+    rectangle = payload["locationRestriction"]["rectangle"]
+    return {
+        "textQuery": " ".join(str(payload["textQuery"]).split()).casefold(),
+        "rectangle": [round(float(rectangle[corner][axis]), 7) for corner in ("low", "high") for axis in ("latitude", "longitude")],
+        "pageToken": payload.get("pageToken"),
+    }
+
+
+def mask_fields(field_mask: str) -> frozenset:
+    """Place fields requested by an X-Goog-FieldMask, without the 'places.' prefix."""
+    fields = (f.strip() for f in (field_mask or "").split(","))
+    return frozenset(f.split(".", 1)[1] for f in fields if f.startswith("places."))
+
+
+def places_cache_key(payload: dict, headers: dict) -> str:
+    # The API key is part of the key (hashed), so one caller never gets results paid for by another
+    key_hash = hashlib.sha256(headers.get("X-Goog-Api-Key", "").encode("utf-8")).hexdigest()[:16]
+    return json.dumps({"key": key_hash, **normalize_payload(payload)}, sort_keys=True)
+
+
+def project_places(places: List[dict], fields: frozenset) -> List[dict]:
+    """Keeps only the requested top-level place fields."""
+    top_level = {f.split(".", 1)[0] for f in fields}
+    return [{k: v for k, v in place.items() if k in top_level} for place in places]
+
+
+def get_cached_places(payload: dict, headers: dict) -> List[dict] | None:
+    """
+    Looks up a previous text search for the same payload.
+
+    An /estimator call with prefetch=true and the /search_nearby that follows
+    both use SEARCH_FIELD_MASK and share an entry. An entry fetched with a wider
+    field mask also serves a narrower one, e.g. a following default estimate.
+    """
+    key = places_cache_key(payload, headers)
+    fields = mask_fields(headers.get("X-Goog-FieldMask"))
+
+    places = places_cache.get((key, fields))
+    if places is not None:
+        return places
+
+    for (cached_key, cached_fields), cached_places in reversed(places_cache.items()):
+        if cached_key == key and fields <= cached_fields:
+            logger.debug("Places cache: reusing %d places fetched with a wider field mask", len(cached_places))
+            return project_places(cached_places, fields)
+    return None
+
+
+# --- Core Async Functions ---
+async def iter_place_pages(payload: dict, headers: dict):
+    """
+    Yields each page of text-search results as soon as it arrives.
+
+    Pagination is iterative and the caller's payload is never modified. A
+    cached search is yielded as a single page; a completed fetch is cached.
+    """
+    cached = get_cached_places(payload, headers)
+    if cached is not None:
+        yield cached
+        return
+
+    cache_key = (places_cache_key(payload, headers), mask_fields(headers.get("X-Goog-FieldMask")))
+    result = []
+    page_token = payload.get("pageToken")
+
+    while True:
+        request = {**payload, "pageToken": page_token}
+        response = await governed_request("places", get_http_client(), "POST", TEXT_SEARCH_URL, json=request, headers=headers)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+
+        data = response.json()
+        page = data.get("places", [])
+        result.extend(page)
+        yield page
+
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            break
+
+    places_cache.set(cache_key, result)
+
+
+async def fetch_all_places(payload, headers) -> List[dict]:
+    """Fetches all paginated places from Google Places API, reusing cached text-search results."""
+    return [place async for page in iter_place_pages(payload, headers) for place in page]
+
+
+async def as_pages(places: List[dict]):
+    """Wraps an already fetched list of places as a single-page stream."""
+    yield places
+
+
+async def prepend_page(first_page: List[dict], pages):
+    """Re-attaches a page that was awaited up front (to surface errors early) to the rest of the stream."""
+    yield first_page
+    async for page in pages:
+        yield page
+
+
+# --- Tiled Search ---
+def split_tile(lat_sw, lng_sw, lat_ne, lng_ne) -> list:
+    """Splits a rectangle into four quadrants, ordered SW, SE, NW, NE."""
+    lat_mid = (lat_sw + lat_ne) / 2
+    lng_mid = (lng_sw + lng_ne) / 2
+    return [
+        (lat_sw, lng_sw, lat_mid, lng_mid),
+        (lat_sw, lng_mid, lat_mid, lng_ne),
+        (lat_mid, lng_sw, lat_ne, lng_mid),
+        (lat_mid, lng_mid, lat_ne, lng_ne),
+    ]
+
+
+def dedupe_places(places: List[dict]) -> List[dict]:
+    """Drops repeated places by ID, keeping the first occurrence. Places without an ID are kept."""
+    seen = set()
+    unique = []
+    for place in places:
+        place_id = place.get("id")
+        if place_id is not None:
+            if place_id in seen:
+                continue
+            seen.add(place_id)
+        unique.append(place)
+    return unique
+
+
+async def fetch_tile(text_query: str, tile: tuple, headers: dict, depth: int = 0) -> List[dict]:
+    """Searches one tile and, only if it came back saturated, its four quadrants concurrently."""
+    # Request pacing is done per page by the shared "places" governor (PLACES_MAX_QPS)
+    async with tile_semaphore:
+        places = await fetch_all_places(build_payload(text_query, *tile), headers)
+
+    if len(places) < MAX_RESULTS_PER_QUERY:
+        return places
+    if depth >= TILE_MAX_DEPTH:
+        logger.warning("Tile %s is still saturated at depth %d; results in it may be truncated.", tile, depth)
+        return places
+
+    children = await asyncio.gather(*(fetch_tile(text_query, child, headers, depth + 1) for child in split_tile(*tile)))
+    return places + [place for child in children for place in child]
+
+
+async def fetch_places_tiled(text_query, lat_sw, lng_sw, lat_ne, lng_ne, headers) -> List[dict]:
+    """
+    Covers a large bounding box with an adaptive quadtree of text searches.
+
+    Results are deduplicated by place ID in quadtree order (parent before
+    SW, SE, NW, NE children), so the output is deterministic.
+    """
+    fields = [f.strip() for f in headers.get("X-Goog-FieldMask", "").split(",") if f.strip()]
+    if "places.id" not in fields:
+        # IDs are needed for deduplication
+        headers = {**headers, "X-Goog-FieldMask": ",".join(["places.id", *fields])}
+
+    places = await fetch_tile(text_query, (lat_sw, lng_sw, lat_ne, lng_ne), headers)
+    unique = dedupe_places(places)
+    logger.debug("Tiled search returned %d places, %d unique", len(places), len(unique))
+    return unique
@@ -0,0 +1,243 @@
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from cache_store import cache_path
+from logging_service import logger
+
+# Constants (tunable through the environment)
+# Profiling is off unless enabled here; requests then opt in with X-Profile / ?profile=
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# When set, the flag must carry this value, so only operators can trigger profiles
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_LAG_INTERVAL = float(os.getenv("PROFILE_LAG_INTERVAL", "0.05"))
+PROFILE_MAX_DEPTH = 64
+PROFILES_KEPT = int(os.getenv("PROFILES_KEPT", "50"))
+# Loop callbacks (one coroutine step each) running longer than this are logged while profiling is enabled
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "100"))
+
+# Accepted X-Request-ID values (api_service replaces others); request IDs also name profile files
+PROFILE_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+# Innermost loop-thread frames that mean the loop is idle, waiting for I/O or timers
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "control"}
+
+# Profiles currently recording; slow callbacks are added to each of them
+active_profiles: set = set()
+
+
+# --- Utility Functions ---
+def profiling_requested(headers, query_params) -> bool:
+    """True if profiling is enabled and the request opts in with an accepted X-Profile header or ?profile= value."""
+    if not PROFILING_ENABLED:
+        return False
+    value = headers.get("X-Profile") or query_params.get("profile")
+    if not value:
+        return False
+    if PROFILING_TOKEN:
+        return value == PROFILING_TOKEN
+    return value.lower() not in ("0", "false", "no")
+
+
+def fold_stack(frame) -> str:
+    """A thread's stack as one 'outer;...;inner' line, the collapsed format flame graph tools read."""
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def coroutine_location(coro, depth: int = 3) -> str:
+    """Where a suspended coroutine chain is waiting, as its innermost `depth` frames ('outer > inner')."""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+        coro = getattr(coro, "cr_await", None)
+    return " > ".join(frames[-depth:])
+
+
+def describe_handle(handle) -> str:
+    """Names the task behind a loop callback, falling back to the handle's repr."""
+    callback = getattr(handle, "_callback", None)
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", repr(coro))
+        return f"task {task.get_name()} ({name}), next await at {coroutine_location(coro) or 'end'}"
+    return repr(handle)
+
+
+# --- Slow Callback Detector ---
+def install_slow_callback_detector(threshold_ms: float = SLOW_CALLBACK_MS):
+    """
+    Times every event-loop callback (for tasks, one step between two awaits) and
+    logs those holding the loop longer than `threshold_ms`, in the context of the
+    request that scheduled them. Works on the stdlib asyncio loop (not uvloop).
+    """
+    original = asyncio.events.Handle._run
+    if getattr(original, "slow_callback_detector", False):
+        return
+    threshold = threshold_ms / 1000
+
+    def run(handle):
+        start = time.perf_counter()
+        try:
+            original(handle)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed >= threshold:
+                report_slow_callback(handle, elapsed)
+
+    run.slow_callback_detector = True
+    asyncio.events.Handle._run = run
+    logger.info("[Profiling] Logging event-loop callbacks slower than %.0f ms", threshold_ms)
+
+
+def report_slow_callback(handle, elapsed: float):
+    description = describe_handle(handle)
+    message = f"[Profiling] Slow callback held the event loop for {elapsed * 1000:.0f} ms: {description}"
+    context = getattr(handle, "_context", None)
+    # Logged from the callback's own context so the record carries its request ID
+    if context is not None:
+        context.run(logger.warning, message)
+    else:
+        logger.warning(message)
+    for profile in list(active_profiles):
+        profile.slow_callbacks.append({
+            "at": round(time.perf_counter() - profile.started, 4), "ms": round(elapsed * 1000, 1), "callback": description,
+        })
+
+
+# --- Request Profiler ---
+class RequestProfiler:
+    """
+    Records one request: a sampling profile of every thread, an event-loop lag
+    trace and the slow callbacks seen while it runs. Sampling is process-wide, so
+    other requests served at the same time show up in the profile too.
+
+    Call start() on the event loop, then `await finish()`, which writes
+    <profile_id>.json (summary, lag trace, slow callbacks) and <profile_id>.folded
+    (stacks for flame graph tools) to the profiles cache directory.
+    """
+
+    def __init__(self, label: str, request_id: str | None = None):
+        if not (request_id and PROFILE_ID_PATTERN.fullmatch(request_id)):
+            request_id = uuid.uuid4().hex
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{request_id}"
+        self.label = label
+        self.samples: Counter = Counter()
+        self.lag: list = []
+        self.slow_callbacks: list = []
+        self.started = 0.0
+        self.loop_samples = 0
+        self.loop_busy_samples = 0
+        self._loop_thread_id = None
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._lag_task: asyncio.Task | None = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._loop_thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        self._lag_task = asyncio.create_task(self._watch_lag())
+        active_profiles.add(self)
+
+    async def finish(self) -> str | None:
+        active_profiles.discard(self)
+        self._stop.set()
+        self._lag_task.cancel()
+        await asyncio.gather(self._lag_task, return_exceptions=True)
+        await asyncio.to_thread(self._sampler.join)
+        duration = time.perf_counter() - self.started
+        try:
+            path = await asyncio.to_thread(self._save, duration)
+        except OSError as e:
+            # A profile that cannot be written never fails the request it measured
+            logger.error("[Profiling] Could not save profile %s: %s", self.profile_id, e)
+            return None
+        logger.info("[Profiling] %s profiled for %.1fs, saved to %s", self.label, duration, path)
+        return path
+
+    def _sample(self):
+        names = {}
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id == threading.get_ident():
+                    continue
+                if thread_id == self._loop_thread_id:
+                    self.loop_samples += 1
+                    if frame.f_code.co_name not in IDLE_FUNCTIONS:
+                        self.loop_busy_samples += 1
+                    thread_name = "event-loop"
+                else:
+                    thread_name = names.get(thread_id, str(thread_id))
+                self.samples[f"{thread_name};{fold_stack(frame)}"] += 1
+
+    async def _watch_lag(self):
+        # Any delay beyond the requested sleep is time the loop spent running something else
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(PROFILE_LAG_INTERVAL)
+            lag = time.perf_counter() - start - PROFILE_LAG_INTERVAL
+            self.lag.append([round(start - self.started, 4), round(max(lag, 0.0) * 1000, 2)])
+
+    def _save(self, duration: float) -> str:
+        directory = cache_path("profiles")
+        os.makedirs(directory, exist_ok=True)
+        lags = sorted(lag for _, lag in self.lag)
+        summary = {
+            "profile_id": self.profile_id,
+            "label": self.label,
+            "duration_seconds": round(duration, 3),
+            "sample_interval_seconds": PROFILE_SAMPLE_INTERVAL,
+            # Share of samples where the loop thread was running Python rather than waiting for I/O
+            "loop_busy_ratio": round(self.loop_busy_samples / self.loop_samples, 3) if self.loop_samples else None,
+            "lag_ms": {
+                "interval_seconds": PROFILE_LAG_INTERVAL,
+                "max": lags[-1] if lags else None,
+                "p99": lags[int(0.99 * (len(lags) - 1))] if lags else None,
+                "trace": self.lag,
+            },
+            "slow_callbacks": self.slow_callbacks,
+            "top_loop_stacks": [
+                {"stack": stack.split(";", 1)[1], "samples": count}
+                for stack, count in self.samples.most_common()
+                if stack.startswith("event-loop;") and stack.rsplit(" (", 1)[0].rsplit(";", 1)[-1] not in IDLE_FUNCTIONS
+            ][:20],
+        }
+        base = os.path.join(directory, self.profile_id)
+        with open(f"{base}.json", "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+        with open(f"{base}.folded", "w", encoding="utf-8") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in self.samples.items())
+        prune_profiles(directory)
+        return f"{base}.json"
+
+
+def prune_profiles(directory: str, keep: int = PROFILES_KEPT):
+    """Deletes all but the newest `keep` profiles."""
+    summaries = sorted(glob.glob(os.path.join(directory, "*.json")))
+    for summary in summaries[:-keep] if keep > 0 else summaries:
+        for path in (summary, summary[:-len(".json")] + ".folded"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,271 @@
+import asyncio
+import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from openai import RateLimitError, APIConnectionError, APITimeoutError, APIStatusError
+from logging_service import logger
+from metrics_service import CallbackMetric, upstream_seconds, upstream_requests
+from telemetry_service import record_usage
+
+# Constants
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "8"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("UPSTREAM_BACKOFF_CAP", "30"))
+# The adaptive rate never drops below this fraction of the configured rate
+MIN_RATE_FRACTION = 0.1
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Process-wide cap on LLM/VLM chat calls in flight; also sizes the per-search place fan-out
+OPENAI_CHAT_CONCURRENCY = int(os.getenv("OPENAI_CHAT_CONCURRENCY", "25"))
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+class UpstreamGovernor:
+    """
+    Process-wide token bucket plus concurrency cap for one upstream API.
+
+    The refill rate adapts AIMD-style: it is halved (down to MIN_RATE_FRACTION
+    of the configured rate) on every rate-limit response and creeps back up on
+    success. Retry-After and "remaining requests" headers pause all callers
+    until the upstream window resets.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_concurrency: int):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.tokens = burst
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self._last_refill = time.monotonic()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _take_token(self):
+        # Refill and take happen without an await in between, so they are atomic on the
+        # event loop; waiters sleep on their own and re-check, nobody sleeps holding a lock
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                wait = self.paused_until - now
+            else:
+                self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits for a token and a concurrency slot, held for the duration of one upstream call."""
+        async with self._semaphore:
+            await self._take_token()
+            self.in_flight += 1
+            self.calls += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_rate_limited(self, retry_after: float | None):
+        self.rate_limited += 1
+        self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+        self.tokens = 0
+        self.pause(retry_after if retry_after is not None else 1.0)
+        logger.debug("[RateLimit:%s] throttled; rate now %.2f/s", self.name, self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe_headers(self, headers):
+        """Pauses ahead of a 429 when the upstream says the request window is exhausted."""
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        if remaining is not None and reset is not None and remaining.isdigit() and int(remaining) <= 1:
+            self.pause(reset)
+
+    def stats(self) -> dict:
+        return {
+            "rate": round(self.rate, 3),
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
+
+
+governors = {
+    "openai_chat": UpstreamGovernor(
+        "openai_chat", env_float("OPENAI_CHAT_RPS", 20), env_float("OPENAI_CHAT_BURST", 25), OPENAI_CHAT_CONCURRENCY
+    ),
+    "openai_embeddings": UpstreamGovernor(
+        "openai_embeddings", env_float("OPENAI_EMBEDDINGS_RPS", 10), env_float("OPENAI_EMBEDDINGS_BURST", 10), int(env_float("OPENAI_EMBEDDINGS_CONCURRENCY", 4))
+    ),
+    "places": UpstreamGovernor(
+        "places", env_float("PLACES_MAX_QPS", 10), env_float("PLACES_BURST", 10), int(env_float("PLACES_CONCURRENCY", 16))
+    ),
+    # Photo media has its own Place Photo quota; sharing "places" would cap a 600-photo search at 10/s
+    "place_photos": UpstreamGovernor(
+        "place_photos", env_float("PLACE_PHOTOS_MAX_QPS", 100), env_float("PLACE_PHOTOS_BURST", 100), int(env_float("PLACE_PHOTOS_CONCURRENCY", 32))
+    ),
+    "street_view": UpstreamGovernor(
+        "street_view", env_float("STREET_VIEW_MAX_QPS", 20), env_float("STREET_VIEW_BURST", 20), int(env_float("STREET_VIEW_CONCURRENCY", 16))
+    ),
+}
+
+
+CallbackMetric(
+    "plaid_upstream_in_flight", "Upstream calls currently in flight.", ("upstream",),
+    lambda: [((name,), g.in_flight) for name, g in governors.items()]
+)
+CallbackMetric(
+    "plaid_upstream_concurrency_limit", "Concurrency cap per upstream.", ("upstream",),
+    lambda: [((name,), g.max_concurrency) for name, g in governors.items()]
+)
+CallbackMetric(
+    "plaid_upstream_rate_per_second", "Current adaptive request rate per upstream.", ("upstream",),
+    lambda: [((name,), g.rate) for name, g in governors.items()]
+)
+CallbackMetric(
+    "plaid_upstream_retries_total", "Upstream call retries.", ("upstream",),
+    lambda: [((name,), g.retries) for name, g in governors.items()], kind="counter"
+)
+CallbackMetric(
+    "plaid_upstream_rate_limited_total", "Rate-limit responses per upstream.", ("upstream",),
+    lambda: [((name,), g.rate_limited) for name, g in governors.items()], kind="counter"
+)
+
+
+# --- Utility Functions ---
+def parse_duration(value: str | None) -> float | None:
+    """Parses OpenAI reset durations such as '20ms', '1s' or '6m0s' into seconds."""
+    if not value:
+        return None
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = re.findall(r"([\d.]+)(ms|s|m|h)", value)
+    return sum(float(number) * units[unit] for number, unit in parts) if parts else None
+
+
+def parse_retry_after(headers) -> float | None:
+    if headers is None:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def jittered_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the upstream's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def is_retryable_openai_error(error: Exception) -> bool:
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+# --- Core Async Functions ---
+async def call_openai(upstream: str, make_call, max_retries: int = MAX_RETRIES, usage: str | None = None):
+    """
+    Runs an OpenAI SDK call under the upstream governor and returns the parsed result.
+
+    `make_call` must return a `with_raw_response` coroutine so rate-limit headers
+    can be observed. Rate limits, timeouts, connection and 5xx errors are retried
+    in a loop with jittered backoff; the last error is re-raised. Calls and tokens
+    are recorded for telemetry under `usage` (default: the upstream name).
+    """
+    usage = usage or upstream
+    governor = governors[upstream]
+    start = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        try:
+            async with governor.slot():
+                raw = await make_call()
+            governor.observe_headers(raw.headers)
+            governor.on_success()
+            result = raw.parse()
+            tokens = getattr(result, "usage", None)
+            record_usage(**{
+                f"{usage}_calls": 1,
+                f"{usage}_input_tokens": getattr(tokens, "prompt_tokens", 0),
+                f"{usage}_output_tokens": getattr(tokens, "completion_tokens", 0),
+            })
+            upstream_seconds.observe(time.perf_counter() - start, operation=usage)
+            upstream_requests.inc(operation=usage, outcome="ok")
+            return result
+        except Exception as e:
+            if not is_retryable_openai_error(e) or attempt >= max_retries:
+                upstream_seconds.observe(time.perf_counter() - start, operation=usage)
+                upstream_requests.inc(operation=usage, outcome="error")
+                raise
+            retry_after = parse_retry_after(getattr(getattr(e, "response", None), "headers", None))
+            if isinstance(e, RateLimitError):
+                governor.on_rate_limited(retry_after)
+            governor.retries += 1
+            wait_time = jittered_delay(attempt, retry_after)
+            logger.error("[%s] %s. Retrying in %.1fs... (Attempt %d/%d)", upstream, type(e).__name__, wait_time, attempt + 1, max_retries)
+            await asyncio.sleep(wait_time)
+
+
+async def governed_request(upstream: str, client: httpx.AsyncClient, method: str, url: str, max_retries: int = MAX_RETRIES, usage: str | None = None, **kwargs) -> httpx.Response:
+    """
+    Sends an HTTP request under the upstream governor, retrying 429/5xx responses and
+    transport errors with jittered backoff. The final response is returned as-is.
+    Successful calls are counted for telemetry under `usage` (default: the upstream name).
+    """
+    usage = usage or upstream
+    governor = governors[upstream]
+    start = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        try:
+            async with governor.slot():
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt >= max_retries:
+                upstream_seconds.observe(time.perf_counter() - start, operation=usage)
+                upstream_requests.inc(operation=usage, outcome="error")
+                raise
+            governor.retries += 1
+            wait_time = jittered_delay(attempt)
+            logger.error("[%s] %s. Retrying in %.1fs... (Attempt %d/%d)", upstream, type(e).__name__, wait_time, attempt + 1, max_retries)
+            await asyncio.sleep(wait_time)
+            continue
+
+        if response.status_code not in RETRYABLE_STATUS or attempt >= max_retries:
+            if response.status_code < 400:
+                governor.on_success()
+                record_usage(**{f"{usage}_calls": 1})
+            upstream_seconds.observe(time.perf_counter() - start, operation=usage)
+            upstream_requests.inc(operation=usage, outcome="ok" if response.status_code < 400 else "error")
+            return response
+
+        retry_after = parse_retry_after(response.headers)
+        if response.status_code == 429:
+            governor.on_rate_limited(retry_after)
+        governor.retries += 1
+        wait_time = jittered_delay(attempt, retry_after)
+        logger.error("[%s] HTTP %d. Retrying in %.1fs... (Attempt %d/%d)", upstream, response.status_code, wait_time, attempt + 1, max_retries)
+        await asyncio.sleep(wait_time)
@@ -1,8 +1,8 @@
-import pandas as pd
-from openai import OpenAI
-from sklearn.metrics.pairwise import cosine_similarity
+from embedding_service import embed_texts, get_embedding_backend
 import numpy as np
 from logging_service import logger
+import asyncio
+import logging
 import time
  
 def score_to_label(score):
@@ -13,7 +13,7 @@ def score_to_label(score):
     Args:
         score (float): 
     Returns:
-        pandas.DataFrame
+        str
     """
     if score < 0.5:
         return 'low'
@@ -22,19 +22,22 @@ def score_to_label(score):
     else:
         return 'high'
 
-def rank_live_results(api_data, user_prompt, api_key, top_n=3):  
+async def rank_live_results(api_data, user_prompt, api_key, top_n=3, embedding_backend=None):
     """
     Ranks live API data based on semantic similarity to a user prompt.
     
     Args:
         api_data (list): The list of dictionary objects from your API call.
         user_prompt (str): The user's search query.
+        api_key (str): OpenAI key, used by the "openai" embedding backend.
         top_n (int): The number of top results to return.
+        embedding_backend (str): "openai" or "local"; defaults to the EMBEDDING_BACKEND setting.
     
     Returns:
-        pandas.DataFrame: A DataFrame of the top_n ranked locations.
+        list: (location index, similarity label) pairs of the recommended locations,
+        or False when nothing could be ranked.
     """
-    client = OpenAI(api_key=api_key)
+    backend = get_embedding_backend(embedding_backend, api_key)
 
     if not api_data:
         logger.debug("API data is empty. Cannot perform ranking.")
@@ -67,66 +70,61 @@ def rank_live_results(api_data, user_prompt, api_key, top_n=3):
         logger.debug("No text snippets found in the API data to embed.")
         return False
     
-    logger.debug(f"Generating embeddings for the prompt and {len(all_snippets)} text snippets...")
+    logger.debug("Generating embeddings for the prompt and %d text snippets...", len(all_snippets))
     texts_to_embed = [user_prompt] + all_snippets
 
     try:
-        response = client.embeddings.create(input=texts_to_embed, model="text-embedding-3-small")
-        all_embeddings = [item.embedding for item in response.data]
+        # Cached vectors are reused; only unseen texts hit the embeddings API
+        all_embeddings = await embed_texts(backend, texts_to_embed)
     except Exception as e:
-        logger.debug(f"Error calling OpenAI API: {e}")
-        return pd.DataFrame()
-
-    prompt_embedding = np.array(all_embeddings[0])
-    snippet_embeddings = np.array(all_embeddings[1:])
-    
-    # Calculate similarity for every snippet using cosine_similarity
-    similarities = [cosine_similarity([prompt_embedding], [emb])[0][0] for emb in snippet_embeddings]
-
-    # Find the best match for each location
-    # Create a DataFrame to easily group results by location
-    results_df = pd.DataFrame({
-        'location_index': snippet_location_map,
-        'influential_snippet': all_snippets,
-        'similarity_score': similarities
-    })
-    
-    # Group by the original location index and find the maximum similarity score
-    # This is the "Best Match" strategy
-    best_match_indices = results_df.groupby('location_index')['similarity_score'].idxmax()
-    best_matches_df = results_df.loc[best_match_indices]
-
-    
-    # Rank locations based on their best match score
-    # Convert the original API data to a DataFrame to merge results
-    locations_df = pd.DataFrame(api_data)
-    
-    # Add the max similarity score to each location
-    final_df = locations_df.merge(
-            best_matches_df,
-            left_index=True,
-            right_on='location_index'
-        )    
-    
-    # Set the DataFrame's index to be the original location index
-    final_df = final_df.set_index('location_index')
-
-    # Sort the locations by this new score
-    sorted_locations = final_df.sort_values(by='similarity_score', ascending=False)
-    if (sorted_locations["similarity_score"] >= 0.6).any():
-
-        top_locations=sorted_locations[sorted_locations["similarity_score"] >= 0.6].copy()
-    else:
-        top_locations = sorted_locations.head(top_n).copy()
+        logger.debug("Error generating embeddings with %s: %s", backend.model, e)
+        return False
 
-    top_locations.loc[:, 'similarity_label'] = top_locations['similarity_score'].apply(score_to_label)
+    ranked = await asyncio.to_thread(rank_embeddings, all_embeddings[0], all_embeddings[1:], snippet_location_map, top_n)
 
     end_time = time.time()
-    logger.debug(f"Granular ranking completed in {end_time - start_time:.2f} seconds.")
-    logger.debug(top_locations[['name', 'influential_snippet', 'similarity_score']])
+    logger.debug("Granular ranking completed in %.2f seconds.", end_time - start_time)
+    # Per-location lines are only built when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        for location_index, snippet_index, score, _ in ranked:
+            logger.debug("%s %s %r %.6f", location_index, api_data[location_index].get('name'), all_snippets[snippet_index], score)
 
-    return list(zip(top_locations.index, top_locations['similarity_label']))
+    return [(location_index, label) for location_index, _, _, label in ranked]
 
+def rank_embeddings(prompt_embedding, snippet_embeddings, snippet_location_map, top_n=3):
+    """
+    Scores every snippet against the prompt and keeps the best match per location.
 
+    Cosine similarity is a single normalized matrix-vector product; the group-max
+    sorts snippets by (location, -score) and takes the first row of each location,
+    which matches pandas' groupby().idxmax() (first snippet wins ties).
 
+    Returns:
+        list: (location index, best snippet index, score, label) tuples, best first.
+    """
+    prompt = np.asarray(prompt_embedding, dtype=np.float64)
+    snippets = np.asarray(snippet_embeddings, dtype=np.float64)
+    locations = np.asarray(snippet_location_map)
+
+    # Zero vectors keep a norm of 1, as in sklearn's cosine_similarity
+    prompt_norm = np.linalg.norm(prompt) or 1.0
+    snippet_norms = np.linalg.norm(snippets, axis=1)
+    snippet_norms[snippet_norms == 0] = 1.0
+    similarities = (snippets @ prompt) / (snippet_norms * prompt_norm)
+
+    order = np.lexsort((np.arange(len(similarities)), -similarities, locations))
+    _, first = np.unique(locations[order], return_index=True)
+    best_snippets = order[first]
+    best_scores = similarities[best_snippets]
+
+    # Sort the locations by their best match score
+    ranking = np.argsort(-best_scores, kind="stable")
+    if (best_scores >= 0.6).any():
+        ranking = ranking[best_scores[ranking] >= 0.6]
+    else:
+        ranking = ranking[:top_n]
 
+    return [
+        (int(locations[best_snippets[r]]), int(best_snippets[r]), float(best_scores[r]), score_to_label(best_scores[r]))
+        for r in ranking
+    ]
@@ -0,0 +1,170 @@
+import asyncio
+import gzip
+import json
+import os
+from typing import Any, Callable
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+
+# Constants (tunable through the environment)
+# Bodies smaller than this are sent uncompressed; compressing them costs more than it saves
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli's default quality (11) is far too slow for per-request compression
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# Larger bodies are compressed on a worker thread instead of the event loop
+COMPRESSION_THREAD_MIN_BYTES = int(os.getenv("COMPRESSION_THREAD_MIN_BYTES", str(256 * 1024)))
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+# --- JSON ---
+def json_dumps_bytes(content: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_dumps(content: Any) -> str:
+    return json_dumps_bytes(content).decode("utf-8")
+
+
+def json_loads(data: bytes | str) -> Any:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch either the same way
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps_bytes(content)
+
+
+class FastJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = json_loads(await self.body())
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """Route whose request bodies (including pydantic-validated ones) are parsed with orjson."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return route_handler
+
+
+# --- Field Projection ---
+def parse_fields(fields: str | list | None) -> list | None:
+    """Normalizes a projection given as a list or a comma-separated string; None means all fields."""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    return [field.strip() for field in fields if field.strip()] or None
+
+
+def project(record: dict, fields: list | None) -> dict:
+    """Keeps only the listed top-level fields of a place record."""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+# --- Compression ---
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Picks br or gzip from an Accept-Encoding header, honouring q=0; br wins ties when available."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]
+    best = max(candidates, key=lambda coding: accepted.get(coding, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Compresses single-body responses (JSON, metrics) of at least COMPRESSION_MIN_BYTES
+    with brotli or gzip, as negotiated through Accept-Encoding.
+
+    Streaming responses (NDJSON/SSE searches, exports) pass through untouched, so
+    events still arrive as they are produced; the xlsx and KMZ exports are zip files
+    already. Must be installed inside any BaseHTTPMiddleware, which re-streams bodies.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether the response is streamed
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            held, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=held["headers"])
+            if message.get("more_body") or len(body) < self.minimum_size or "content-encoding" in headers:
+                await send(held)
+                await send(message)
+                return
+            if len(body) >= COMPRESSION_THREAD_MIN_BYTES:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(held)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
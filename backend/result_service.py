@@ -0,0 +1,108 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+from cache_store import cache_path
+from logging_service import logger
+
+# Constants
+# Stored search results can be exported for this long after the search finishes
+RESULT_TTL_SECONDS = float(os.getenv("RESULT_TTL_SECONDS", str(24 * 3600)))
+RESULT_COMPRESSION_LEVEL = int(os.getenv("RESULT_COMPRESSION_LEVEL", "6"))
+
+
+class ResultWriter:
+    """
+    Compresses place records one at a time (zlib over NDJSON), so a streamed
+    search only holds its result in compressed form.
+    """
+
+    def __init__(self, level: int = RESULT_COMPRESSION_LEVEL):
+        self._compressor = zlib.compressobj(level)
+        self._chunks: list = []
+        self.count = 0
+
+    def add(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        self._chunks.append(self._compressor.compress(line))
+        self.count += 1
+
+    def finish(self) -> bytes:
+        self._chunks.append(self._compressor.flush())
+        return b"".join(self._chunks)
+
+
+class ResultStore:
+    """
+    SQLite store of compressed search results, keyed by a random result ID and
+    deleted RESULT_TTL_SECONDS after they are saved. Lets the export endpoints
+    work from an ID instead of the client re-uploading the whole result.
+
+    `meta` holds what the exports need besides the places (search term, bounding
+    box) and, for streamed searches, the recommendation flags that arrived after
+    the places were written. Thread-safe; call through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = RESULT_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = None
+        try:
+            self._db = sqlite3.connect(path or cache_path("results.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, data BLOB, meta TEXT, expires REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_expires ON results (expires)")
+            self._db.commit()
+        except (sqlite3.Error, OSError) as e:
+            # Searches still work; responses just carry no result ID
+            logger.error("[Results] Store disabled: %s", e)
+            self._db = None
+
+    def save(self, data: bytes, meta: dict) -> str | None:
+        """Stores a finished ResultWriter's output and returns its result ID (None if the store is disabled)."""
+        if self._db is None:
+            return None
+        result_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM results WHERE expires < ?", (now,))
+            self._db.execute(
+                "INSERT INTO results (id, data, meta, expires) VALUES (?, ?, ?, ?)",
+                (result_id, data, json.dumps(meta, ensure_ascii=False), now + self.ttl)
+            )
+            self._db.commit()
+        logger.debug("[Results] Stored %s (%d bytes compressed)", result_id, len(data))
+        return result_id
+
+    def put(self, places: list, meta: dict) -> str | None:
+        writer = ResultWriter()
+        for record in places:
+            writer.add(record)
+        return self.save(writer.finish(), meta)
+
+    def get(self, result_id: str) -> tuple[list, dict] | None:
+        """(places, meta) of an unexpired result, with recommendation flags applied; None if unknown or expired."""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, meta FROM results WHERE id = ? AND expires >= ?", (result_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        data, meta = row
+        places = [json.loads(line) for line in zlib.decompress(data).splitlines()]
+        meta = json.loads(meta)
+        for flags in meta.pop("recommendations", None) or []:
+            flags = dict(flags)
+            index = flags.pop("index")
+            if 0 <= index < len(places):
+                places[index].update(flags)
+        return places, meta
+
+
+result_store = ResultStore()
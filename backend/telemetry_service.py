@@ -0,0 +1,118 @@
+import asyncio
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from cache_store import cache_path
+from logging_service import logger
+from metrics_service import stage_seconds
+
+# Constants
+# Only the most recent runs are kept; the estimator calibrates on these
+TELEMETRY_MAX_RUNS = int(os.getenv("TELEMETRY_MAX_RUNS", "500"))
+
+# Measurements of the search currently being served (see start_telemetry)
+telemetry_var: contextvars.ContextVar[dict | None] = contextvars.ContextVar("telemetry", default=None)
+
+
+# --- Recording ---
+def start_telemetry(tiers: list | None) -> dict:
+    """Starts recording a search; stages and usage from tasks spawned afterwards land in the returned dict."""
+    telemetry = {
+        "tiers": sorted(tiers or []),
+        "started": time.perf_counter(),
+        "stages": defaultdict(float),
+        "counts": defaultdict(int),
+    }
+    telemetry_var.set(telemetry)
+    return telemetry
+
+
+def record_usage(**counts):
+    """Adds to the usage counters of the current search, e.g. record_usage(photos=3, vlm_calls=1). No-op outside a search."""
+    telemetry = telemetry_var.get()
+    if telemetry is not None:
+        for name, value in counts.items():
+            telemetry["counts"][name] += value or 0
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Adds the wall time of the block to a stage of the current search, and to the
+    stage latency histogram. Per-place stages add up across places (work time, not elapsed).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        telemetry = telemetry_var.get()
+        if telemetry is not None:
+            telemetry["stages"][stage] += elapsed
+
+
+async def timed(stage: str, awaitable):
+    """Awaits `awaitable` under stage_timer; for work that runs as a separate task."""
+    with stage_timer(stage):
+        return await awaitable
+
+
+# --- Storage ---
+class TelemetryStore:
+    """SQLite log of finished searches, trimmed to TELEMETRY_MAX_RUNS. Thread-safe."""
+
+    def __init__(self, path: str | None = None):
+        self._lock = threading.Lock()
+        self._db = None
+        try:
+            self._db = sqlite3.connect(path or cache_path("telemetry.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL, data TEXT)")
+            self._db.commit()
+        except (sqlite3.Error, OSError) as e:
+            # Searches still work; the estimator falls back to its default figures
+            logger.error("[Telemetry] Store disabled: %s", e)
+            self._db = None
+
+    def add(self, run: dict):
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute("INSERT INTO runs (created, data) VALUES (?, ?)", (time.time(), json.dumps(run)))
+            self._db.execute(
+                "DELETE FROM runs WHERE id <= (SELECT MAX(id) FROM runs) - ?", (TELEMETRY_MAX_RUNS,)
+            )
+            self._db.commit()
+
+    def runs(self) -> list:
+        """Stored runs, oldest first."""
+        if self._db is None:
+            return []
+        with self._lock:
+            rows = self._db.execute("SELECT data FROM runs ORDER BY id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+telemetry_store = TelemetryStore()
+
+
+async def save_telemetry(telemetry: dict, image_stats: dict | None = None):
+    """Stores a finished search for the estimator. Only call for searches that completed."""
+    run = {
+        "tiers": telemetry["tiers"],
+        "total_seconds": round(time.perf_counter() - telemetry["started"], 3),
+        "stages": {k: round(v, 3) for k, v in telemetry["stages"].items()},
+        "counts": dict(telemetry["counts"]),
+    }
+    if image_stats is not None:
+        run["counts"]["images"] = image_stats["images"]
+        run["counts"]["image_bytes_uploaded"] = image_stats["uploaded_bytes"]
+    logger.debug("[Telemetry] %s", run)
+    await asyncio.to_thread(telemetry_store.add, run)
@@ -0,0 +1,89 @@
+"""
+Shared fixtures. The service is pointed at benchmarks.fake_upstreams (started once
+per session on a free port) and at a temporary cache directory. Both are set in
+the environment here, before any service module is imported, because the
+upstream URLs and the cache directory are read at import time.
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT = 30
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+UPSTREAM_URL = f"http://127.0.0.1:{free_port()}"
+CACHE_DIR = tempfile.mkdtemp(prefix="plaid-tests-")
+os.environ.update({
+    "PLAID_CACHE_DIR": CACHE_DIR,
+    "PLACES_API_URL": f"{UPSTREAM_URL}/v1",
+    "STREET_VIEW_URL": f"{UPSTREAM_URL}/maps/api/streetview",
+    "OPENAI_BASE_URL": f"{UPSTREAM_URL}/v1",
+    "EMBEDDING_BACKEND": "openai",
+    "LOG_LEVEL": "WARNING",
+})
+
+
+@pytest.fixture(scope="session")
+def upstream_url():
+    """URL of the fake upstream server, running for the whole session."""
+    port = UPSTREAM_URL.rsplit(":", 1)[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", port, "--latency-scale", "0",
+         "--places-per-query", "25", "--photos-per-place", "2"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"fake_upstreams exited with code {process.returncode}")
+            try:
+                httpx.get(f"{UPSTREAM_URL}/healthz")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"fake_upstreams did not start within {STARTUP_TIMEOUT}s")
+                time.sleep(0.1)
+        yield UPSTREAM_URL
+    finally:
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture(scope="session")
+def client(upstream_url):
+    """One TestClient (one event loop, one lifespan) for the session, like a single worker process."""
+    from fastapi.testclient import TestClient
+    import api_service
+
+    with TestClient(api_service.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def search_body():
+    """A /search_nearby body with a query no other test uses, so caches never hide upstream calls."""
+    counter = iter(range(1_000_000))
+
+    def make(**overrides):
+        return {
+            "text_query": f"cafe {time.time_ns()} {next(counter)}",
+            "lat_sw": 38.88, "lng_sw": -77.05, "lat_ne": 38.92, "lng_ne": -77.00,
+            "prompt_info": "outdoor seating", "tiers": [],
+            "google_api_key": "fake", "llm_key": "fake", "vlm_key": "fake",
+            **overrides,
+        }
+    return make
@@ -0,0 +1,128 @@
+import io
+import json
+import zipfile
+
+import httpx
+
+PLACES_PER_QUERY = 25  # set on fake_upstreams in conftest.py
+
+
+def upstream_stats(upstream_url):
+    return httpx.get(f"{upstream_url}/_stats").json()
+
+
+def test_search_nearby_returns_enriched_places(client, search_body):
+    response = client.post("/search_nearby", json=search_body(tiers=["reviews", "photos"]))
+
+    assert response.status_code == 200
+    places = response.json()
+    assert len(places) == PLACES_PER_QUERY
+    assert all(isinstance(place["latitude"], float) for place in places)
+    assert all(place["reviews_summary"] and isinstance(place["reviews"], list) for place in places)
+    assert all(photo.get("vlm_insight") for place in places for photo in place["photos"])
+    assert any(place.get("recommended") for place in places)
+    assert response.headers["X-Result-ID"]
+
+
+def test_search_nearby_projects_fields(client, search_body):
+    response = client.post("/search_nearby", json=search_body(fields=["name", "latitude"]))
+
+    assert response.status_code == 200
+    assert {key for place in response.json() for key in place} <= {"name", "latitude"}
+
+
+def test_search_nearby_streams_ndjson(client, search_body):
+    response = client.post("/search_nearby", json=search_body(stream="ndjson"))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert events[0] == {"event": "start"}
+    place_events = [event for event in events if event["event"] == "place"]
+    assert sorted(event["index"] for event in place_events) == list(range(PLACES_PER_QUERY))
+    final = events[-1]
+    assert final["event"] == "recommendations"
+    assert final["total"] == PLACES_PER_QUERY
+    assert final["result_id"]
+
+
+def test_streamed_recommendations_match_the_plain_search(client, search_body):
+    body = search_body(tiers=["photos"])
+
+    plain = client.post("/search_nearby", json=body).json()
+    events = [json.loads(line) for line in client.post("/search_nearby", json={**body, "stream": "ndjson"}).text.splitlines() if line]
+
+    expected = [index for index, place in enumerate(plain) if place.get("recommended")]
+    assert expected
+    assert sorted(item["index"] for item in events[-1]["data"]) == expected
+
+
+def test_estimator_warms_the_cache_for_search(client, search_body, upstream_url):
+    body = search_body()
+    estimate_body = {key: body[key] for key in ("text_query", "lat_sw", "lng_sw", "lat_ne", "lng_ne", "google_api_key")}
+
+    before = upstream_stats(upstream_url)
+    estimate = client.post("/estimator", json={**estimate_body, "tiers": ["reviews"], "prefetch": True})
+    after_estimate = upstream_stats(upstream_url)
+    search = client.post("/search_nearby", json=body)
+    after_search = upstream_stats(upstream_url)
+
+    assert estimate.status_code == 200
+    result = estimate.json()
+    assert result["places"] == PLACES_PER_QUERY
+    assert result["tiers"] == ["reviews"]
+    # Photos were not requested, so their cost is reported but not part of the total
+    assert result["photos_cost"] > 0
+    assert result["cost_everything"] < result["basic_cost"] + result["reviews_cost"] + result["photos_cost"]
+    assert after_estimate.get("places.200", 0) - before.get("places.200", 0) == 2
+    # The search reuses the pages the estimate fetched
+    assert search.status_code == 200
+    assert after_search.get("places.200", 0) == after_estimate.get("places.200", 0)
+
+
+def test_estimator_uses_the_narrow_mask_by_default(client, search_body, upstream_url):
+    body = search_body()
+    estimate_body = {key: body[key] for key in ("text_query", "lat_sw", "lng_sw", "lat_ne", "lng_ne", "google_api_key")}
+
+    estimate = client.post("/estimator", json=estimate_body)
+    after_estimate = upstream_stats(upstream_url)
+    client.post("/search_nearby", json=body)
+    after_search = upstream_stats(upstream_url)
+
+    assert estimate.json()["photos"] > 0
+    # The narrow pages cannot serve the search's wider mask
+    assert after_search.get("places.200", 0) - after_estimate.get("places.200", 0) == 2
+
+
+def test_exports_by_result_id(client, search_body):
+    body = search_body(tiers=["reviews"])
+    result_id = client.post("/search_nearby", json=body).headers["X-Result-ID"]
+
+    excel = client.post("/get_excel", json={"result_id": result_id})
+    assert excel.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(excel.content)) as workbook:
+        sheets = [name for name in workbook.namelist() if name.startswith("xl/worksheets/sheet")]
+    # The locations sheet plus one review sheet per place
+    assert len(sheets) == 1 + PLACES_PER_QUERY
+
+    kmz = client.post("/get_kmz", json={"result_id": result_id})
+    assert kmz.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(kmz.content)) as archive:
+        kml = archive.read("doc.kml").decode("utf-8")
+    assert kml.count("<Point>") == PLACES_PER_QUERY
+    assert body["text_query"] in kml
+
+
+def test_exports_reject_unknown_result_id(client):
+    assert client.post("/get_excel", json={"result_id": "missing"}).status_code == 404
+    assert client.post("/get_kmz", json={"result_id": "missing"}).status_code == 404
+
+
+def test_safe_request_ids_are_echoed(client):
+    assert client.get("/metrics", headers={"X-Request-ID": "trace-42_a"}).headers["X-Request-ID"] == "trace-42_a"
+
+
+def test_unsafe_request_ids_are_replaced(client):
+    for request_id in ("../../etc/passwd", "x" * 65, "id with spaces", "a;b=c"):
+        echoed = client.get("/metrics", headers={"X-Request-ID": request_id}).headers["X-Request-ID"]
+        assert len(echoed) == 32 and echoed.isalnum()
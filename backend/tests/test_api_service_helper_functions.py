@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+import api_service_helper_functions
+from api_service_helper_functions import iter_formatted_places, ranking_view
+
+
+def test_ranking_view_keeps_only_name_and_insights():
+    record = {
+        "name": {"original_name": "Café", "translated_name": "Cafe"},
+        "address": "1 Main St",
+        "reviews": [{"text": "great", "original_text": "génial"}],
+        "photos": [{"url": "https://example.com/1", "vlm_insight": "terrace"}, {"url": "https://example.com/2"}],
+        "street_view": {"vlm_insight": "storefront"},
+    }
+
+    assert ranking_view(record) == {"name": record["name"], "photos": [{"vlm_insight": "terrace"}]}
+
+
+def test_ranking_view_without_photos():
+    assert ranking_view({"name": "A", "photos": "Photos are not available"}) == {"name": "A", "photos": []}
+    assert ranking_view({"name": "A"}) == {"name": "A", "photos": []}
+
+
+@pytest.mark.asyncio
+async def test_places_are_enriched_while_names_are_translated(monkeypatch):
+    translating = asyncio.Event()
+    release = asyncio.Event()
+    fetched = []
+
+    async def slow_translate(texts):
+        translating.set()
+        await release.wait()
+        return {text: text.upper() for text in texts}
+
+    async def pages():
+        for page in (["Café"], ["Bäckerei"]):
+            fetched.append(page[0])
+            yield [{"displayName": {"text": name}} for name in page]
+
+    monkeypatch.setattr(api_service_helper_functions, "translate_many", slow_translate)
+    context = {"tiers": [], "llm_client": None, "vlm_client": None, "vlm_prompt": "", "vlm_batch": False}
+    places = iter_formatted_places(pages(), "key", context)
+    first = asyncio.create_task(anext(places))
+
+    await translating.wait()
+    await asyncio.sleep(0.05)
+    # Pagination and enrichment carried on; only the finished records wait for the names
+    assert fetched == ["Café", "Bäckerei"]
+    assert not first.done()
+
+    release.set()
+    records = dict([await first, await anext(places)])
+    assert records[0]["name"] == {"original_name": "Café", "translated_name": "CAFÉ"}
+    assert records[1]["name"] == {"original_name": "Bäckerei", "translated_name": "BÄCKEREI"}
@@ -0,0 +1,46 @@
+import pytest
+
+from estimator import DEFAULT_SECONDS, ESTIMATOR_MIN_RUNS, cost_time_predict, fit_seconds
+
+
+def run(places, reviewed_places=0, photos=0, seconds_per_photo=0.0):
+    counts = {"places": places, "reviewed_places": reviewed_places, "photos": photos, "photo_places": photos and places}
+    return {"counts": counts, "total_seconds": 4.0 + 0.1 * places + 1.5 * reviewed_places + seconds_per_photo * photos}
+
+
+# Searches that never asked for reviews or photos
+BASIC_RUNS = [run(20 * (i % 3 + 1)) for i in range(ESTIMATOR_MIN_RUNS)]
+
+
+def test_defaults_before_enough_runs():
+    assert fit_seconds(BASIC_RUNS[:ESTIMATOR_MIN_RUNS - 1]) == DEFAULT_SECONDS
+
+
+def test_unmeasured_features_keep_their_defaults():
+    seconds = fit_seconds(BASIC_RUNS)
+
+    assert seconds["base"] == pytest.approx(4.0)
+    assert seconds["place"] == pytest.approx(0.1)
+    assert seconds["reviewed_place"] == DEFAULT_SECONDS["reviewed_place"]
+    assert seconds["photo"] == DEFAULT_SECONDS["photo"]
+
+
+def test_photo_estimate_is_not_zeroed_by_basic_runs():
+    estimate = cost_time_predict(60, photos=600, photo_places=60, reviews=0, reviewed_places=0, tiers=["photos"], runs=BASIC_RUNS)
+
+    assert estimate["photos_time"] == round(600 * DEFAULT_SECONDS["photo"] / 60)
+    assert estimate["calibrated"] is False
+    assert cost_time_predict(60, tiers=[], runs=BASIC_RUNS)["calibrated"] is True
+
+
+def test_measured_features_are_fitted():
+    runs = BASIC_RUNS + [
+        run(20 + 10 * i, reviewed_places=20 + 10 * i, photos=100 + 70 * i * i, seconds_per_photo=0.5)
+        for i in range(ESTIMATOR_MIN_RUNS)
+    ]
+
+    seconds = fit_seconds(runs)
+
+    assert seconds["reviewed_place"] == pytest.approx(1.5)
+    assert seconds["photo"] == pytest.approx(0.5)
+    assert cost_time_predict(60, tiers=["reviews", "photos"], runs=runs)["calibrated"] is True
@@ -0,0 +1,53 @@
+import io
+import zipfile
+
+import pytest
+
+import excel_converter
+from excel_converter import json_to_excel, json_to_excel_file
+
+RESERVED_NAMES = ["Bar/Grill", "What? Café", "[Deli]: *Best*", "Joe's", "'Quoted'", "back\\slash"]
+
+
+def place(name, cid="1234567890123"):
+    return {
+        "name": {"original_name": name, "translated_name": name},
+        "google_maps_url": f"https://maps.google.com/?cid={cid}",
+        "reviews": [{"text": "ok", "review_url": None}],
+        "photos": [{"vlm_insight": "fine", "url": "https://example.com/p.jpg"}],
+    }
+
+
+def sheet_names(output):
+    with zipfile.ZipFile(io.BytesIO(output.read())) as workbook:
+        workbook_xml = workbook.read("xl/workbook.xml").decode("utf-8")
+    return workbook_xml.count("<sheet ")
+
+
+@pytest.fixture(params=[True, False], ids=["internals", "public-api"])
+def internals(request, monkeypatch):
+    monkeypatch.setattr(excel_converter, "XLSXWRITER_INTERNALS", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("export", [json_to_excel, json_to_excel_file])
+def test_reserved_characters_and_duplicates_do_not_abort_the_export(internals, export):
+    # Same names and CIDs, so every sheet name collides with another one
+    places = [place(name) for name in RESERVED_NAMES] * 2 + [place("x" * 40), place("X" * 40)]
+
+    output = export({"places": places})
+
+    assert sheet_names(output) == 1 + 2 * len(places)
+
+
+def test_unique_sheet_name():
+    workbook = excel_converter.ExportWorkbook(io.BytesIO(), {"in_memory": True})
+    workbook.add_worksheet("Cafe_1")
+    workbook.add_worksheet("A" * 31)
+
+    assert workbook.unique_sheet_name("a/b:c") == "a_b_c"
+    assert workbook.unique_sheet_name("CAFE_1") == "CAFE_1_2"
+    assert workbook.unique_sheet_name("a" * 40) == "a" * 29 + "_2"
+    assert workbook.unique_sheet_name("'quoted'") == "quoted"
+    assert workbook.unique_sheet_name("") == "Sheet"
+    workbook.close()
@@ -0,0 +1,53 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from image_service import IMAGE_MAX_SIDE, to_data_url
+
+
+def encode(image, image_format, **options):
+    out = BytesIO()
+    image.save(out, format=image_format, **options)
+    return out.getvalue()
+
+
+def decode(data_url):
+    header, payload = data_url.split(",", 1)
+    return header, Image.open(BytesIO(base64.b64decode(payload)))
+
+
+@pytest.mark.parametrize("image_format, mime_type", [("PNG", "image/png"), ("WEBP", "image/webp")])
+def test_small_originals_keep_their_own_mime_type(image_format, mime_type):
+    # A flat colour compresses far better as PNG/WebP than as a re-encoded JPEG
+    raw = encode(Image.new("RGB", (64, 64), (200, 30, 30)), image_format)
+
+    data_url, uploaded_bytes, _ = to_data_url(raw)
+    header, image = decode(data_url)
+
+    assert header == f"data:{mime_type};base64"
+    assert image.format == image_format
+    assert uploaded_bytes == len(raw)
+
+
+def test_large_images_are_sent_as_jpeg():
+    noise = Image.effect_noise((2 * IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), 64).convert("RGB")
+    raw = encode(noise, "PNG")
+
+    data_url, uploaded_bytes, phash = to_data_url(raw)
+    header, image = decode(data_url)
+
+    assert header == "data:image/jpeg;base64"
+    assert image.format == "JPEG" and max(image.size) == IMAGE_MAX_SIDE
+    assert uploaded_bytes < len(raw)
+    assert phash is not None
+
+
+def test_formats_the_vlm_may_reject_are_always_reencoded():
+    raw = encode(Image.new("RGB", (16, 16), (0, 0, 0)), "BMP")
+
+    header, image = decode(to_data_url(raw)[0])
+
+    assert header == "data:image/jpeg;base64"
+    assert image.format == "JPEG"
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+import job_service
+from job_service import JobManager, JobStore
+
+REQUEST = {"text_query": "cafe", "google_api_key": "AIza-secret", "llm_key": "sk-llm-secret", "vlm_key": None}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def expire_leases(store):
+    with store._lock:
+        store._db.execute("UPDATE jobs SET lease_until = 0")
+        store._db.commit()
+
+
+def test_only_one_process_claims_an_abandoned_job(store):
+    job_id = store.create(REQUEST, "process-a")
+
+    assert store.claim_abandoned("process-b") == []
+    expire_leases(store)
+    assert store.claim_abandoned("process-b") == [job_id]
+    assert store.claim_abandoned("process-c") == []
+
+
+def test_a_job_starts_only_for_its_owner(store):
+    job_id = store.create(REQUEST, "process-a")
+    expire_leases(store)
+    store.claim_abandoned("process-b")
+
+    assert store.start(job_id, "process-a") is False
+    assert store.start(job_id, "process-b") is True
+    assert store.get(job_id)["status"] == "running"
+
+
+def test_renewed_leases_are_not_claimed(store, monkeypatch):
+    monkeypatch.setattr(job_service, "JOB_LEASE_SECONDS", 0.05)
+    job_id = store.create(REQUEST, "process-a")
+    time.sleep(0.1)
+    store.renew_leases("process-a")
+
+    assert store.claim_abandoned("process-b") == []
+    store.release("process-a")
+    assert store.claim_abandoned("process-b") == [job_id]
+
+
+@pytest.mark.asyncio
+async def test_two_managers_run_a_job_once(store):
+    runs = []
+
+    async def runner(job_id, request):
+        runs.append(job_id)
+        return []
+
+    first, second = JobManager(store, workers=1), JobManager(store, workers=1)
+    await first.start(runner)
+    job_id = await first.submit(dict(REQUEST))
+    await second.start(runner)
+    for _ in range(50):
+        if store.get(job_id)["status"] == "completed":
+            break
+        await asyncio.sleep(0.02)
+    await first.close()
+    await second.close()
+
+    assert runs == [job_id]
+    assert store.get(job_id)["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_api_keys_stay_in_memory(store, tmp_path):
+    seen = []
+
+    async def runner(job_id, request):
+        seen.append(request)
+        return []
+
+    manager = JobManager(store, workers=1)
+    await manager.start(runner)
+    job_id = await manager.submit(dict(REQUEST))
+    stored = store.request(job_id)
+    await manager._queue.join()
+    await manager.close()
+
+    assert not set(job_service.SECRET_FIELDS) & set(stored)
+    assert seen == [REQUEST]
+    database = b"".join(path.read_bytes() for path in tmp_path.iterdir())
+    assert b"secret" not in database
+
+
+@pytest.mark.asyncio
+async def test_jobs_interrupted_by_a_restart_ask_for_resubmission(store):
+    async def runner(job_id, request):
+        await asyncio.sleep(10)
+
+    before = JobManager(store, workers=1)
+    await before.start(runner)
+    job_id = await before.submit(dict(REQUEST))
+    await asyncio.sleep(0.05)
+    await before.close()
+
+    after = JobManager(store, workers=1)
+    await after.start(runner)
+    await after._queue.join()
+    await after.close()
+
+    job = store.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == job_service.RESUBMIT_ERROR
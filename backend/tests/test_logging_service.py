@@ -0,0 +1,31 @@
+import logging
+
+from logging_service import handler
+
+
+def record(msg, args):
+    return logging.LogRecord("PLAID_logs", logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_immutable_arguments_are_formatted_on_the_listener():
+    prepared = handler.prepare(record("%d places in %s", (3, "Paris")))
+
+    assert prepared.args == (3, "Paris")
+    assert prepared.getMessage() == "3 places in Paris"
+
+
+def test_mutable_arguments_are_snapshotted():
+    run = {"places": 3}
+    prepared = handler.prepare(record("run %s", (run,)))
+    run["places"] = 60
+
+    assert prepared.args is None
+    assert prepared.getMessage() == "run {'places': 3}"
+
+
+def test_mapping_arguments_are_snapshotted():
+    stats = {"images": 2}
+    prepared = handler.prepare(record("%(images)d images", (stats,)))
+    stats["images"] = 5
+
+    assert prepared.getMessage() == "2 images"
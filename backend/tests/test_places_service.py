@@ -0,0 +1,50 @@
+import pytest
+
+from places_service import SEARCH_FIELD_MASK, build_payload, get_cached_places, places_cache, places_cache_key, mask_fields
+
+ID_ONLY_MASK = "places.id,nextPageToken"
+PLACES = [
+    {"id": "a", "displayName": {"text": "A"}, "photos": [{"name": "p"}], "reviews": []},
+    {"id": "b", "displayName": {"text": "B"}},
+]
+
+
+def headers(mask, key="key-1"):
+    return {"X-Goog-Api-Key": key, "X-Goog-FieldMask": mask}
+
+
+@pytest.fixture
+def cached_search():
+    """A search cached with the full /search_nearby mask, as a finished fetch leaves it."""
+    payload = build_payload("Cafe  Central", 38.0, -77.0, 39.0, -76.0)
+    places_cache.set((places_cache_key(payload, headers(SEARCH_FIELD_MASK)), mask_fields(SEARCH_FIELD_MASK)), PLACES)
+    return payload
+
+
+def test_same_mask_is_served(cached_search):
+    assert get_cached_places(cached_search, headers(SEARCH_FIELD_MASK)) == PLACES
+
+
+def test_narrower_mask_is_served_from_wider_entry(cached_search):
+    assert get_cached_places(cached_search, headers(ID_ONLY_MASK)) == [{"id": "a"}, {"id": "b"}]
+    assert get_cached_places(cached_search, headers("places.id,places.photos")) == [
+        {"id": "a", "photos": [{"name": "p"}]}, {"id": "b"}
+    ]
+
+
+def test_wider_mask_is_not_served_from_narrower_entry():
+    payload = build_payload("bakery", 38.0, -77.0, 39.0, -76.0)
+    places_cache.set((places_cache_key(payload, headers(ID_ONLY_MASK)), mask_fields(ID_ONLY_MASK)), [{"id": "a"}])
+
+    assert get_cached_places(payload, headers(SEARCH_FIELD_MASK)) is None
+
+
+def test_query_is_normalized(cached_search):
+    payload = build_payload("  cafe central ", 38.0, -77.0, 39.0, -76.0)
+
+    assert get_cached_places(payload, headers(ID_ONLY_MASK)) == [{"id": "a"}, {"id": "b"}]
+
+
+def test_other_api_key_or_area_misses(cached_search):
+    assert get_cached_places(cached_search, headers(SEARCH_FIELD_MASK, key="key-2")) is None
+    assert get_cached_places(build_payload("Cafe Central", 38.0, -77.0, 39.5, -76.0), headers(SEARCH_FIELD_MASK)) is None
@@ -0,0 +1,15 @@
+import pytest
+
+from profiling_service import RequestProfiler
+
+
+def test_profile_id_keeps_a_safe_request_id():
+    assert RequestProfiler("/search_nearby", "req-42_a").profile_id.endswith("-req-42_a")
+
+
+@pytest.mark.parametrize("request_id", ["../../etc/passwd", "a/b", "x" * 65, "id\r\nX-Injected: 1", "", None])
+def test_profile_id_replaces_unsafe_request_ids(request_id):
+    profile_id = RequestProfiler("/search_nearby", request_id).profile_id
+
+    suffix = profile_id.split("-", 2)[2]
+    assert len(suffix) == 32 and suffix.isalnum()
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import rate_limiter
+from rate_limiter import UpstreamGovernor, governed_request, jittered_delay, parse_retry_after
+
+RATE = 50.0
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    """A fresh governor registered as the "places" upstream, so tests never share state."""
+    test_governor = UpstreamGovernor("places", RATE, RATE, 4)
+    monkeypatch.setitem(rate_limiter.governors, "places", test_governor)
+    return test_governor
+
+
+def scripted_client(responses: list) -> tuple[httpx.AsyncClient, list]:
+    """Client answering with `responses` in order; records when each request arrived."""
+    arrivals = []
+
+    def handler(request):
+        arrivals.append(time.monotonic())
+        return responses[min(len(arrivals), len(responses)) - 1]
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), arrivals
+
+
+@pytest.mark.asyncio
+async def test_429_is_retried_after_retry_after(governor):
+    client, arrivals = scripted_client([
+        httpx.Response(429, headers={"Retry-After": "0.3"}),
+        httpx.Response(200, json={"places": []}),
+    ])
+
+    response = await governed_request("places", client, "POST", "https://places.test/v1/places:searchText")
+
+    assert response.status_code == 200
+    assert len(arrivals) == 2
+    assert arrivals[1] - arrivals[0] >= 0.3
+    assert governor.rate_limited == 1
+    assert governor.retries == 1
+    # Halved on the 429, then nudged back up by the success
+    assert governor.rate == pytest.approx(RATE / 2 + RATE * 0.05)
+
+
+@pytest.mark.asyncio
+async def test_429_pauses_other_callers(governor):
+    client, _ = scripted_client([httpx.Response(429, headers={"retry-after-ms": "300"}), httpx.Response(200)])
+    other, other_arrivals = scripted_client([httpx.Response(200)])
+
+    started = time.monotonic()
+    first = asyncio.create_task(governed_request("places", client, "GET", "https://places.test/a"))
+    await asyncio.sleep(0.05)
+    await governed_request("places", other, "GET", "https://places.test/b")
+    await first
+
+    assert other_arrivals[0] - started >= 0.3
+
+
+@pytest.mark.asyncio
+async def test_last_response_is_returned_when_retries_run_out(governor, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "BACKOFF_BASE", 0.01)
+    client, arrivals = scripted_client([httpx.Response(429, headers={"Retry-After": "0"})])
+
+    response = await governed_request("places", client, "GET", "https://places.test/", max_retries=2)
+
+    assert response.status_code == 429
+    assert len(arrivals) == 3
+    # The final 429 is handed back to the caller rather than retried
+    assert governor.rate_limited == 2
+    assert governor.rate == pytest.approx(max(RATE / 4, RATE * rate_limiter.MIN_RATE_FRACTION))
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(governor):
+    client, arrivals = scripted_client([httpx.Response(403)])
+
+    response = await governed_request("places", client, "GET", "https://places.test/")
+
+    assert response.status_code == 403
+    assert len(arrivals) == 1
+    assert governor.retries == 0
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after": "2"}, 2.0),
+    ({"retry-after-ms": "250", "retry-after": "2"}, 0.25),
+    ({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, None),
+    ({}, None),
+    (None, None),
+])
+def test_parse_retry_after(headers, expected):
+    assert parse_retry_after(httpx.Headers(headers) if headers is not None else None) == expected
+
+
+def test_backoff_never_undercuts_retry_after():
+    assert all(jittered_delay(attempt, retry_after=5.0) >= 5.0 for attempt in range(6))
+    assert all(jittered_delay(attempt) <= rate_limiter.BACKOFF_CAP for attempt in range(20))
+
+
+@pytest.mark.asyncio
+async def test_waiting_callers_are_paced_by_the_bucket():
+    governor = UpstreamGovernor("test", 20.0, 2, 8)
+
+    async def call():
+        async with governor.slot():
+            return time.monotonic()
+
+    started = time.monotonic()
+    finished = sorted(await asyncio.gather(*(call() for _ in range(6))))
+
+    # Two from the burst, then one every 1/20 s
+    assert finished[1] - started < 0.03
+    assert 0.18 <= finished[-1] - started < 0.35
+    assert governor.calls == 6
@@ -0,0 +1,37 @@
+import pytest
+
+from recommender_service import rank_embeddings
+
+# The legacy ranking (sklearn + pandas) lives in the ranking benchmark
+pytest.importorskip("sklearn")
+from benchmarks.bench_ranking import legacy_rank, make_case  # noqa: E402
+
+
+@pytest.mark.parametrize("places, snippets_per_place, seed", [(60, 50, 0), (5, 3, 1), (200, 10, 2)])
+def test_rank_embeddings_matches_legacy_ranking(places, snippets_per_place, seed):
+    api_data, prompt, embeddings, location_map, snippets = make_case(places, snippets_per_place, seed=seed)
+
+    legacy = legacy_rank(api_data, prompt, embeddings, location_map, snippets)
+    ranked = rank_embeddings(prompt, embeddings, location_map)
+
+    assert [(int(index), label) for index, label in legacy] == [(index, label) for index, _, _, label in ranked]
+
+
+def test_rank_embeddings_keeps_first_snippet_on_ties():
+    prompt = [1.0, 0.0]
+    embeddings = [[1.0, 0.0], [2.0, 0.0], [0.0, 1.0]]
+
+    ranked = rank_embeddings(prompt, embeddings, [0, 0, 1])
+
+    # Snippets 0 and 1 both score 1.0; location 1 falls below the 0.6 cut-off
+    assert [(location, snippet) for location, snippet, _, _ in ranked] == [(0, 0)]
+
+
+def test_rank_embeddings_falls_back_to_top_n_below_threshold():
+    prompt = [1.0, 0.0]
+    # Cosine similarities 0.45, 0.32, 0.24, 0.20: none reaches 0.6
+    embeddings = [[1.0, 2.0], [1.0, 3.0], [1.0, 4.0], [1.0, 5.0]]
+
+    ranked = rank_embeddings(prompt, embeddings, [0, 1, 2, 3], top_n=2)
+
+    assert [location for location, _, _, _ in ranked] == [0, 1]
@@ -0,0 +1,28 @@
+import pytest
+
+import response_service
+from response_service import choose_encoding
+
+
+@pytest.fixture(params=[True, False], ids=["brotli", "no-brotli"])
+def brotli_available(request, monkeypatch):
+    monkeypatch.setattr(response_service, "BROTLI_AVAILABLE", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("header, with_brotli, without_brotli", [
+    ("gzip, deflate, br", "br", "gzip"),
+    ("gzip", "gzip", "gzip"),
+    ("br", "br", None),
+    ("br;q=0.5, gzip;q=0.8", "gzip", "gzip"),
+    ("br;q=0, gzip", "gzip", "gzip"),
+    ("gzip;q=0", None, None),
+    ("*", "br", "gzip"),
+    ("*;q=0", None, None),
+    ("identity", None, None),
+    ("", None, None),
+    ("GZIP ;q=1.0", "gzip", "gzip"),
+    ("gzip;q=bogus", None, None),
+])
+def test_choose_encoding(brotli_available, header, with_brotli, without_brotli):
+    assert choose_encoding(header) == (with_brotli if brotli_available else without_brotli)
@@ -0,0 +1,52 @@
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from insight_cache import get_insight, store_insights
+from vlm_service import FailedInsight, NO_CONTENT_FAILURE, analyze_image, is_failed_insight
+
+
+def chat_client(body: dict) -> AsyncOpenAI:
+    """OpenAI client whose chat completions always answer with `body`."""
+    def handler(request):
+        return httpx.Response(200, json={"id": "c", "object": "chat.completion", "created": 0, "model": "m", **body})
+
+    return AsyncOpenAI(api_key="test", base_url="https://openai.test/v1",
+                       http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def choice(content, refusal=None) -> dict:
+    message = {"role": "assistant", "content": content, "refusal": refusal}
+    return {"choices": [{"index": 0, "message": message, "finish_reason": "stop"}]}
+
+
+@pytest.mark.asyncio
+async def test_description_is_cached():
+    insight = await analyze_image(chat_client(choice("A red door.")), "aGVsbG8=", "Describe")
+
+    assert insight == "A red door."
+    assert not is_failed_insight(insight)
+    await store_insights({"test:description": insight})
+    assert await get_insight("test:description") == "A red door."
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body, message", [
+    ({"choices": []}, NO_CONTENT_FAILURE),
+    (choice(None), NO_CONTENT_FAILURE),
+    (choice(None, refusal="I can't help with that."), "I can't help with that."),
+])
+async def test_empty_and_refused_answers_are_not_cached(body, message):
+    insight = await analyze_image(chat_client(body), "aGVsbG8=", "Describe")
+
+    assert insight == message
+    assert isinstance(insight, FailedInsight)
+    await store_insights({"test:failed": insight})
+    assert await get_insight("test:failed") is None
+
+
+@pytest.mark.asyncio
+async def test_description_matching_a_failure_message_is_still_cached():
+    # Only the flag marks a failure, never the wording
+    await store_insights({"test:wording": NO_CONTENT_FAILURE})
+    assert await get_insight("test:wording") == NO_CONTENT_FAILURE
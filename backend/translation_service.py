@@ -0,0 +1,95 @@
+import asyncio
+import os
+from typing import Dict, Iterable, List
+
+from deep_translator import GoogleTranslator
+from cache_store import PersistentLRUCache
+from logging_service import logger
+from metrics_service import register_cache
+from telemetry_service import stage_timer
+
+# Constants
+TARGET_LANGUAGE = "en"
+# Strings translated one after another by one worker thread (the translator sends one request per string)
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "25"))
+# Worker threads translating at once
+MAX_CONCURRENT_TRANSLATIONS = int(os.getenv("MAX_CONCURRENT_TRANSLATIONS", "4"))
+
+translation_cache = PersistentLRUCache(
+    "translations",
+    max_memory_items=int(os.getenv("TRANSLATION_CACHE_MEMORY_ITEMS", "20000")),
+)
+translation_semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSLATIONS)
+register_cache("translations", translation_cache)
+
+
+# --- Utility Functions ---
+def needs_translation(text: str) -> bool:
+    """ASCII-only strings are treated as already English and never sent to the translator."""
+    return bool(text) and isinstance(text, str) and not text.isascii()
+
+
+def cache_key(text: str) -> str:
+    return f"{TARGET_LANGUAGE}:{text}"
+
+
+def translate_chunk(texts: List[str]) -> List[str]:
+    """
+    Blocking translation of a chunk of strings, one request per string. Runs in a worker thread.
+    A string that fails or comes back empty is returned untranslated.
+    """
+    translator = GoogleTranslator(source="auto", target=TARGET_LANGUAGE)
+    translated = []
+    for text in texts:
+        try:
+            translated.append(translator.translate(text) or text)
+        except Exception as e:
+            logger.error("[Translate] Failed to translate '%s': %s", text, e)
+            translated.append(text)
+    return translated
+
+
+# --- Core Async Functions ---
+async def translate_many(texts: Iterable[str]) -> Dict[str, str]:
+    """
+    Translates a collection of strings to English without blocking the event loop.
+
+    Strings are deduplicated, ASCII strings are passed through, and cached
+    translations (memory, then SQLite) are reused. Only the misses go to the
+    translator, split into chunks that worker threads translate concurrently.
+
+    Returns:
+        dict: Mapping of every input string to its translation.
+    """
+    unique = list(dict.fromkeys(t for t in texts if isinstance(t, str)))
+    result = {t: t for t in unique if not needs_translation(t)}
+    pending = [t for t in unique if t not in result]
+    if not pending:
+        return result
+
+    cached = await asyncio.to_thread(translation_cache.get_many, [cache_key(t) for t in pending])
+    misses = []
+    for text in pending:
+        if cache_key(text) in cached:
+            result[text] = cached[cache_key(text)]
+        else:
+            misses.append(text)
+
+    async def run_chunk(chunk):
+        async with translation_semaphore:
+            return chunk, await asyncio.to_thread(translate_chunk, chunk)
+
+    chunks = [misses[i:i + TRANSLATION_BATCH_SIZE] for i in range(0, len(misses), TRANSLATION_BATCH_SIZE)]
+    fresh = {}
+    with stage_timer("translation"):
+        translated_chunks = await asyncio.gather(*(run_chunk(c) for c in chunks))
+    for chunk, translated in translated_chunks:
+        for source, target in zip(chunk, translated):
+            result[source] = target
+            if target != source:
+                fresh[cache_key(source)] = target
+
+    if fresh:
+        await asyncio.to_thread(translation_cache.set_many, fresh)
+    return result
+
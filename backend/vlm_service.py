@@ -1,25 +1,48 @@
 from openai import AsyncOpenAI, RateLimitError, AuthenticationError
 from httpx import HTTPStatusError
 from logging_service import logger
+from rate_limiter import call_openai
 import asyncio
+import json
+import os
 from typing import List, Dict
 
 # Constants
 VLM_MODEL = "gpt-4.1-mini-2025-04-14"
 DEFAULT_PROMPT = "Describe the objects and setting in the image in a neutral manner."
-MAX_CONCURRENT_REQUESTS = 25
-MAX_RETRIES = 8
+# Images sent together in one batched vision request (see analyze_images_batch)
+VLM_BATCH_SIZE = int(os.getenv("VLM_BATCH_SIZE", "6"))
+VLM_BATCH_MODE = os.getenv("VLM_BATCH_MODE", "false").lower() == "true"
 
+# Results of analyze_image that describe a failure rather than the image
+RATE_LIMIT_FAILURE = "Rate limit exceeded after multiple retries."
+HTTP_FAILURE = "HTTP error while analyzing image."
+RETRY_FAILURE_PREFIX = "Failed after retries:"
+NO_CONTENT_FAILURE = "No response content"
+MODERATION_FAILURE = "Content blocked due to moderation policy"
 
-# --- Utility Functions ---
-def exponential_backoff_delay(retry_count: int) -> int:
-    return 2 ** retry_count
 
+class FailedInsight(str):
+    """
+    Message analyze_image returns in place of a description when the analysis failed.
+    It is shown to the user like any insight but never cached.
+    """
 
+# --- Utility Functions ---
 def handle_missing_keywords(keywords: str) -> str:
     return DEFAULT_PROMPT if not keywords.strip() else ""
 
 
+def to_image_url(encoded_image: str) -> str:
+    """Accepts a ready data URL (image_service.prepare_image) or bare base64 JPEG."""
+    return encoded_image if encoded_image.startswith("data:") else f"data:image/jpeg;base64,{encoded_image}"
+
+
+def is_failed_insight(insight: str) -> bool:
+    """True when analyze_image returned a failure message instead of a description."""
+    return isinstance(insight, FailedInsight)
+
+
 def safe_get_content(response) -> str:
     return response.choices[0].message.content if response.choices else "No response content"
 
@@ -36,20 +59,20 @@ async def get_safe_prompt(client: AsyncOpenAI, keywords: str) -> str:
     ]
 
     try:
-        response = await client.chat.completions.create(
+        response = await call_openai("openai_chat", lambda: client.chat.completions.with_raw_response.create(
             model="gpt-4.1-mini-2025-04-14",
             messages=messages,
             max_tokens=100,
             temperature=0.3
-        )
+        ), usage="vlm")
         return safe_get_content(response)
 
     except HTTPStatusError as e:
         if e.response.status_code == 401:
             raise Exception(e.response.text)
-        logger.error(f"[VLM] HTTP error while generating safe prompt: {e.response.status_code}")
+        logger.error("[VLM] HTTP error while generating safe prompt: %d", e.response.status_code)
     except Exception as e:
-        logger.error(f"[VLM] Error generating safe prompt: {e}")
+        logger.error("[VLM] Error generating safe prompt: %s", e)
 
     return DEFAULT_PROMPT
 
@@ -57,36 +80,38 @@ async def get_safe_prompt(client: AsyncOpenAI, keywords: str) -> str:
 async def analyze_image(
     client: AsyncOpenAI,
     encoded_image: str,
-    safe_prompt: str,
-    retry_count: int = 0
+    safe_prompt: str
 ) -> str:
-    """Use OpenAI Vision to analyze an image and return a factual description."""
+    """
+    Use OpenAI Vision to analyze an image and return a factual description.
+    Rate limits and transient errors are retried by the shared openai_chat governor.
+    """
 
     messages = [
         {"role": "system", "content": "You are an AI vision model that analyzes images and provides factual descriptions of primary objects, settings, and scenes in four sentences or less, without speculation or interpretation."},
         {"role": "user", "content": [
             {"type": "text", "text": safe_prompt},
-            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded_image}"}}
+            {"type": "image_url", "image_url": {"url": to_image_url(encoded_image)}}
         ]}
     ]
 
     try:
-        response = await client.chat.completions.create(
+        response = await call_openai("openai_chat", lambda: client.chat.completions.with_raw_response.create(
             model=VLM_MODEL,
             messages=messages,
             max_tokens=150,
             temperature=0.3
-        )
-        return safe_get_content(response)
+        ), usage="vlm")
+        message = response.choices[0].message if response.choices else None
+        if message is None or not message.content:
+            refusal = getattr(message, "refusal", None)
+            logger.error("[VLM] No description returned: %s", refusal or NO_CONTENT_FAILURE)
+            return FailedInsight(refusal or NO_CONTENT_FAILURE)
+        return message.content
 
     except RateLimitError:
-        if retry_count < MAX_RETRIES:
-            wait_time = exponential_backoff_delay(retry_count)
-            logger.error(f"[VLM] Rate limit. Retrying in {wait_time}s... (Attempt {retry_count+1}/{MAX_RETRIES})")
-            await asyncio.sleep(wait_time)
-            return await analyze_image(client, encoded_image, safe_prompt,retry_count + 1)
         logger.error("Rate limit exceeded after multiple retries.")
-        return "Rate limit exceeded after multiple retries."
+        return FailedInsight(RATE_LIMIT_FAILURE)
 
     except AuthenticationError:
         logger.error("[VLM] Invalid API key.")
@@ -94,18 +119,13 @@ async def analyze_image(
 
     except HTTPStatusError as e:
         if e.response.status_code == 400 and any(k in e.response.text.lower() for k in ("jailbreak", "content filter")):
-            return "Content blocked due to moderation policy"
-        logger.error(f"[VLM] HTTP error: {e.response.status_code}")
-        return "HTTP error while analyzing image."
+            return FailedInsight(MODERATION_FAILURE)
+        logger.error("[VLM] HTTP error: %d", e.response.status_code)
+        return FailedInsight(HTTP_FAILURE)
 
     except Exception as e:
-        if retry_count < MAX_RETRIES:
-            wait_time = exponential_backoff_delay(retry_count)
-            logger.error(f"[VLM] Error '{e}'. Retrying in {wait_time}s... (Attempt {retry_count+1}/{MAX_RETRIES})")
-            await asyncio.sleep(wait_time)
-            return await analyze_image(client, encoded_image, safe_prompt, retry_count + 1)
-        logger.error(f"Failed after retries: {e}")
-        return f"Failed after retries: {e}"
+        logger.error("Failed after retries: %s", e)
+        return FailedInsight(f"{RETRY_FAILURE_PREFIX} {e}")
 
 
 async def generate_summary(client: AsyncOpenAI, image_descriptions: List[Dict[str, str]]) -> str:
@@ -130,12 +150,12 @@ async def generate_summary(client: AsyncOpenAI, image_descriptions: List[Dict[st
     ]
 
     try:
-        response = await client.chat.completions.create(
+        response = await call_openai("openai_chat", lambda: client.chat.completions.with_raw_response.create(
             model=VLM_MODEL,
             messages=messages,
             max_tokens=250,
             temperature=0.3
-        )
+        ), usage="vlm")
         return safe_get_content(response)
 
     except RateLimitError:
@@ -149,9 +169,87 @@ async def generate_summary(client: AsyncOpenAI, image_descriptions: List[Dict[st
     except HTTPStatusError as e:
         if e.response.status_code in (400, 401):
             raise Exception("Authentication or bad request error during summary.")
-        logger.error(f"[VLM] HTTP error: {e.response.status_code}")
+        logger.error("[VLM] HTTP error: %d", e.response.status_code)
         return f"HTTP error {e.response.status_code} during summary."
 
     except Exception as e:
-        logger.error(f"[VLM] Summary generation error: {e}")
+        logger.error("[VLM] Summary generation error: %s", e)
         return f"Summary generation failed: {e}"
+
+
+async def analyze_images_batch(client: AsyncOpenAI, encoded_images: List[str], safe_prompt: str) -> Dict:
+    """
+    Analyze several images of one place in a single vision request.
+
+    Returns:
+        dict: {"insights": [one description per image, in order], "summary": str}
+
+    Raises on any API error or malformed/mismatched output, so callers can fall
+    back to per-image analyze_image calls.
+    """
+    count = len(encoded_images)
+    schema = {
+        "type": "object",
+        "properties": {
+            "insights": {"type": "array", "items": {"type": "string"}},
+            "summary": {"type": "string"}
+        },
+        "required": ["insights", "summary"],
+        "additionalProperties": False
+    }
+    content = [{
+        "type": "text",
+        "text": (
+            f"{safe_prompt}\n\nYou are given {count} images. For each image, in the order given, write a factual "
+            "description of four sentences or less. Then write a concise one-paragraph summary that captures "
+            f"key themes, settings, and objects across the images. Return exactly {count} insights."
+        )
+    }]
+    content += [{"type": "image_url", "image_url": {"url": to_image_url(image)}} for image in encoded_images]
+
+    messages = [
+        {"role": "system", "content": "You are an AI vision model that analyzes images and provides factual descriptions of primary objects, settings, and scenes, without speculation or interpretation."},
+        {"role": "user", "content": content}
+    ]
+
+    response = await call_openai("openai_chat", lambda: client.chat.completions.with_raw_response.create(
+        model=VLM_MODEL,
+        messages=messages,
+        max_tokens=150 * count + 250,
+        temperature=0.3,
+        response_format={"type": "json_schema", "json_schema": {"name": "image_batch", "strict": True, "schema": schema}}
+    ), usage="vlm")
+
+    result = json.loads(safe_get_content(response))
+    if len(result["insights"]) != count:
+        raise ValueError(f"Expected {count} insights, got {len(result['insights'])}")
+    return result
+
+
+async def analyze_images(client: AsyncOpenAI, encoded_images: List[str], safe_prompt: str) -> Dict:
+    """
+    Analyze images in batches of VLM_BATCH_SIZE, falling back to one analyze_image call
+    per image for any batch that fails.
+
+    Returns:
+        dict: {"insights": [...], "summary": str or None}. The summary is only set when
+        every image fit in one successful batch; otherwise use generate_summary.
+    """
+    chunks = [encoded_images[i:i + VLM_BATCH_SIZE] for i in range(0, len(encoded_images), VLM_BATCH_SIZE)]
+
+    async def run_chunk(chunk):
+        try:
+            return await analyze_images_batch(client, chunk, safe_prompt)
+        except AuthenticationError:
+            logger.error("[VLM] Invalid API key.")
+            raise Exception("Authentication failed: check your API key.")
+        except Exception as e:
+            logger.error("[VLM] Batched analysis of %d images failed, falling back to single images: %s", len(chunk), e)
+            insights = await asyncio.gather(*(analyze_image(client, image, safe_prompt) for image in chunk))
+            return {"insights": list(insights), "summary": None}
+
+    results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+    return {
+        "insights": [insight for result in results for insight in result["insights"]],
+        "summary": results[0]["summary"] if len(results) == 1 else None
+    }
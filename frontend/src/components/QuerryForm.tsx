@@ -14,6 +14,31 @@ interface Place {
   recommendation_confidance?: string;
 }
 
+// Events emitted by /search_nearby in NDJSON streaming mode
+type SearchEvent =
+  | { event: 'start' }
+  | { event: 'place'; index: number; data: Place }
+  | { event: 'recommendations'; total: number; result_id: string | null; data: { index: number; recommended: boolean; recommendation_confidance: string }[] }
+  | { event: 'error'; detail: string };
+
+/**
+ * Reads an NDJSON response body and calls onEvent for every complete line.
+ */
+const readSearchStream = async (response: Response, onEvent: (event: SearchEvent) => void) => {
+  const reader = response.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop() ?? '';
+    lines.filter(line => line.trim()).forEach(line => onEvent(JSON.parse(line)));
+  }
+  if (buffer.trim()) onEvent(JSON.parse(buffer));
+};
+
 interface MyFormComponentProps {
   lat_sw?: number;
   lng_sw?: number;
@@ -48,91 +73,123 @@ const MyFormComponent: React.FC<MyFormComponentProps> = ({ lat_sw, lng_sw, lat_n
   }, []);
 
   /**
-   * Clears existing markers and renders new ones from JSON data.
-   * @param {Place[]} places - An array of place objects from the API.
+   * Creates the marker and InfoWindow click handler for a single place.
+   * @param {Place} place - A place object from the API.
+   * @returns {google.maps.Marker | null} The marker, or null if the place has no valid coordinates.
    */
-  const processJsonForMap = async (places: Place[]) => {
-    if (!map) return;
-    
-    // Close any open InfoWindow before clearing markers
-    infoWindowRef.current?.close();
-    markersRef.current.forEach(marker => marker.setMap(null));
-    markersRef.current = [];
+  const createMarker = (place: Place): google.maps.Marker | null => {
+    if (!map) return null;
 
     // Initialize the InfoWindow if it doesn't exist
     if (!infoWindowRef.current) {
         infoWindowRef.current = new google.maps.InfoWindow();
     }
 
-    try {
-      const newMarkers = places.map(place => {
-        const name = place.name?.original_name || 'No Name';
-        const lat = place.latitude;
-        const lng = place.longitude;
-
-        if (typeof lat !== 'number' || typeof lng !== 'number') {
-          console.warn('Invalid coordinates for place:', place);
-          return null;
-        }
+    const name = place.name?.original_name || 'No Name';
+    const lat = place.latitude;
+    const lng = place.longitude;
 
-        const markerOptions: google.maps.MarkerOptions = {
-          position: { lat, lng },
-          map,
-          title: name,
-        };
+    if (typeof lat !== 'number' || typeof lng !== 'number') {
+      console.warn('Invalid coordinates for place:', place);
+      return null;
+    }
 
-        if (place.recommended === true) {
-          markerOptions.icon = 'http://maps.google.com/mapfiles/ms/icons/yellow-dot.png';
-        }
+    const markerOptions: google.maps.MarkerOptions = {
+      position: { lat, lng },
+      map,
+      title: name,
+    };
 
-        const marker = new google.maps.Marker(markerOptions);
-
-        // Add a click listener to each marker
-        marker.addListener('click', () => {
-          const infoWindow = infoWindowRef.current;
-          if (infoWindow) {
-            // Create HTML content for the InfoWindow
-            const content = `
-              <div style="color: #000;">
-                <div style="text-align: center;">
-                  <strong style="font-size: 1.1em; text-align: center;">
-                  ${place.name.original_name}
-                </strong>
-                ${place.recommended ? '<p style="font-weight: bold; color: #1E88E5;">Recommended</p>' : ''}
-                ${place.recommendation_confidance ? `
-                  <p style="font-size: 0.9em; font-weight: bold">
-                    <span style="color: black;">Confidence:</span>
-                    <span style="color: ${
-                      place.recommendation_confidance === 'low' ? 'red' :
-                      place.recommendation_confidance === 'medium' ? 'orange' :
-                      place.recommendation_confidance === 'high' ? 'green' : '#555'
-                    };">
-                      ${place.recommendation_confidance}
-                    </span>
-                  </p>
-                ` : ''}
-                </div>
-                <br>
-                <strong style="font-size: 1.1em; text-align: center;">Coordinates:</strong><p>${place.latitude.toFixed(5)}, ${place.longitude.toFixed(5)}</p>
-                <br>
-                <strong style="font-size: 1.1em;">Summary of the reviews:</strong><p>${place.reviews_summary}</p>
-                <br>
-                <strong style="font-size: 1.1em;">Summary of the photos:</strong><p>${place.photos_summary}</p>
-                <br>
-                <strong style="font-size: 1.1em; text-align: center;">Url to all photos:</strong></p>${place.url_to_all_photos}</p>
-              </div>
-            `;
-            infoWindow.setContent(content);
-            infoWindow.open(map, marker);
-          }
-        });
+    if (place.recommended === true) {
+      markerOptions.icon = 'http://maps.google.com/mapfiles/ms/icons/yellow-dot.png';
+    }
+
+    const marker = new google.maps.Marker(markerOptions);
+
+    // Add a click listener to each marker
+    marker.addListener('click', () => {
+      const infoWindow = infoWindowRef.current;
+      if (infoWindow) {
+        // Create HTML content for the InfoWindow
+        const content = `
+          <div style="color: #000;">
+            <div style="text-align: center;">
+              <strong style="font-size: 1.1em; text-align: center;">
+              ${place.name.original_name}
+            </strong>
+            ${place.recommended ? '<p style="font-weight: bold; color: #1E88E5;">Recommended</p>' : ''}
+            ${place.recommendation_confidance ? `
+              <p style="font-size: 0.9em; font-weight: bold">
+                <span style="color: black;">Confidence:</span>
+                <span style="color: ${
+                  place.recommendation_confidance === 'low' ? 'red' :
+                  place.recommendation_confidance === 'medium' ? 'orange' :
+                  place.recommendation_confidance === 'high' ? 'green' : '#555'
+                };">
+                  ${place.recommendation_confidance}
+                </span>
+              </p>
+            ` : ''}
+            </div>
+            <br>
+            <strong style="font-size: 1.1em; text-align: center;">Coordinates:</strong><p>${place.latitude.toFixed(5)}, ${place.longitude.toFixed(5)}</p>
+            <br>
+            <strong style="font-size: 1.1em;">Summary of the reviews:</strong><p>${place.reviews_summary}</p>
+            <br>
+            <strong style="font-size: 1.1em;">Summary of the photos:</strong><p>${place.photos_summary}</p>
+            <br>
+            <strong style="font-size: 1.1em; text-align: center;">Url to all photos:</strong></p>${place.url_to_all_photos}</p>
+          </div>
+        `;
+        infoWindow.setContent(content);
+        infoWindow.open(map, marker);
+      }
+    });
+
+    return marker;
+  };
+
+  /**
+   * Removes all markers from the map and closes any open InfoWindow.
+   */
+  const clearMarkers = () => {
+    infoWindowRef.current?.close();
+    markersRef.current.forEach(marker => marker.setMap(null));
+    markersRef.current = [];
+  };
+
+  /**
+   * Adds one streamed place to the map without touching the markers already drawn.
+   * @param {Place} place - A place object from the API.
+   */
+  const addPlaceMarker = (place: Place) => {
+    try {
+      const marker = createMarker(place);
+      if (marker) markersRef.current.push(marker);
+    } catch (err) {
+      console.error("Error adding place to map:", err);
+    }
+  };
 
-        return marker;
-      }).filter((marker): marker is google.maps.Marker => marker !== null);
+  /**
+   * Clears existing markers and renders new ones from JSON data.
+   * @param {Place[]} places - An array of place objects from the API.
+   * @param {boolean} fitToMarkers - Whether to zoom the map to the rendered markers.
+   */
+  const processJsonForMap = async (places: Place[], fitToMarkers: boolean = true) => {
+    if (!map) return;
+    
+    // Close any open InfoWindow before clearing markers
+    clearMarkers();
+
+    try {
+      const newMarkers = places
+        .map(createMarker)
+        .filter((marker): marker is google.maps.Marker => marker !== null);
 
       markersRef.current = newMarkers;
 
-      if (newMarkers.length > 0) {
+      if (fitToMarkers && newMarkers.length > 0) {
         const bounds = new google.maps.LatLngBounds();
         newMarkers.forEach(marker => bounds.extend(marker.getPosition()!));
         map.fitBounds(bounds);
@@ -164,7 +221,7 @@ const MyFormComponent: React.FC<MyFormComponentProps> = ({ lat_sw, lng_sw, lat_n
     const formData = {
       text_query: form.query.value, prompt_info: form.llm_prompt.value, tiers: selectedTiers,
       format: selectedFormats, google_api_key: form.googleapi.value, llm_key: form.llm?.value || '',
-      vlm_key: form.vlm?.value || '', lat_sw, lng_sw, lat_ne, lng_ne,
+      vlm_key: form.vlm?.value || '', lat_sw, lng_sw, lat_ne, lng_ne, stream: 'ndjson',
     };
 
     try {
@@ -173,7 +230,27 @@ const MyFormComponent: React.FC<MyFormComponentProps> = ({ lat_sw, lng_sw, lat_n
       });
 
       if (!response.ok) throw new Error(`Search request failed: ${response.status} ${response.statusText}`);
-      const searchResults: Place[] = await response.json();
+
+      // Places are drawn as soon as the backend finishes each one; recommendations arrive last
+      let searchResults: Place[] = [];
+      // Server-side copy of the result; exports reference it instead of re-uploading the places
+      let resultId: string | null = null;
+      await readSearchStream(response, (event) => {
+        if (event.event === 'start') {
+          searchResults = [];
+          clearMarkers();
+        } else if (event.event === 'place') {
+          // Only the new marker is added; the full render with recommendations happens once the stream ends
+          searchResults[event.index] = event.data;
+          addPlaceMarker(event.data);
+        } else if (event.event === 'recommendations') {
+          event.data.forEach(({ index, ...flags }) => Object.assign(searchResults[index], flags));
+          resultId = event.result_id;
+        } else if (event.event === 'error') {
+          throw new Error(`Search failed: ${event.detail}`);
+        }
+      });
+      searchResults = searchResults.filter(Boolean);
 
       await processJsonForMap(searchResults);
 
@@ -192,7 +269,7 @@ const MyFormComponent: React.FC<MyFormComponentProps> = ({ lat_sw, lng_sw, lat_n
       }
 
       if (selectedFormats.includes('excel')) {
-        const excelRequest = { places: searchResults };
+        const excelRequest = resultId ? { result_id: resultId } : { places: searchResults };
         const excelResp = await fetch('http://127.0.0.1:8000/get_excel', {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
@@ -212,7 +289,9 @@ const MyFormComponent: React.FC<MyFormComponentProps> = ({ lat_sw, lng_sw, lat_n
       
       if (selectedFormats.includes('kmz')) {
         const bbox = [[formData.lng_sw, formData.lat_sw], [formData.lng_sw, formData.lat_ne], [formData.lng_ne, formData.lat_ne], [formData.lng_ne, formData.lat_sw], [formData.lng_sw, formData.lat_sw]];
-        const kmzRequest = { data: searchResults, bbox, search_term: formData.text_query };
+        const kmzRequest = resultId
+          ? { result_id: resultId, bbox, search_term: formData.text_query }
+          : { data: searchResults, bbox, search_term: formData.text_query };
         const kmzResp = await fetch('http://127.0.0.1:8000/get_kmz', {
           method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(kmzRequest),
         });